@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+"""
+Wall time, requests, bytes and peak memory of OOClient's hot paths
+against oo_client.simulator, saved as JSON so versions can be compared.
+
+    python benchmarks/client.py [--quick] [-o results.json]
+                                [--baseline old.json]
+
+Each scenario runs in a fresh python process so its peak RSS is its
+own, not shared with the simulator or the scenarios before it.
+With --baseline, scenarios taking more than --threshold longer, or
+making that many more requests, than in the baseline are reported and
+the exit status is 1.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from oo_client.hpoo import OOClient  # noqa: E402
+from oo_client.simulator import CentralSimulator  # noqa: E402
+
+import oo_client.utils as utils  # noqa: E402
+
+FULL = {'flows': 500, 'parallel': 20, 'content_packs': 20,
+        'content_pack_mb': 200, 'config_items': 10000}
+QUICK = {'flows': 50, 'parallel': 10, 'content_packs': 3,
+         'content_pack_mb': 2, 'config_items': 500}
+
+
+def peak_rss_mb():
+    # kilobytes on linux, bytes on mac
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak /= 1024
+    return round(peak / 1024.0, 1)
+
+
+def make_jars(tmp_dir, count, size_mb):
+    """
+    count content pack jars of about size_mb each, stored rather than
+    compressed so they are written quickly.
+    """
+    blob = os.path.join(tmp_dir, 'blob.bin')
+    block = os.urandom(1024 * 1024)
+    with open(blob, 'wb') as f:
+        for _ in range(size_mb):
+            f.write(block)
+    jars = []
+    for i in range(count):
+        name = 'bench_cp{0}'.format(i)
+        jar_path = os.path.join(tmp_dir, '{0}.jar'.format(name))
+        jar = zipfile.ZipFile(jar_path, 'w', zipfile.ZIP_STORED,
+                              allowZip64=True)
+        jar.writestr('contentpack.properties',
+                     'content.pack.name={0}\n'
+                     'content.pack.version=1.0.0\n'.format(name))
+        jar.write(blob, 'Lib/blob.bin')
+        jar.close()
+        jars.append(jar_path)
+    os.remove(blob)
+    return jars
+
+
+def run_flows(client, sizes, data):
+    results = client.run_flows_parallel(data['flows'], sizes['parallel'])
+    return {'flows': len(results)}
+
+
+def flow_uuids(client, sizes, data):
+    for path in data['flows']:
+        client.get_flow_uuid_from_path(path)
+    return {'flows': len(data['flows'])}
+
+
+def content_tree(client, sizes, data):
+    return {'flows': len(client.get_all_flows_in_cp('cp0'))}
+
+
+def deploy(client, sizes, data):
+    return {'deployed': client.deploy_content_packs(data['jars'],
+                                                    force=True),
+            'mb': sizes['content_packs'] * sizes['content_pack_mb']}
+
+
+def config_items(client, sizes, data):
+    items = client.get_all_configuration_items()
+    return {'items': len(items)}
+
+
+def sync_config(client, sizes, data):
+    # system properties are every fifth item, change one in ten of them
+    items = [{'type': 'system-properties', 'path': 'item{0}'.format(i),
+              'value': 'value{0}{1}'.format(i, '-new' if i % 50 == 1
+                                            else '')}
+             for i in range(1, sizes['config_items'], 5)]
+    result = client.sync_configuration_items(items)
+    return dict((key, len(value)) for key, value in result.items())
+
+
+SCENARIOS = [('run_flows', run_flows), ('flow_uuids', flow_uuids),
+             ('content_tree', content_tree), ('deploy', deploy),
+             ('config_items', config_items), ('sync_config', sync_config)]
+
+
+def child():
+    """
+    Run the scenario given as JSON on stdin, print its result as JSON.
+    """
+    job = json.load(sys.stdin)
+    logging.basicConfig(level=logging.WARNING)
+    sizes = job['sizes']
+    try:
+        client = OOClient(job['url'], 'admin', 'admin', flow_cache=False,
+                          deploy_record=False, pool_size=sizes['parallel'],
+                          poll_policy=utils.PollPolicy(0.05, 1.5, 1))
+        start = time.time()
+        details = dict(SCENARIOS)[job['scenario']](client, sizes,
+                                                   job['data'])
+        result = {'wall_s': round(time.time() - start, 3),
+                  'peak_rss_mb': peak_rss_mb(), 'details': details}
+    except Exception as e:
+        result = {'error': repr(e)}
+    json.dump(result, sys.stdout)
+
+
+def run_scenario(central, name, sizes, data):
+    before = dict(central.stats, endpoints=dict(
+        central.stats['endpoints']))
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__),
+                                '--child'], stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE)
+    out, _ = process.communicate(json.dumps({
+        'url': central.url, 'scenario': name, 'sizes': sizes,
+        'data': data}))
+    try:
+        result = json.loads(out)
+    except ValueError:
+        result = {'error': 'exited with {0}'.format(process.returncode)}
+    stats = central.stats
+    result['requests'] = stats['requests'] - before['requests']
+    result['bytes_sent'] = stats['bytes_in'] - before['bytes_in']
+    result['bytes_received'] = stats['bytes_out'] - before['bytes_out']
+    result['endpoints'] = dict(
+        (endpoint, count - before['endpoints'].get(endpoint, 0))
+        for endpoint, count in stats['endpoints'].items()
+        if count != before['endpoints'].get(endpoint, 0))
+    return result
+
+
+def regressions(results, baseline, threshold):
+    found = []
+    for name, result in sorted(results['scenarios'].items()):
+        old = baseline.get('scenarios', {}).get(name)
+        if not old or 'error' in old or 'error' in result:
+            continue
+        if result['wall_s'] > old['wall_s'] * (1 + threshold):
+            found.append('{0}: {1}s, was {2}s'.format(name, result['wall_s'],
+                                                      old['wall_s']))
+        if result['requests'] > old['requests'] * (1 + threshold):
+            found.append('{0}: {1} requests, was {2}'.format(
+                name, result['requests'], old['requests']))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true',
+                        help='Small sizes for a quick check')
+    parser.add_argument('--scenario', action='append',
+                        choices=[name for name, _ in SCENARIOS],
+                        help='Only run these scenarios')
+    parser.add_argument('--latency', type=float, default=0.005,
+                        help="Seconds central takes to answer")
+    parser.add_argument('--run-duration', type=float, default=1)
+    parser.add_argument('-o', '--output', help='Save the results here')
+    parser.add_argument('--baseline', help='Results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Fraction slower that counts as a regression')
+    parser.add_argument('--child', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child()
+    logging.basicConfig(level=logging.WARNING)
+    sizes = dict(QUICK if args.quick else FULL)
+    scenarios = [name for name, _ in SCENARIOS
+                 if not args.scenario or name in args.scenario]
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        data = {'jars': []}
+        if 'deploy' in scenarios:
+            data['jars'] = make_jars(tmp_dir, sizes['content_packs'],
+                                     sizes['content_pack_mb'])
+        with CentralSimulator(flows=sizes['flows'],
+                              config_items=sizes['config_items'],
+                              latency=args.latency,
+                              run_duration=args.run_duration,
+                              deploy_duration=1) as central:
+            data['flows'] = sorted(flow['path'] for flow in
+                                   central.flows.values())
+            results = {'python': platform.python_version(),
+                       'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'latency': args.latency,
+                       'run_duration': args.run_duration,
+                       'sizes': sizes, 'scenarios': {}}
+            for name in scenarios:
+                result = run_scenario(central, name, sizes, data)
+                results['scenarios'][name] = result
+                sys.stderr.write('{0}: {1}\n'.format(name, result.get(
+                    'error') or '{0}s, {1} requests'.format(
+                        result['wall_s'], result['requests'])))
+    finally:
+        shutil.rmtree(tmp_dir)
+    text = json.dumps(results, indent=4, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.threshold)
+        for regression in found:
+            sys.stderr.write('Regression {0}\n'.format(regression))
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+How long `hpoo` takes to start for a few commands that don't need a
+central, and how many requests constructing an OOClient makes.
+
+    python benchmarks/startup.py [-n RUNS]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+from mock import patch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HPOO = os.path.join(ROOT, 'bin', 'hpoo')
+
+
+def time_command(argv, runs):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    times = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(runs):
+            start = time.time()
+            subprocess.call([sys.executable, HPOO] + argv, env=env,
+                            stdout=devnull, stderr=devnull)
+            times.append(time.time() - start)
+    times.sort()
+    return {'median_ms': round(times[len(times) // 2] * 1000, 1),
+            'min_ms': round(times[0] * 1000, 1)}
+
+
+def client_requests():
+    sys.path.insert(0, ROOT)
+    import oo_client.hpoo
+    with patch('requests.Session.request') as request:
+        oo_client.hpoo.OOClient('https://localhost:8443', 'admin', 'admin')
+        return request.call_count
+
+
+def make_jar(tmp_dir):
+    jar_path = os.path.join(tmp_dir, 'bench-cp.jar')
+    jar = zipfile.ZipFile(jar_path, 'w')
+    for i in range(50):
+        jar.writestr('Content/Library/tests/integration_tests/'
+                     'test_{0}.xml'.format(i),
+                     '<flow id="{0}"><name>test_{0}</name></flow>'.format(i))
+    jar.close()
+    return jar_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-n', dest='runs', type=int, default=20)
+    args = parser.parse_args()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        commands = {'help': ['-h'],
+                    'list_tests_jar': ['-a', 'list_tests', '-cp', 'bench',
+                                       '--jar', make_jar(tmp_dir)]}
+        results = dict((name, time_command(argv, args.runs))
+                       for name, argv in commands.items())
+    finally:
+        shutil.rmtree(tmp_dir)
+    results['client_init_requests'] = client_requests()
+    print(json.dumps(results, indent=4, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
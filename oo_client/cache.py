@@ -0,0 +1,192 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# read mostly endpoints, nothing about runs or deployments is cached
+CACHEABLE = ('content-packs', 'flows/', 'config-items')
+
+# writes under the first path segment which also change other endpoints
+INVALIDATES = {
+    'deployments': ('content-packs', 'flows'),
+    'content-packs': ('flows',),
+}
+
+
+class _Entry(object):
+    __slots__ = ('text', 'etag', 'last_modified', 'stored')
+
+    def __init__(self, text, etag=None, last_modified=None, stored=None):
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored = time.time() if stored is None else stored
+
+
+class ResponseCache(object):
+    """
+    Bodies of GET responses from the CACHEABLE endpoints, least recently
+    used first out once there are more than max_entries. An entry younger
+    than ttl seconds is used without asking central, an older one is
+    revalidated with If-None-Match/If-Modified-Since when central sent an
+    ETag or Last-Modified for it and fetched again when it didn't.
+    put/post through OORestCaller drop the entries they could change.
+    If cache_path is given entries are loaded from that file, and saved
+    to it by flush(), which also runs at exit, rather than on every
+    change since a crawl can store hundreds of content trees.
+    """
+    def __init__(self, max_entries=256, ttl=300, cache_path=None,
+                 cacheable=CACHEABLE):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_path = cache_path
+        self.cacheable_paths = cacheable
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.dirty = False
+        self._lock = threading.Lock()
+        self.load()
+        if cache_path:
+            atexit.register(self.flush)
+
+    @staticmethod
+    def key(url_path, params=None):
+        if not params:
+            return url_path
+        return '{0}?{1}'.format(url_path, '&'.join(
+            '{0}={1}'.format(k, v) for k, v in sorted(params.items())))
+
+    def cacheable(self, url_path):
+        return url_path.startswith(self.cacheable_paths)
+
+    def lookup(self, key):
+        """
+        (entry, fresh) for key, entry is None if there isn't one. A
+        fresh entry counts as a hit, anything stored afterwards as a miss.
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None, False
+            self.entries[key] = self.entries.pop(key)
+            if time.time() - entry.stored < self.ttl:
+                self.hits += 1
+                return entry, True
+            return entry, False
+
+    @staticmethod
+    def validators(entry):
+        """
+        Headers to revalidate a stale entry with.
+        """
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def not_modified(self, key, entry):
+        """
+        Central answered 304 for a stale entry, it's good for another ttl.
+        """
+        with self._lock:
+            self.revalidated += 1
+            entry.stored = time.time()
+            self.dirty = True
+
+    def store(self, key, text, etag=None, last_modified=None):
+        with self._lock:
+            self.misses += 1
+            self.entries.pop(key, None)
+            self.entries[key] = _Entry(text, etag, last_modified)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self.dirty = True
+
+    def invalidate(self, url_path):
+        """
+        Drop everything a write to url_path could have changed.
+        """
+        top = url_path.split('/', 1)[0]
+        prefixes = (top,) + INVALIDATES.get(top, ())
+        dropped = 0
+        with self._lock:
+            for key in list(self.entries):
+                if key.split('/', 1)[0].split('?', 1)[0] in prefixes:
+                    del self.entries[key]
+                    dropped += 1
+            self.invalidations += dropped
+            if dropped:
+                self.dirty = True
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.dirty = True
+
+    def flush(self):
+        """
+        Save the entries if they changed since they were last saved.
+        """
+        if self.dirty:
+            self.save()
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.revalidated
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'revalidated': self.revalidated,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self.entries),
+                'hit_ratio': (self.hits + self.revalidated) / float(lookups)
+                if lookups else 0.0}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path) as cache:
+                data = json.load(cache)
+            for key, entry in data:
+                self.entries[key] = _Entry(entry['text'], entry['etag'],
+                                           entry['last_modified'],
+                                           entry['stored'])
+        except (ValueError, KeyError, TypeError, IOError) as e:
+            self.entries.clear()
+            self.log.warning("Ignoring unreadable response cache"
+                             " {0}: {1}".format(self.cache_path, e))
+
+    def save(self):
+        if not self.cache_path:
+            return
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        # configuration items can be private so keep them that way
+        tmp_path = '{0}.{1}.tmp'.format(self.cache_path, os.getpid())
+        with self._lock:
+            data = [(key, {'text': entry.text, 'etag': entry.etag,
+                           'last_modified': entry.last_modified,
+                           'stored': entry.stored})
+                    for key, entry in self.entries.items()]
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                         0o600)
+            with os.fdopen(fd, 'w') as cache:
+                json.dump(data, cache)
+            os.rename(tmp_path, self.cache_path)
+            self.dirty = False
@@ -0,0 +1,539 @@
+# Only the modules an action needs are imported (requests alone takes
+# most of the startup time) so keep imports in the functions below
+import argparse
+import logging
+import sys
+
+# the daemon sets this to a dict so clients, with their sessions and flow
+# index, are reused by every command it runs
+CLIENTS = None
+
+
+def get_client(args, parser):
+    if not args.user:
+        parser.error("Must specify username with -u")
+    if not args.password:
+        parser.error("Must specify password with -p")
+    import oo_client.hpoo
+    import oo_client.utils
+    if not args.ssl:
+        from requests.packages import urllib3
+        urllib3.disable_warnings()
+    policy = oo_client.utils.PollPolicy(initial=args.poll_initial,
+                                        factor=args.poll_factor,
+                                        maximum=args.poll_max)
+    pool_size = max(10, args.parallel, args.upload_workers, args.config_workers)
+    # commands asking for other caches or a bigger pool get their own client
+    key = (args.central, args.user, args.password, args.ssl, args.flow_cache,
+           args.session_cache, args.response_cache, pool_size)
+    if CLIENTS is not None and key in CLIENTS:
+        client = CLIENTS[key]
+        client.poll_policy = policy
+        client.deploy_id = None
+        client.rest.metrics = args.metrics
+        return client
+    client = oo_client.hpoo.OOClient(args.central, args.user, args.password, ssl=args.ssl,
+                                     poll_policy=policy, flow_cache=args.flow_cache,
+                                     pool_size=pool_size,
+                                     session_cache=args.session_cache,
+                                     response_cache=args.response_cache,
+                                     metrics=args.metrics)
+    if CLIENTS is not None:
+        CLIENTS[key] = client
+    return client
+
+
+def get_history(args):
+    if not args.duration_history and not args.duration_history_file:
+        return None
+    import oo_client.durations
+    import oo_client.utils
+    return oo_client.durations.DurationHistory(
+        args.duration_history_file or oo_client.utils.cache_file(args.central, 'durations'))
+
+
+def shard_spec(value):
+    """
+    K/N on the command line as (K, N).
+    """
+    try:
+        index, count = [int(n) for n in value.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('Shard must be K/N, e.g. 1/4')
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError('Shard K/N needs 1 <= K <= N')
+    return index, count
+
+
+def run_daemon(args):
+    import oo_client.daemon
+    socket_path = args.daemon_socket or oo_client.daemon.default_socket()
+    if args.daemon == 'start':
+        oo_client.daemon.HpooDaemon(socket_path, idle=args.daemon_idle or None).serve()
+        sys.exit(0)
+    elif args.daemon == 'stop':
+        sys.exit(0 if oo_client.daemon.stop(socket_path) else 1)
+    else:
+        running = oo_client.daemon.is_running(socket_path)
+        print('running' if running else 'stopped')
+        sys.exit(0 if running else 1)
+
+
+def forward(argv, args):
+    """
+    Run the command on the daemon if one is listening, falls back to
+    running it here.
+    """
+    import oo_client.daemon
+    socket_path = args.daemon_socket or oo_client.daemon.default_socket()
+    argv = [arg for arg in argv if arg != '--use-daemon']
+    # SIGTERM hangs up on the daemon like Ctrl-C, which interrupts the command
+    previous_handler = handle_sigterm()
+    code = oo_client.daemon.forward(argv, socket_path)
+    if code is None:
+        if previous_handler is not None:
+            import signal
+            signal.signal(signal.SIGTERM, previous_handler)
+        logging.getLogger('hpoo').info("No hpoo daemon on {0}, running"
+                                       " the command here".format(socket_path))
+        return
+    sys.exit(code)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("requests").setLevel(logging.WARNING)
+    
+    parser = argparse.ArgumentParser(description='Run OO commands')
+    parser.add_argument('-a', 
+                        dest='action',
+                        type=str,
+                        help='Name of action to perform',
+                        choices=['deploy', 'run', 'integration_test', 'list_tests', 'build', 'get_config',
+                                 'set_config', 'sync_config', 'merge_reports'],
+                        # required=True
+                        )
+    parser.add_argument('-c', 
+                        dest='central',
+                        type=str,
+                        help='URL of central server, default to https://localhost:8443',
+                        default='https://localhost:8443')
+    parser.add_argument('-u', 
+                        dest='user',
+                        type=str,
+                        help='Central username')
+    parser.add_argument('-p', 
+                        dest='password',
+                        type=str,
+                        help='Central password')
+    parser.add_argument('-k', 
+                        dest='ssl',
+                        action='store_false',
+                        help='Disable SSL checking')
+    parser.add_argument('-r', 
+                        dest='release',
+                        action='store_true',
+                        help='Release the content pack')
+    parser.add_argument('-cp', 
+                        dest='content_packs',
+                        type=str,
+                        nargs='+',
+                        help='One or more content packs to deploy')
+    parser.add_argument('-f', 
+                        dest='flows',
+                        type=str,
+                        nargs='+',
+                        help='Path or UUID of one or more flows')
+    parser.add_argument('-bp', 
+                        dest='build_path',
+                        type=str,
+                        help='Path to content pack to build')
+    parser.add_argument('-v', 
+                        dest='version',
+                        type=str,
+                        help='Version to mark build as',
+                        default=None)
+    parser.add_argument('-b', 
+                        dest='branch',
+                        type=str,
+                        help='Name of branch we are building from',
+                        default='trunk')
+    parser.add_argument('--filter', 
+                        dest='test_filter',
+                        type=str,
+                        help='Filter flows to run for test default to'
+                             ' tests/integration_tests/test_',
+                        default='tests/integration_tests/test_')
+    parser.add_argument('--jar',
+                        dest='jar',
+                        type=str,
+                        help='Built content pack to find test flows in instead of asking central')
+    parser.add_argument('--duration-history',
+                        dest='duration_history',
+                        action='store_true',
+                        help='Keep how long each test flow took in ~/.cache/oo_client'
+                             ' and start the longest first with --parallel')
+    parser.add_argument('--duration-history-file',
+                        dest='duration_history_file',
+                        type=str,
+                        help='Like --duration-history but kept in this file, give every'
+                             ' agent the same file to balance --shard by duration. Shards'
+                             ' only read it, merge_reports adds their durations')
+    parser.add_argument('--shard',
+                        dest='shard',
+                        type=shard_spec,
+                        help='Only run or list share K of N of the test flows, e.g. 2/4,'
+                             ' balanced by duration with a duration history')
+    parser.add_argument('--reports',
+                        dest='reports',
+                        type=str,
+                        nargs='+',
+                        help='JSON reports of integration_test shards for merge_reports'
+                             ' to combine into --junit-xml and --json-report')
+    parser.add_argument('--junit-xml',
+                        dest='junit_xml',
+                        type=str,
+                        help='Write a JUnit XML report of integration_test with the'
+                             ' timings of each flow to this file')
+    parser.add_argument('--json-report',
+                        dest='json_report',
+                        type=str,
+                        help='Write a JSON report of integration_test with the submit,'
+                             ' start and finish times, polls and result of each flow'
+                             ' to this file')
+    parser.add_argument('-t', 
+                        dest='timeout',
+                        type=int,
+                        help='Timeout in seconds to wait for each flow'
+                             ' to complete or content pack deployment'
+                             ' default to 300',
+                        default=300) 
+    parser.add_argument('--parallel',
+                        dest='parallel',
+                        type=int,
+                        help='Maximum number of flows to run at once'
+                             ' default to 1',
+                        default=1)
+    parser.add_argument('--fail-fast',
+                        dest='fail_fast',
+                        action='store_true',
+                        help='Stop at the first flow that ends in ERROR, cancelling the'
+                             ' flows still running and skipping the rest')
+    parser.add_argument('--upload-workers',
+                        dest='upload_workers',
+                        type=int,
+                        help='Number of content packs to upload at once when deploying'
+                             ' default to 4',
+                        default=4)
+    parser.add_argument('--force',
+                        dest='force',
+                        action='store_true',
+                        help='Deploy content packs even if they are already on central')
+    parser.add_argument('--poll-initial',
+                        dest='poll_initial',
+                        type=float,
+                        help='Seconds to wait before first checking a flow'
+                             ' or deployment has finished default to 0.5',
+                        default=0.5)
+    parser.add_argument('--poll-factor',
+                        dest='poll_factor',
+                        type=float,
+                        help='Multiply the wait between checks by this much'
+                             ' each time default to 2',
+                        default=2.0)
+    parser.add_argument('--poll-max',
+                        dest='poll_max',
+                        type=float,
+                        help='Longest wait in seconds between checks'
+                             ' default to 5',
+                        default=5.0)
+    parser.add_argument('--flow-cache',
+                        dest='flow_cache',
+                        action='store_true',
+                        help='Keep flow path to UUID lookups in ~/.cache/oo_client'
+                             ' between runs')
+    parser.add_argument('--session-cache',
+                        dest='session_cache',
+                        action='store_true',
+                        help='Keep the login to central in ~/.cache/oo_client so later'
+                             ' calls skip the CSRF handshake')
+    parser.add_argument('--response-cache',
+                        dest='response_cache',
+                        action='store_true',
+                        help='Keep content pack, flow and configuration item lookups in'
+                             ' ~/.cache/oo_client for 5 minutes, checking with central'
+                             ' whether they changed after that')
+    parser.add_argument('--daemon',
+                        dest='daemon',
+                        choices=['start', 'stop', 'status'],
+                        help='Start a long running hpoo which keeps central sessions'
+                             ' open for --use-daemon, stop it or check it is running')
+    parser.add_argument('--use-daemon',
+                        dest='use_daemon',
+                        action='store_true',
+                        help='Run the command on the hpoo daemon if one is running')
+    parser.add_argument('--daemon-socket',
+                        dest='daemon_socket',
+                        type=str,
+                        help='Unix socket the daemon listens on default to'
+                             ' ~/.cache/oo_client/hpoo.sock')
+    parser.add_argument('--daemon-idle',
+                        dest='daemon_idle',
+                        type=int,
+                        help='Seconds without a command before the daemon exits,'
+                             ' 0 to run until stopped default to 3600',
+                        default=3600)
+    parser.add_argument('--build-workers',
+                        dest='build_workers',
+                        type=int,
+                        help='Number of files to compress at once when building'
+                             ' default to 1',
+                        default=1)
+    parser.add_argument('--svn-path', 
+                        dest='svn_path',
+                        type=str,
+                        help='Path relative to root containing trunk',
+                        default='')
+    parser.add_argument('-get-config',
+                        dest='get_config',
+                        help='Get all configuration items or get specific item(s) by specifying type (and path)',
+                        default=''
+                        )
+    parser.add_argument('-set-config',
+                        dest='set_config',
+                        help='Set a configuration item by providing type and path',
+                        )
+    parser.add_argument('-type',
+                        dest='config_type',
+                        help='Configuration item type',
+                        choices=['system-accounts', 'system-properties', 'group-aliases', 'domain-terms', 'selection-lists'],
+                        type=str,
+                        default='')
+    parser.add_argument('-path',
+                        dest='config_path',
+                        type=str,
+                        help='Path relative to Configuration/[type]',
+                        default='')
+    parser.add_argument('-value',
+                        dest='config_value',
+                        help='Configuration item value',
+                        type=str
+                        )
+    parser.add_argument('--output',
+                        dest='output',
+                        choices=['pretty', 'json', 'jsonl'],
+                        help='How get_config and set_config print configuration items:'
+                             ' indented JSON, compact JSON or one JSON object per line'
+                             ' default to pretty',
+                        default='pretty')
+    parser.add_argument('--match',
+                        dest='match',
+                        type=str,
+                        help='Only print configuration items whose name or type/name'
+                             ' matches this pattern, e.g. system-properties/db_*')
+    parser.add_argument('-file',
+                        dest='config_file',
+                        help='JSON file of configuration items for sync_config, a list of'
+                             ' {"type", "path", "value"} or {type: {path: value}}',
+                        type=str
+                        )
+    parser.add_argument('--dry-run',
+                        dest='dry_run',
+                        action='store_true',
+                        help='Log the configuration items sync_config would change'
+                             ' without changing them')
+    parser.add_argument('--config-workers',
+                        dest='config_workers',
+                        type=int,
+                        help='Number of configuration items to set at once'
+                             ' default to 4',
+                        default=4)
+    parser.add_argument('--metrics-file',
+                        dest='metrics_file',
+                        type=str,
+                        help='Write request latencies, status codes, bytes, retries and'
+                             ' polls to this file when the command finishes')
+    parser.add_argument('--metrics-format',
+                        dest='metrics_format',
+                        choices=['json', 'prometheus'],
+                        help='Format of --metrics-file, prometheus writes a textfile'
+                             ' for the node exporter default to json',
+                        default='json')
+    args = parser.parse_args(argv)
+
+    if args.daemon:
+        run_daemon(args)
+    if args.use_daemon and CLIENTS is None:
+        forward(argv, args)
+
+    args.metrics = None
+    if args.metrics_file:
+        import oo_client.metrics
+        args.metrics = oo_client.metrics.Metrics()
+    previous_handler = handle_sigterm()
+    try:
+        run_action(args, parser)
+    except KeyboardInterrupt:
+        # the flows still running were cancelled on the way out
+        logging.getLogger('hpoo').error("Interrupted")
+        sys.exit(130)
+    finally:
+        if previous_handler is not None:
+            import signal
+            signal.signal(signal.SIGTERM, previous_handler)
+        if args.metrics is not None:
+            args.metrics.write(args.metrics_file, format=args.metrics_format)
+
+
+def handle_sigterm():
+    """
+    Make SIGTERM, e.g. from a CI job being aborted, interrupt the command
+    like Ctrl-C so the flows it started are cancelled. Returns the handler
+    it replaced, None if it can't be set outside the main thread.
+    """
+    import signal
+
+    def interrupt(signum, frame):
+        raise KeyboardInterrupt()
+    try:
+        return signal.signal(signal.SIGTERM, interrupt)
+    except ValueError:
+        return None
+
+
+def run_action(args, parser):
+    if args.action == 'deploy':
+        if not args.content_packs:
+            parser.error('If action is deploy please specify content packs by path with -cp')
+        if get_client(args, parser).deploy_content_packs(args.content_packs,
+                                                         timeout=args.timeout,
+                                                         upload_workers=args.upload_workers,
+                                                         force=args.force):
+            sys.exit(0)
+        else:
+            sys.exit(1)
+    elif args.action == 'run':
+        if not args.flows:
+            parser.error('If action is run please specify a flow by path or UUID with -f')
+        if get_client(args, parser).run_flows(args.flows, timeout=args.timeout,
+                                              parallel=args.parallel,
+                                              fail_fast=args.fail_fast):
+            sys.exit(0)
+        else:
+            sys.exit(1)
+    elif args.action == 'integration_test':
+        if not args.content_packs:
+            parser.error('If action is integration_test please specify a content pack name with -cp')
+        if len(args.content_packs) != 1:
+            parser.error('Can only test one content pack at a time')
+        import oo_client.hpoo_tester
+        if oo_client.hpoo_tester.IntegrationTester(get_client(args, parser),
+                                                   args.test_filter,
+                                                   history=get_history(args)).run_tests(args.content_packs[0],
+                                                                               timeout=args.timeout,
+                                                                               parallel=args.parallel,
+                                                                               jar=args.jar,
+                                                                               junit_xml=args.junit_xml,
+                                                                               json_report=args.json_report,
+                                                                               shard=args.shard,
+                                                                               fail_fast=args.fail_fast):
+            sys.exit(0)
+        else:
+            sys.exit(1)
+    elif args.action == 'list_tests':
+        if not args.content_packs or len(args.content_packs) != 1:
+            parser.error('If action is list_tests please specify one content pack name with -cp')
+        import oo_client.errors
+        import oo_client.hpoo_tester
+        # everything comes from the jar if given so we don't need central
+        client = None if args.jar else get_client(args, parser)
+        tester = oo_client.hpoo_tester.IntegrationTester(client, args.test_filter,
+                                                         history=get_history(args))
+        try:
+            flows = tester.find_tests(args.content_packs[0], jar=args.jar)
+        except oo_client.errors.NoFlowsFound:
+            sys.exit(1)
+        if args.shard:
+            flows = tester.shard(flows, *args.shard)
+        for flow in sorted(flows):
+            print(flow)
+        sys.exit(0)
+    elif args.action == 'merge_reports':
+        if not args.reports:
+            parser.error('If action is merge_reports please specify JSON reports with --reports')
+        import oo_client.report
+        try:
+            reports = [oo_client.report.TestReport.load(path) for path in args.reports]
+        except (IOError, ValueError, KeyError) as e:
+            parser.error('Could not read report: {0}'.format(e))
+        merged = oo_client.report.merge(reports)
+        if args.junit_xml:
+            merged.write_junit(args.junit_xml)
+        if args.json_report:
+            merged.write_json(args.json_report)
+        summary = merged.summary()
+        log = logging.getLogger('hpoo')
+        log.info("{0} tests: {1} passed, {2} failed, {3} did not complete".format(
+            summary['tests'], summary['passed'], summary['failed'], summary['error']))
+        missing = oo_client.report.missing_shards(reports)
+        for shard in missing:
+            log.error("No report for shard {0}/{1}".format(*shard))
+        unrun, repeated = oo_client.report.misassigned_flows(reports)
+        for flow in unrun:
+            log.error("No shard ran {0}".format(flow))
+        for flow in repeated:
+            log.error("More than one shard ran {0}".format(flow))
+        history = get_history(args)
+        if history is not None:
+            history.record(merged)
+            history.save()
+        sys.exit(1 if missing or unrun or repeated or summary['failed'] or summary['error'] else 0)
+    elif args.action == 'build':
+        if not args.build_path:
+            parser.error("Must specify path to content pack to build with -bp")
+        import oo_client.hpoo_builder
+        cb = oo_client.hpoo_builder.ContentBuilder(args.build_path,
+                                                   args.svn_path)
+        cb.run_build(release=args.release, branch=args.branch,
+                     version=args.version, workers=args.build_workers)
+
+    if args.action == 'get_config':
+        import oo_client.output
+        client = get_client(args, parser)
+        if not args.config_type or not args.config_path:
+            ret = oo_client.output.filter_items(client.iter_configuration_items(args.config_type),
+                                                args.match)
+        else:
+            ret = client.get_a_configuration_item(args.config_type, args.config_path)
+        if oo_client.output.write(ret, format=args.output):
+            sys.exit(0)
+        else:
+            sys.exit(1)
+    if args.action == 'set_config':
+        if not args.config_type or not args.config_path:
+            parser.error('Must specify type and path of the configuration item')
+        if not args.config_value:
+            parser.error('Must specify value to be set to')
+        ret = get_client(args, parser).set_a_configuration_item(args.config_type, args.config_path,
+                                                                args.config_value)
+        if ret:
+            import oo_client.output
+            oo_client.output.write(ret, format=args.output)
+            sys.exit(0)
+        else:
+            sys.exit(1)
+    if args.action == 'sync_config':
+        if not args.config_file:
+            parser.error('Must specify a file of configuration items with -file')
+        import json
+        try:
+            with open(args.config_file) as config_file:
+                items = json.load(config_file)
+        except (IOError, ValueError) as e:
+            parser.error('Could not read {0}: {1}'.format(args.config_file, e))
+        result = get_client(args, parser).sync_configuration_items(items,
+                                                                   dry_run=args.dry_run,
+                                                                   workers=args.config_workers)
+        sys.exit(1 if result['failed'] else 0)
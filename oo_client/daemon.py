@@ -0,0 +1,258 @@
+import errno
+import json
+import logging
+import os
+import select
+import socket
+import sys
+import threading
+import SocketServer
+import oo_client.cli as cli
+import oo_client.utils as utils
+
+
+def default_socket():
+    return os.path.join(utils.cache_dir(), 'hpoo.sock')
+
+
+class _Stream(object):
+    """
+    File-like object which sends everything written to it back to the
+    client as {"stream": name, "data": text} lines.
+    """
+    def __init__(self, wfile, name, lock):
+        self.wfile = wfile
+        self.name = name
+        self.lock = lock
+
+    def write(self, data):
+        if not data:
+            return
+        line = json.dumps({'stream': self.name, 'data': data}) + '\n'
+        with self.lock:
+            try:
+                self.wfile.write(line)
+                self.wfile.flush()
+            except socket.error:
+                # the client went away, _HangupWatcher interrupts the
+                # command
+                pass
+
+    def flush(self):
+        pass
+
+
+class _HangupWatcher(threading.Thread):
+    """
+    Interrupts the running command with utils.interrupt() if its client
+    hangs up, e.g. on Ctrl-C, so the flows it started are cancelled
+    rather than left running on central.
+    """
+    def __init__(self, connection):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.connection = connection
+        self.finished = threading.Event()
+        self.log = logging.getLogger('HpooDaemon')
+
+    def run(self):
+        while not self.finished.is_set():
+            try:
+                readable = select.select([self.connection], [], [], 0.1)[0]
+                hung_up = readable and not self.connection.recv(1)
+            except (select.error, socket.error):
+                hung_up = True
+            if hung_up:
+                self.log.info("Client hung up, interrupting the command")
+                utils.interrupt()
+                return
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+
+
+class _CommandHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        if request.get('command') == 'stop':
+            self.server.running = False
+            self._send({'exit': 0})
+        elif request.get('command') == 'ping':
+            self._send({'exit': 0})
+        else:
+            self._send({'exit': self.server.run(request['argv'],
+                                                request.get('cwd'),
+                                                self.wfile,
+                                                self.connection)})
+
+    def _send(self, message):
+        try:
+            self.wfile.write(json.dumps(message) + '\n')
+        except socket.error:
+            pass
+
+    def finish(self):
+        try:
+            SocketServer.StreamRequestHandler.finish(self)
+        except socket.error:
+            # the client hung up before reading everything
+            pass
+
+
+class HpooDaemon(SocketServer.UnixStreamServer):
+    """
+    Runs hpoo commands sent over a unix socket by `hpoo --use-daemon`
+    inside one long lived process, so the OOClient for each central and
+    user, with its keep-alive connections, login and flow index, is only
+    set up once. Commands run one at a time, their stdout, stderr and log
+    are streamed back to the client followed by the exit code. Exits
+    after idle seconds without a command if idle is given.
+    """
+    def __init__(self, socket_path, idle=None):
+        self.socket_path = socket_path
+        self.running = False
+        self.timeout = idle
+        self.log = logging.getLogger(self.__class__.__name__)
+        socket_dir = os.path.dirname(socket_path)
+        if socket_dir and not os.path.isdir(socket_dir):
+            os.makedirs(socket_dir, 0o700)
+        if os.path.exists(socket_path):
+            if is_running(socket_path):
+                raise RuntimeError('hpoo daemon already running on'
+                                   ' {0}'.format(socket_path))
+            os.remove(socket_path)
+        # only this user may connect, commands carry their password
+        umask = os.umask(0o077)
+        try:
+            SocketServer.UnixStreamServer.__init__(self, socket_path,
+                                                   _CommandHandler)
+        finally:
+            os.umask(umask)
+        cli.CLIENTS = {}
+
+    def serve(self):
+        self.running = True
+        self.log.info("hpoo daemon listening on {0}".format(self.socket_path))
+        try:
+            while self.running:
+                self.handle_request()
+        finally:
+            self.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            cli.CLIENTS = None
+        self.log.info("hpoo daemon stopped")
+
+    def handle_timeout(self):
+        self.log.info("No commands for {0}s, stopping".format(self.timeout))
+        self.running = False
+
+    def run(self, argv, cwd, wfile, connection=None):
+        """
+        Run one hpoo command line, returns its exit code. The command is
+        interrupted like on Ctrl-C if the client hangs up on connection.
+        """
+        lock = threading.Lock()
+        stdout, stderr = sys.stdout, sys.stderr
+        handler = logging.StreamHandler(_Stream(wfile, 'log', lock))
+        handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        root = logging.getLogger()
+        root.addHandler(handler)
+        sys.stdout = _Stream(wfile, 'stdout', lock)
+        sys.stderr = _Stream(wfile, 'stderr', lock)
+        old_cwd = os.getcwd()
+        utils.clear_interrupt()
+        watcher = None
+        if connection is not None:
+            watcher = _HangupWatcher(connection)
+            watcher.start()
+        try:
+            if cwd:
+                os.chdir(cwd)
+            cli.main(argv)
+            return 0
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                return e.code or 0
+            sys.stderr.write('{0}\n'.format(e.code))
+            return 1
+        except Exception:
+            logging.getLogger('hpoo').exception("Command failed")
+            return 1
+        finally:
+            if watcher is not None:
+                watcher.stop()
+            for client in (cli.CLIENTS or {}).values():
+                client.flush()
+            utils.clear_interrupt()
+            sys.stdout, sys.stderr = stdout, stderr
+            root.removeHandler(handler)
+            os.chdir(old_cwd)
+
+
+def _request(socket_path, request):
+    """
+    Send request to the daemon, yields each message it sends back.
+    Raises socket.error if nothing is listening.
+    """
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_path)
+        conn.sendall(json.dumps(request) + '\n')
+        for line in conn.makefile('rb'):
+            yield json.loads(line)
+    finally:
+        conn.close()
+
+
+def forward(argv, socket_path=None):
+    """
+    Run an hpoo command line on the daemon, writing what it outputs to
+    this process's stdout and stderr. Returns the exit code, or None if
+    no daemon is listening on socket_path.
+    """
+    socket_path = socket_path or default_socket()
+    streams = {'stdout': sys.stdout, 'stderr': sys.stderr,
+               'log': sys.stderr}
+    messages = _request(socket_path, {'argv': argv, 'cwd': os.getcwd()})
+    try:
+        for message in messages:
+            if 'exit' in message:
+                return message['exit']
+            stream = streams[message['stream']]
+            stream.write(message['data'])
+            stream.flush()
+    except socket.error as e:
+        if e.errno in (errno.ENOENT, errno.ECONNREFUSED):
+            return None
+        raise
+    except KeyboardInterrupt:
+        # hanging up makes the daemon interrupt the command, which
+        # cancels the flows it started
+        messages.close()
+        sys.stderr.write('Interrupted\n')
+        return 130
+    sys.stderr.write('hpoo daemon closed the connection\n')
+    return 1
+
+
+def is_running(socket_path=None):
+    try:
+        return any('exit' in message for message in
+                   _request(socket_path or default_socket(),
+                            {'command': 'ping'}))
+    except socket.error:
+        return False
+
+
+def stop(socket_path=None):
+    try:
+        return any('exit' in message for message in
+                   _request(socket_path or default_socket(),
+                            {'command': 'stop'}))
+    except socket.error:
+        return False
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import logging
+import os
+import zipfile
+from collections import namedtuple
+
+JarDetails = namedtuple('JarDetails', ['name', 'version', 'sha1'])
+
+
+def jar_details(jar_path):
+    """
+    Content pack name and version from the jar's contentpack.properties
+    and the sha1 of the jar, None if the jar can't be read.
+    """
+    try:
+        with zipfile.ZipFile(jar_path) as jar:
+            props = jar.read('contentpack.properties')
+        sha1 = hashlib.sha1()
+        with open(jar_path, 'rb') as jar:
+            for block in iter(lambda: jar.read(1024 * 1024), b''):
+                sha1.update(block)
+    except (IOError, KeyError, zipfile.BadZipfile):
+        return None
+    config = {}
+    for line in props.splitlines():
+        line = line.strip()
+        if line and not line.startswith(('#', '!')) and '=' in line:
+            key, value = line.split('=', 1)
+            config[key.strip()] = value.strip()
+    if 'content.pack.name' not in config:
+        return None
+    return JarDetails(config['content.pack.name'],
+                      config.get('content.pack.version'), sha1.hexdigest())
+
+
+class DeployRecord(object):
+    """
+    The sha1 and version of the jar last deployed to a central for each
+    content pack name, so deploying the same jar again can be skipped.
+    If cache_path is given the record is loaded from and saved to that
+    file.
+    """
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self.packs = {}
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.load()
+
+    def add(self, details):
+        self.packs[details.name] = {'version': details.version,
+                                    'sha1': details.sha1}
+
+    def matches(self, details):
+        """
+        True if details are of the jar last deployed for its content pack.
+        """
+        return self.packs.get(details.name) == {'version': details.version,
+                                                'sha1': details.sha1}
+
+    def sha1(self, details):
+        """
+        The sha1 of the jar last deployed with the name and version of
+        details, None if there isn't one.
+        """
+        pack = self.packs.get(details.name)
+        if pack and pack['version'] == details.version:
+            return pack['sha1']
+        return None
+
+    def __len__(self):
+        return len(self.packs)
+
+    def load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path) as cache:
+                self.packs = json.load(cache)
+        except (ValueError, IOError) as e:
+            self.log.warning("Ignoring unreadable deploy record"
+                             " {0}: {1}".format(self.cache_path, e))
+
+    def save(self):
+        if not self.cache_path:
+            return
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        tmp_path = '{0}.tmp'.format(self.cache_path)
+        with open(tmp_path, 'w') as cache:
+            json.dump(self.packs, cache)
+        os.rename(tmp_path, self.cache_path)
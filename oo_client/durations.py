@@ -0,0 +1,98 @@
+import json
+import logging
+import os
+
+
+class DurationHistory(object):
+    """
+    How long each flow took the last few times it ran, by flow path, to
+    start the longest flows first when running several at once. If
+    cache_path is given the history is loaded from and saved to that
+    file.
+    """
+    def __init__(self, cache_path=None, keep=5):
+        self.cache_path = cache_path
+        self.keep = keep
+        self.durations = {}
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.load()
+
+    def add(self, flow_path, seconds):
+        durations = self.durations.setdefault(flow_path, [])
+        durations.append(round(seconds, 3))
+        del durations[:-self.keep]
+
+    def record(self, report):
+        """
+        Add the durations of the completed runs in a report.TestReport.
+        """
+        for test in report.tests():
+            if test['status'] == 'COMPLETED' and \
+                    test.get('duration') is not None:
+                self.add(test['flow'], test['duration'])
+
+    def expected(self, flow_path):
+        """
+        Mean of the recorded durations of the flow, None if it has none.
+        """
+        durations = self.durations.get(flow_path)
+        if not durations:
+            return None
+        return sum(durations) / len(durations)
+
+    def longest(self):
+        expected = [self.expected(path) for path in self.durations]
+        return max(expected) if expected else None
+
+    def order(self, flows):
+        """
+        flows sorted longest expected first. Flows never seen are
+        expected to take as long as the longest known one, so a new slow
+        test can't end up last. Ties keep their order in flows.
+        """
+        longest = self.longest()
+        if longest is None:
+            return list(flows)
+
+        def expected(flow):
+            seconds = self.expected(flow)
+            return longest if seconds is None else seconds
+        return sorted(flows, key=expected, reverse=True)
+
+    def makespan(self, flows, parallel):
+        """
+        Expected seconds to run flows in this order keeping up to
+        parallel running, None if any flow has no history.
+        """
+        expected = [self.expected(flow) for flow in flows]
+        if None in expected:
+            return None
+        slots = [0.0] * max(1, parallel)
+        for seconds in expected:
+            slots.sort()
+            slots[0] += seconds
+        return max(slots) if slots else 0.0
+
+    def __len__(self):
+        return len(self.durations)
+
+    def load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path) as cache:
+                self.durations = json.load(cache)
+        except (ValueError, IOError) as e:
+            self.log.warning("Ignoring unreadable duration history"
+                             " {0}: {1}".format(self.cache_path, e))
+
+    def save(self):
+        if not self.cache_path:
+            return
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        tmp_path = '{0}.tmp'.format(self.cache_path)
+        with open(tmp_path, 'w') as cache:
+            json.dump(self.durations, cache)
+        os.rename(tmp_path, self.cache_path)
@@ -0,0 +1,79 @@
+import json
+import logging
+import os
+import posixpath
+import threading
+
+
+class FlowIndex(object):
+    """
+    Flow path -> UUID and UUID -> content pack name lookups, so running
+    or inspecting a flow by path doesn't need a request to central each
+    time. Paths are stored without their .xml extension. If cache_path is
+    given the index is loaded from and saved to that file. Safe to use
+    from several threads, e.g. AsyncOOClient's workers.
+    """
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self.uuids = {}
+        self.cp_names = {}
+        self._lock = threading.Lock()
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.load()
+
+    @staticmethod
+    def key(flow_path):
+        folder = posixpath.dirname(flow_path)
+        name = posixpath.splitext(posixpath.basename(flow_path))[0]
+        return posixpath.join(folder, name)
+
+    def add(self, flow_path, uuid, cp_name=None):
+        with self._lock:
+            self.uuids[self.key(flow_path)] = uuid
+            if cp_name:
+                self.cp_names[uuid] = cp_name
+
+    def add_cp_name(self, uuid, cp_name):
+        with self._lock:
+            self.cp_names[uuid] = cp_name
+
+    def get_uuid(self, flow_path):
+        return self.uuids.get(self.key(flow_path))
+
+    def get_cp_name(self, uuid):
+        return self.cp_names.get(uuid)
+
+    def clear(self):
+        with self._lock:
+            self.uuids = {}
+            self.cp_names = {}
+            if self.cache_path and os.path.exists(self.cache_path):
+                os.remove(self.cache_path)
+
+    def __len__(self):
+        return len(self.uuids)
+
+    def load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path) as cache:
+                data = json.load(cache)
+            self.uuids = data['uuids']
+            self.cp_names = data['cp_names']
+        except (ValueError, KeyError, IOError) as e:
+            self.log.warning("Ignoring unreadable flow cache"
+                             " {0}: {1}".format(self.cache_path, e))
+
+    def save(self):
+        if not self.cache_path:
+            return
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        tmp_path = '{0}.{1}.tmp'.format(self.cache_path, os.getpid())
+        with self._lock:
+            with open(tmp_path, 'w') as cache:
+                json.dump({'uuids': self.uuids, 'cp_names': self.cp_names},
+                          cache)
+            os.rename(tmp_path, self.cache_path)
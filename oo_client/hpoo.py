@@ -1,102 +1,560 @@
 import requests
 import json
 import os.path
+import posixpath
 import oo_client.utils as utils
 import oo_client.errors as errors
+import oo_client.jsonstream as jsonstream
+from oo_client.multipart import MultipartFile, UploadProgress
 import logging
+import threading
+import time
+from multiprocessing.pool import ThreadPool
 from uuid import UUID
+from oo_client.watcher import ExecutionWatcher, RUN_FINISHED_STATES
+from oo_client.flow_index import FlowIndex
+from oo_client.cache import ResponseCache
+from oo_client.deploy_record import DeployRecord, jar_details
 
 
 class OORestCaller(object):
-    def __init__(self, central_url, user, password, version="v1", ssl=True):
+    """
+    Safe to share between threads: the session's headers are never
+    changed after __init__, the CSRF token is kept under a lock and added
+    to each request, and pool_size keep-alive connections are pooled.
+    The CSRF handshake only happens before the first put/post. With
+    session_cache (a file path) the session cookies and token are kept
+    between processes so later ones can skip the handshake entirely.
+    cache is an optional cache.ResponseCache for GETs of read mostly
+    endpoints. Every request is counted in metrics, a metrics.Metrics,
+    if given.
+    """
+    def __init__(self, central_url, user, password, version="v1", ssl=True,
+                 pool_size=10, session_cache=None, cache=None, metrics=None):
         # pylint: disable=fixme, line-too-long
         self.session = requests.Session()
         self.session.auth = (user, password)
         self.session.verify = ssl
-        self.session.headers.update({'accept': 'application/json',
-                                     'content-type': 'application/json'})
+        self.session.headers.update({'accept': 'application/json'})
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                                pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.central = central_url
         self.url = "{0}/oo/rest/{1}".format(central_url, version)
         self.log = logging.getLogger(self.__class__.__name__)
+        self.csrf_token = None
+        self.csrf_ready = False
+        self._csrf_lock = threading.Lock()
+        self._csrf_refreshes = 0
+        self.session_cache = session_cache
+        self.session_from_cache = False
+        self.cache = cache
+        self.metrics = metrics
+        self.load_session()
+
+    def headers(self, content_type='application/json'):
+        headers = {}
+        if content_type:
+            headers['content-type'] = content_type
+        token = self.csrf_token
+        if token:
+            headers['X-CSRF-TOKEN'] = token
+        return headers
+
+    def refresh_csrf(self):
+        """
+        Get a new CSRF token, threads calling this together only make one
+        round of requests. Every GET updates csrf_token so refreshes are
+        counted separately.
+        """
+        refreshes = self._csrf_refreshes
+        with self._csrf_lock:
+            if self._csrf_refreshes != refreshes:
+                # another thread got a new token while we waited
+                return
+            # We have to get twice for valid CSRF because OO?
+            self.get('version')
+            self.get('version')
+            self.csrf_ready = True
+            self._csrf_refreshes += 1
+            self.save_session()
+
+    def ensure_csrf(self):
+        if not self.csrf_ready:
+            self.refresh_csrf()
+
+    def load_session(self):
+        if not self.session_cache or not os.path.exists(self.session_cache):
+            return
+        try:
+            with open(self.session_cache) as cache:
+                data = json.load(cache)
+            requests.utils.add_dict_to_cookiejar(self.session.cookies,
+                                                 data['cookies'])
+            self.csrf_token = data['csrf_token']
+        except (ValueError, KeyError, IOError) as e:
+            self.log.warning("Ignoring unreadable session cache"
+                             " {0}: {1}".format(self.session_cache, e))
+            return
+        self.csrf_ready = True
+        self.session_from_cache = True
+
+    def save_session(self):
+        if not self.session_cache:
+            return
+        cache_dir = os.path.dirname(self.session_cache)
+        if cache_dir and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        cookies = requests.utils.dict_from_cookiejar(self.session.cookies)
+        # the cookies log in as this user so keep them private
+        fd = os.open(self.session_cache,
+                     os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as cache:
+            json.dump({'cookies': cookies, 'csrf_token': self.csrf_token},
+                      cache)
 
     def get(self, url_path, **kwargs):
-        req = self.session.get("{0}/{1}".format(self.url, url_path),
-                               params=kwargs)
-        if req.status_code not in range(200, 205):
+        if self.cache is None or not self.cache.cacheable(url_path):
+            return self._json(self._get(url_path, kwargs).text)
+        key = self.cache.key(url_path, kwargs)
+        entry, fresh = self.cache.lookup(key)
+        if fresh:
+            return self._json(entry.text)
+        req = self._get(url_path, kwargs, self.cache.validators(entry))
+        if req.status_code == 304 and entry is not None:
+            self.cache.not_modified(key, entry)
+            return self._json(entry.text)
+        self.cache.store(key, req.text, req.headers.get('ETag'),
+                         req.headers.get('Last-Modified'))
+        return self._json(req.text)
+
+    def iter_get(self, url_path, chunk_size=64 * 1024, **kwargs):
+        """
+        Yield the elements of a JSON array response one at a time as it
+        downloads rather than decoding the whole document, for the
+        likes of config-items and content-tree on a big central.
+        Cacheable responses are streamed too and cached once read to the
+        end, a fresh cached one is decoded from the cache.
+        """
+        key = entry = validators = None
+        if self.cache is not None and self.cache.cacheable(url_path):
+            key = self.cache.key(url_path, kwargs)
+            entry, fresh = self.cache.lookup(key)
+            if fresh:
+                for item in self._json(entry.text) or []:
+                    yield item
+                return
+            validators = self.cache.validators(entry)
+        req = self._get(url_path, kwargs, validators, stream=True)
+        if req.status_code == 304 and entry is not None:
+            req.close()
+            self.cache.not_modified(key, entry)
+            for item in self._json(entry.text) or []:
+                yield item
+            return
+        chunks = req.iter_content(chunk_size)
+        if self.metrics is not None:
+            chunks = self._count_received(url_path, chunks)
+        body = []
+        if key is not None:
+            chunks = _kept(chunks, body)
+        try:
+            for item in jsonstream.iter_array(chunks):
+                yield item
+        finally:
+            req.close()
+        if key is not None:
+            self.cache.store(key, b''.join(body).decode(req.encoding or
+                                                        'utf-8'),
+                             req.headers.get('ETag'),
+                             req.headers.get('Last-Modified'))
+
+    def _count_received(self, url_path, chunks):
+        received = 0
+        try:
+            for chunk in chunks:
+                received += len(chunk)
+                yield chunk
+        finally:
+            self.metrics.received('GET', url_path, received)
+
+    @staticmethod
+    def _json(text):
+        if text:
+            return jsonstream.loads(text)
+
+    def _get(self, url_path, params, validators=None, stream=False):
+        headers = self.headers(None)
+        if validators:
+            headers.update(validators)
+        req = self._timed('GET', url_path, lambda: self.session.get(
+            "{0}/{1}".format(self.url, url_path), params=params,
+            headers=headers, stream=stream), stream=stream)
+        if req.status_code not in range(200, 205) and \
+                not (validators and req.status_code == 304):
             raise errors.HTTPNon200(req.status_code, req.text)
         try:
-            csrf = req.headers['X-CSRF-TOKEN']
-            self.session.headers.update({'X-CSRF-TOKEN': csrf})
+            self.csrf_token = req.headers['X-CSRF-TOKEN']
         except KeyError:
             # OO 10 added CSRF at some point version so not a problem
             # if we don't get a token
             pass
-        if req.text:
-            return json.loads(req.text)
+        return req
+
+    def _timed(self, method, url_path, send, stream=False):
+        """
+        send() and count the request in metrics. A streamed response's
+        body is counted as it is read.
+        """
+        if self.metrics is None:
+            return send()
+        start = time.time()
+        try:
+            req = send()
+        except requests.exceptions.RequestException:
+            self.metrics.request(method, url_path, 'error',
+                                 time.time() - start)
+            raise
+        seconds = time.time() - start
+        sent = _content_length(req.request.headers)
+        received = 0 if stream else len(req.content)
+        self.metrics.request(method, url_path, req.status_code, seconds,
+                             sent, received)
+        return req
 
     def put(self, url_path, data):
-        req = self.session.put("{0}/{1}".format(self.url, url_path), data)
-        if req.status_code not in range(200, 205):
-            self.log.error(req.status_code)
-            self.log.error(req.text)
-            raise errors.HTTPNon200(req.status_code, req.text)
-        if req.text:
-            return json.loads(req.text)
+        return self._send('PUT', url_path, lambda: self.session.put(
+            "{0}/{1}".format(self.url, url_path), data,
+            headers=self.headers()))
 
     def post(self, url_path, data=None, files=None):
         if isinstance(data, dict):
             data = json.dumps(data)
         if files:
-            self.session.headers.pop('content-type')
-            req = self.session.post("{0}/{1}".format(self.url, url_path),
-                                    files=files)
-            self.session.headers.update({'content-type': 'application/json'})
-        else:
-            req = self.session.post("{0}/{1}".format(self.url, url_path), data)
+            # leave requests to set the multipart content-type
+            return self._send('POST', url_path, lambda: self.session.post(
+                "{0}/{1}".format(self.url, url_path), files=files,
+                headers=self.headers(None)))
+        return self._send('POST', url_path, lambda: self.session.post(
+            "{0}/{1}".format(self.url, url_path), data,
+            headers=self.headers()))
+
+    def post_file(self, url_path, file_path, field='file',
+                  chunk_size=1024 * 1024, progress=None):
+        """
+        Upload a file as multipart/form-data without reading it all into
+        memory, see multipart.MultipartFile for progress.
+        """
+        def send():
+            body = MultipartFile(field, file_path, chunk_size=chunk_size,
+                                 progress=progress)
+            return self.session.post("{0}/{1}".format(self.url, url_path),
+                                     data=body,
+                                     headers=self.headers(body.content_type))
+        return self._send('POST', url_path, send)
+
+    def _send(self, method, url_path, send):
+        """
+        Make a request that needs the CSRF token, logging in again once
+        if a cached session has expired. Cached responses it could have
+        changed are dropped.
+        """
+        self.ensure_csrf()
+        req = self._timed(method, url_path, send)
+        if req.status_code in (401, 403) and self.session_from_cache:
+            self.log.info("Cached session was rejected, logging in again")
+            self.session_from_cache = False
+            self.session.cookies.clear()
+            self.csrf_ready = False
+            self.refresh_csrf()
+            if self.metrics is not None:
+                self.metrics.retry(url_path)
+            req = self._timed(method, url_path, send)
+        if self.cache is not None:
+            self.cache.invalidate(url_path)
+        return self._response(req)
+
+    def _response(self, req):
         if req.status_code not in range(200, 205):
             self.log.error(req.status_code)
             self.log.error(req.text)
             raise errors.HTTPNon200(req.status_code, req.text)
-        if req.text:
-            return json.loads(req.text)
+        return self._json(req.text)
+
+
+def _kept(chunks, body):
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+
+
+def _content_length(headers):
+    try:
+        return int(headers.get('Content-Length') or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class Execution(object):
+    """
+    Handle on a run started by OOClient.run_flow_async. Holds on to the
+    last run summary so reading status, result, duration or link doesn't
+    go back to central; poll() or refresh() fetch a new summary.
+    submitted and completed are when the run was started and first seen
+    finished here, polls how many summaries were fetched.
+    """
+    __slots__ = ('oo', 'flow', 'run_id', 'response', 'summary', 'submitted',
+                 'completed', 'polls')
+
+    def __init__(self, oo_client, flow, response, submitted=None):
+        self.oo = oo_client
+        self.flow = flow
+        self.response = response
+        self.run_id = response['executionId']
+        self.summary = None
+        self.submitted = submitted or time.time()
+        self.completed = None
+        self.polls = 0
+
+    def __getitem__(self, key):
+        # run_flow_async used to return the response dict itself
+        return self.response[key]
+
+    def refresh(self):
+        return self.update(self.oo.get_run_summary(self.run_id))
+
+    def update(self, summary):
+        """
+        Keep a summary fetched for this run, e.g. by ExecutionWatcher.
+        """
+        self.summary = summary
+        self.polls += 1
+        if self.completed is None and \
+                summary.get('status') in RUN_FINISHED_STATES:
+            self.completed = time.time()
+        return summary
+
+    def poll(self):
+        """
+        Refresh the summary, returns True once the run has finished.
+        """
+        self.refresh()
+        return self.is_complete()
+
+    def is_complete(self):
+        return self.status in RUN_FINISHED_STATES
+
+    def _get_summary(self):
+        if self.summary is None:
+            self.refresh()
+        return self.summary
+
+    @property
+    def status(self):
+        return self._get_summary()['status']
+
+    @property
+    def result_type(self):
+        return self._get_summary().get('resultStatusType')
+
+    @property
+    def result(self):
+        """
+        The result type if the run completed, otherwise None.
+        """
+        if self.status == 'COMPLETED':
+            return self.result_type
+        return None
+
+    @property
+    def duration(self):
+        """
+        Seconds the run took on central, None until it has finished.
+        """
+        summary = self._get_summary()
+        if summary.get('startTime') and summary.get('endTime'):
+            return (summary['endTime'] - summary['startTime']) / 1000.0
+        return None
+
+    @property
+    def link(self):
+        return '{0}/oo/#/runtimeWorkspace/runs/' \
+               '{1}'.format(self.oo.rest.central, self.run_id)
+
+    def timings(self):
+        """
+        What happened to the run as a dict for reports: times are epoch
+        seconds, started and finished from central, duration is central's
+        and wall the time from submitting to seeing it finish.
+        """
+        summary = self.summary or {}
+        started = summary.get('startTime')
+        finished = summary.get('endTime')
+        return {'flow': self.flow, 'run_id': str(self.run_id),
+                'status': summary.get('status'),
+                'result_type': summary.get('resultStatusType'),
+                'submitted': round(self.submitted, 3),
+                'started': started / 1000.0 if started else None,
+                'finished': finished / 1000.0 if finished else None,
+                'completed': round(self.completed, 3)
+                if self.completed else None,
+                'duration': self.duration if self.summary else None,
+                'wall': round(self.completed - self.submitted, 3)
+                if self.completed else None,
+                'polls': self.polls, 'link': self.link}
 
 
 class OOClient(object):
-    def __init__(self, central_url, user, password, version="v1", ssl=True):
+    def __init__(self, central_url, user, password, version="v1", ssl=True,
+                 poll_policy=None, flow_cache=None, pool_size=10,
+                 session_cache=None, response_cache=None, deploy_record=True,
+                 metrics=None):
+        """
+        flow_cache keeps the flow path to UUID index between runs,
+        session_cache the login, response_cache the responses of read
+        mostly calls and deploy_record the jars deployed, True for the
+        default file for this central or a path to a file.
+        response_cache can also be a cache.ResponseCache.
+        metrics is a metrics.Metrics to count requests, retries and
+        polls in.
+        pool_size should be at least the number of threads sharing the
+        client, e.g. upload workers.
+        """
+        if session_cache is True:
+            session_cache = utils.cache_file('{0}|{1}'.format(central_url,
+                                                              user),
+                                             'session')
+        if response_cache is True:
+            response_cache = utils.cache_file('{0}|{1}'.format(central_url,
+                                                               user),
+                                              'responses')
+        if response_cache and not isinstance(response_cache, ResponseCache):
+            response_cache = ResponseCache(cache_path=response_cache)
         self.rest = OORestCaller(central_url, user, password, version=version,
-                                 ssl=ssl)
+                                 ssl=ssl, pool_size=pool_size,
+                                 session_cache=session_cache,
+                                 cache=response_cache or None,
+                                 metrics=metrics)
         self.log = logging.getLogger(self.__class__.__name__)
         self.deploy_id = None
-        # Checks OO is up and forces the CSRF token
-        self.rest.get('version')
-        # We have to get twice for valid CSRF because OO?
-        self.rest.get('version')
+        self.poll_policy = poll_policy or utils.PollPolicy()
+        if flow_cache is True:
+            flow_cache = utils.cache_file(central_url, 'flows')
+        self.flows = FlowIndex(flow_cache)
+        if deploy_record is True:
+            deploy_record = utils.cache_file(central_url, 'deployed')
+        self.deployed = DeployRecord(deploy_record or None)
+
+    def flush(self):
+        """
+        Save the response cache if it changed, it is saved at exit anyway.
+        """
+        if self.rest.cache is not None:
+            self.rest.cache.flush()
 
     def get_new_deployment(self):
         return self.rest.post('deployments', None)['deploymentProcessId']
 
-    def deploy_content_packs(self, path_list, timeout=3600):
+    def deploy_content_packs(self, path_list, timeout=3600,
+                             upload_workers=4, upload_retries=2,
+                             force=False):
         """
         Deploy a list of content packs
         return True if they all succeed, otherwise False
+        Jars already on central are skipped unless force is True, see
+        undeployed_content_packs.
+        """
+        if not force:
+            path_list = self.undeployed_content_packs(path_list)
+            if not path_list:
+                self.log.info("Every content pack is already deployed")
+                return True
+        deploy_id = self.start_deployment(path_list,
+                                          upload_workers=upload_workers,
+                                          upload_retries=upload_retries)
+        self.log.info("Deployment started, waiting up"
+                      " to {0}s to complete".format(timeout))
+        results = self.wait_for_deployment_to_complete(deploy_id, timeout)
+        self.record_deployment(path_list, results)
+        return self.deployment_succeeded(results)
+
+    def undeployed_content_packs(self, path_list):
+        """
+        The jars in path_list that need deploying. A jar is skipped when
+        central lists a content pack with its name and version and either
+        this jar is the last one deployed with that version from here, or
+        none was and the version is a release.
+        """
+        details = {}
+        for file_path in path_list:
+            jar = jar_details(file_path)
+            if jar:
+                details[file_path] = jar
+        if not details:
+            return list(path_list)
+        on_central = set((cp['name'], cp.get('version'))
+                         for cp in self.rest.get('content-packs'))
+        undeployed = []
+        for file_path in path_list:
+            jar = details.get(file_path)
+            if not jar or (jar.name, jar.version) not in on_central:
+                undeployed.append(file_path)
+                continue
+            sha1 = self.deployed.sha1(jar)
+            if sha1 is None and (jar.version or '').endswith('SNAPSHOT'):
+                undeployed.append(file_path)
+            elif sha1 is not None and sha1 != jar.sha1:
+                self.log.warning("{0} differs from the {1} {2} deployed"
+                                 " before, deploying it".format(
+                                     os.path.basename(file_path), jar.name,
+                                     jar.version))
+                undeployed.append(file_path)
+            else:
+                self.log.info("{0} {1} is already deployed, skipping"
+                              " {2}".format(jar.name, jar.version,
+                                            os.path.basename(file_path)))
+        return undeployed
+
+    def record_deployment(self, path_list, results):
+        """
+        Remember the jars from path_list that deployed successfully.
+        """
+        responses = results.get('contentPackResponses', {})
+        recorded = False
+        for file_path in path_list:
+            res = responses.get(os.path.basename(file_path))
+            if not res or \
+                    res['responses'][0]['responseCategory'] != 'Success':
+                continue
+            jar = jar_details(file_path)
+            if jar:
+                self.deployed.add(jar)
+                recorded = True
+        if recorded:
+            self.deployed.save()
+
+    def start_deployment(self, path_list, upload_workers=4,
+                         upload_retries=2):
+        """
+        Upload the content packs and start deploying them without
+        waiting, returns the deployment ID.
         """
         if not self.deploy_id:
             self.deploy_id = self.get_new_deployment()
             self.log.info("Got new deployment ID: {0}".format(self.deploy_id))
-        for file_path in path_list:
-            self.log.info("Starting uploads...")
-            with open(file_path, 'rb') as cp:
-                filename = os.path.basename(file_path)
-                ret = self.rest.post("deployments/"
-                                     "{0}/files".format(self.deploy_id),
-                                     files={'file': (filename, cp)})
-                self.log.info("Uploaded {0}".format(filename))
-                self.log.debug(ret)
-        ret = self.rest.put('deployments/{0}'.format(self.deploy_id), None)
-        self.log.info("Deployment started, waiting up"
-                      " to {0}s to complete".format(timeout))
-        results = self.wait_for_deployment_to_complete(self.deploy_id,
-                                                       timeout, 5)
+        self.log.info("Starting uploads...")
+        self.upload_content_packs(self.deploy_id, path_list,
+                                  workers=upload_workers,
+                                  retries=upload_retries)
+        self.rest.put('deployments/{0}'.format(self.deploy_id), None)
+        return self.deploy_id
+
+    def deployment_succeeded(self, results):
+        """
+        Log the outcome of a finished deployment from its
+        deploymentResultVO, True if every content pack deployed.
+        """
         self.log.debug(results)
         all_res = []
         for cp, res in results['contentPackResponses'].items():
@@ -110,10 +568,69 @@ class OOClient(object):
                 self.log.info("Deployed {0} successfully".format(cp))
                 all_res.append(True)
         self.log.debug(all_res)
+        if any(all_res):
+            # flows may have been added, moved or removed
+            self.flows.clear()
+            if self.rest.cache is not None:
+                self.rest.cache.invalidate('deployments')
         if not all_res:
             return False
         return all(all_res)
 
+    def upload_content_packs(self, deploy_id, path_list, workers=4,
+                             retries=2):
+        """
+        Upload jars to a deployment, up to `workers` at a time. Raises
+        if any upload still fails after retrying, before the deployment
+        is started.
+        """
+        progress = UploadProgress('{0} content pack(s)'.format(len(path_list)),
+                                  log=self.log)
+        callbacks = [progress.for_file(file_path, os.path.getsize(file_path))
+                     for file_path in path_list]
+
+        def upload(args):
+            return self.upload_content_pack(deploy_id, *args, retries=retries)
+
+        jobs = list(zip(path_list, callbacks))
+        if workers < 2 or len(jobs) < 2:
+            return [upload(job) for job in jobs]
+        pool = ThreadPool(min(workers, len(jobs)))
+        try:
+            return pool.map(upload, jobs)
+        finally:
+            pool.terminate()
+
+    def upload_content_pack(self, deploy_id, file_path, progress=None,
+                            retries=2):
+        """
+        Upload one jar to a deployment, retrying connection errors and
+        5xx responses with a growing delay.
+        """
+        filename = os.path.basename(file_path)
+        delays = utils.PollPolicy(initial=1, factor=2, maximum=30).intervals()
+        attempt = 0
+        while True:
+            try:
+                ret = self.rest.post_file("deployments/"
+                                          "{0}/files".format(deploy_id),
+                                          file_path, progress=progress)
+                break
+            except (errors.HTTPNon200,
+                    requests.exceptions.RequestException) as e:
+                if attempt >= retries or \
+                        getattr(e, 'status_code', 500) < 500:
+                    raise
+                attempt += 1
+                self.count_retry("deployments/{0}/files".format(deploy_id))
+                self.log.warning("Uploading {0} failed, retrying"
+                                 " ({1}/{2})".format(filename, attempt,
+                                                     retries))
+                time.sleep(next(delays))
+        self.log.info("Uploaded {0}".format(filename))
+        self.log.debug(ret)
+        return ret
+
     def deploy_content_pack(self, file_url_path):
         cp_name = os.path.splitext(os.path.basename(file_url_path))[0]
         with open(file_url_path) as cp:
@@ -125,17 +642,21 @@ class OOClient(object):
             if api_response != 'Success':
                 self.log.error('{0}: {1}'.format(api_response, api_message))
                 return False
+            self.flows.clear()
             return True
 
     def is_deployment_complete(self, deploy_id):
+        self.count_poll('deployments')
         deployment = self.rest.get('deployments/{0}'.format(deploy_id))
         if deployment['status'] in ['FINISHED', 'FAILED']:
             return deployment['deploymentResultVO']
         else:
             return False
 
-    def wait_for_deployment_to_complete(self, deploy_id, timeout, interval):
-        func = utils.timeout(timeout, interval)(self.is_deployment_complete)
+    def wait_for_deployment_to_complete(self, deploy_id, timeout,
+                                        interval=None):
+        func = utils.timeout(timeout, interval,
+                             self.poll_policy)(self.is_deployment_complete)
         return func(deploy_id)
 
     def run_flow_async(self, flow, run_name=None, inputs={}):
@@ -149,68 +670,230 @@ class OOClient(object):
                    'runName': run_name,
                    'inputs': inputs}
         self.log.info('Running flow: {0}'.format(flow))
-        return self.rest.post('executions', data=payload)
+        submitted = time.time()
+        response = self.rest.post('executions', data=payload)
+        return Execution(self, flow, response, submitted)
 
-    def run_flow(self, flow, run_name=None, inputs={}, timeout=300):
+    def run_flow(self, flow, run_name=None, inputs={}, timeout=300,
+                 callback=None):
         '''
         Returns "RESOLVED", "ERROR", "DIAGNOSED", "NO_ACTION_TAKEN"
         or None if there is no result type.
+        callback is called with the Execution once it has finished.
+        The run is cancelled if it times out or waiting is interrupted.
         '''
         execution = self.run_flow_async(flow, run_name=run_name, inputs=inputs)
-        run_id = execution['executionId']
-        self.wait_for_run_to_complete(run_id, timeout, 5)
-        self.log.info("Flow {0} FINISHED: {1}, link"
-                      " {2}/oo/#/runtimeWorkspace/runs/"
-                      "{3}".format(flow,
-                                   self.get_run_result_type(run_id),
-                                   self.rest.central, run_id))
-        if self.get_run_status(run_id) == 'COMPLETED':
-            return self.get_run_result_type(run_id)
-        else:
-            return None
+        try:
+            self.wait_for_execution(execution, timeout)
+        except (Exception, KeyboardInterrupt):
+            self.cancel_executions([execution])
+            raise
+        self.log_execution(execution)
+        if callback:
+            callback(execution)
+        return execution.result
 
-    def run_flows(self, flows, timeout=300):
-        ret = []
-        for flow in flows:
-            ret.append(self.run_flow(flow, timeout=timeout))
+    def run_flows(self, flows, timeout=300, parallel=1, callback=None,
+                  fail_fast=False):
+        '''
+        Returns False if any flow returns "ERROR", otherwise True.
+        With parallel > 1 up to that many flows are run at once.
+        callback is called with each Execution as it finishes.
+        With fail_fast the first "ERROR" stops the rest from starting and
+        cancels the runs still going.
+        '''
+        if parallel > 1:
+            ret = self.run_flows_parallel(flows, parallel, timeout=timeout,
+                                          callback=callback,
+                                          fail_fast=fail_fast)
+        else:
+            ret = []
+            for flow in flows:
+                ret.append(self.run_flow(flow, timeout=timeout,
+                                         callback=callback))
+                if fail_fast and ret[-1] == 'ERROR':
+                    self.log_fail_fast(flow, len(flows) - len(ret), [])
+                    break
         if all([False if flow == 'ERROR' else True for flow in ret]):
             return True
         else:
             return False
 
+    def run_flows_parallel(self, flows, parallel, timeout=300, interval=None,
+                           callback=None, fail_fast=False):
+        '''
+        Keeps up to `parallel` executions running until all flows are done.
+        Returns the result type of each flow in the same order as `flows`,
+        None where the run didn't complete. callback is called with each
+        Execution as it finishes. The runs still going are cancelled on a
+        timeout or interrupt, and with fail_fast once a flow returns
+        "ERROR".
+        '''
+        if interval:
+            watcher = ExecutionWatcher(self, utils.PollPolicy.fixed(interval))
+        else:
+            watcher = ExecutionWatcher(self, self.poll_policy)
+        queue = list(enumerate(flows))
+        queue.reverse()
+        running = {}
+        results = [None] * len(flows)
+        failed = None
+        try:
+            while queue or running:
+                while queue and len(running) < parallel:
+                    index, flow = queue.pop()
+                    execution = self.run_flow_async(flow)
+                    running[index] = (execution,
+                                      watcher.watch_execution(execution,
+                                                              timeout=timeout))
+                watcher.sleep()
+                watcher.poll()
+                for index, (execution, future) in list(running.items()):
+                    if future.done():
+                        # raises TimeoutError if the run took too long
+                        future.result()
+                        del running[index]
+                        self.log_execution(execution)
+                        if callback:
+                            callback(execution)
+                        results[index] = execution.result
+                        if fail_fast and execution.result == 'ERROR' \
+                                and failed is None:
+                            failed = execution.flow
+                if failed is not None:
+                    executions = [execution for execution, _
+                                  in running.values()]
+                    self.log_fail_fast(failed, len(queue), executions)
+                    self.cancel_executions(executions)
+                    break
+        except (Exception, KeyboardInterrupt):
+            self.cancel_executions([execution for execution, _
+                                    in running.values()])
+            raise
+        return results
+
+    def log_fail_fast(self, flow, skipped, cancelled):
+        self.log.info("Flow {0} returned ERROR, cancelling {1} running and"
+                      " skipping {2} flows".format(flow, len(cancelled),
+                                                   skipped))
+
+    def cancel_run(self, run_id):
+        '''
+        Ask central to cancel a run, central ignores it if the run has
+        already finished.
+        '''
+        return self.rest.put('executions/{0}/status'.format(run_id),
+                             json.dumps({'action': 'cancel'}))
+
+    def cancel_executions(self, executions):
+        '''
+        Cancel the executions that haven't finished so they stop taking
+        central's workers, e.g. when giving up on them. Failing to cancel
+        one is logged, not raised, so it doesn't hide why we gave up.
+        '''
+        for execution in executions:
+            if execution.summary is not None and execution.is_complete():
+                continue
+            self.log.info("Cancelling flow {0}, run {1}".format(
+                execution.flow, execution.run_id))
+            try:
+                self.cancel_run(execution.run_id)
+            except Exception as e:
+                self.log.warning("Couldn't cancel run {0}: {1}".format(
+                    execution.run_id, e))
+
+    def log_execution(self, execution):
+        self.log.info("Flow {0} FINISHED: {1}, link"
+                      " {2}".format(execution.flow, execution.result_type,
+                                    execution.link))
+
     def is_run_complete(self, run_id):
         status = self.get_run_status(run_id)
-        if status in ['COMPLETED', 'SYSTEM_FAILURE', 'CANCELED']:
+        if status in RUN_FINISHED_STATES:
             return True
         else:
             return False
 
-    def wait_for_run_to_complete(self, run_id, timeout, interval):
-        return utils.timeout(timeout, interval)(self.is_run_complete)(run_id)
+    def wait_for_execution(self, execution, timeout, interval=None):
+        func = utils.timeout(timeout, interval,
+                             self.poll_policy)(execution.poll)
+        return func()
+
+    def wait_for_run_to_complete(self, run_id, timeout, interval=None):
+        func = utils.timeout(timeout, interval,
+                             self.poll_policy)(self.is_run_complete)
+        return func(run_id)
 
     def get_flow_uuid_from_path(self, flow_path):
+        uuid = self.flows.get_uuid(flow_path)
+        if uuid:
+            return uuid
         folder_name = os.path.dirname(flow_path)
         flow_name = os.path.splitext(os.path.basename(flow_path))[0]
         flows = self.rest.get('flows/tree/level', path=folder_name)
+        # index the whole folder, tests tend to live next to each other
+        for x in flows:
+            self.flows.add(posixpath.join(folder_name, x['name']), x['id'])
+        self.flows.save()
         flow = [x['id'] for x in flows if x['name'] == flow_name]
         if len(flow) != 1:
             raise errors.NotFound('Flow not found with path'
                                   ' {0}'.format(flow_path))
         return flow[0]
 
+    def index_flows(self, cp_name=None, folder='Library'):
+        '''
+        Fill the flow index in one go, from the content tree of cp_name if
+        given, otherwise by walking the library tree down from folder.
+        Returns the number of paths in the index.
+        '''
+        if cp_name:
+            self.get_all_flows_in_cp(cp_name)
+            return len(self.flows)
+        folders = [folder]
+        while folders:
+            current = folders.pop()
+            for item in self.rest.get('flows/tree/level', path=current):
+                path = posixpath.join(current, item['name'])
+                if item.get('leaf'):
+                    self.flows.add(path, item['id'])
+                else:
+                    folders.append(path)
+        self.flows.save()
+        return len(self.flows)
+
     def get_run_status(self, run_id):
         return self.get_run_summary(run_id)['status']
 
     def get_run_result_type(self, run_id):
         return self.get_run_summary(run_id)['resultStatusType']
 
+    def get_run_summaries(self, run_ids):
+        '''
+        Summaries of several runs in one call, keyed by run id as a string.
+        '''
+        self.count_poll('runs', len(run_ids))
+        ids = ','.join(str(run_id) for run_id in run_ids)
+        summaries = self.rest.get('executions/{0}/summary'.format(ids))
+        return dict((str(summary['executionId']), summary)
+                    for summary in summaries)
+
     def get_run_summary(self, run_id):
+        self.count_poll('runs')
         summary = self.rest.get('executions/{0}/summary'.format(run_id))
         if len(summary) != 1:
             raise errors.NotFound('No run summary found for run id:'
                                   ' {0}'.format(run_id))
         return summary[0]
 
+    def count_poll(self, kind, count=1):
+        if self.rest.metrics is not None:
+            self.rest.metrics.poll(kind, count)
+
+    def count_retry(self, url_path):
+        if self.rest.metrics is not None:
+            self.rest.metrics.retry(url_path)
+
     def get_content_pack_id(self, name):
         cps = self.rest.get('content-packs')
         ret = [cp['id'] for cp in cps if cp['name'] == name]
@@ -221,13 +904,21 @@ class OOClient(object):
 
     def get_content_pack_from_flow(self, flow_path):
         uuid = self.get_flow_uuid_from_path(flow_path)
-        return self.rest.get('flows/{0}'.format(uuid))['cpName']
+        cp_name = self.flows.get_cp_name(uuid)
+        if not cp_name:
+            cp_name = self.rest.get('flows/{0}'.format(uuid))['cpName']
+            self.flows.add_cp_name(uuid, cp_name)
+            self.flows.save()
+        return cp_name
 
     def get_all_flows_in_cp(self, cp_name):
         # pylint: disable=fixme, line-too-long
         cp_id = self.get_content_pack_id(cp_name)
-        tree = self.rest.get('content-packs/{0}/content-tree'.format(cp_id))
+        tree = self.rest.iter_get('content-packs/{0}/content-tree'.format(cp_id))
         flows = {flow['id']: flow['path'] for flow in tree if flow['type'] == 'FLOW'}
+        for uuid, path in flows.items():
+            self.flows.add(path, uuid, cp_name)
+        self.flows.save()
         return flows
 
     # Add ability to operate configuration items
@@ -243,35 +934,126 @@ class OOClient(object):
         system-accounts, system-properties
         """
         ret = self.rest.get('config-items/{0}/{1}'.format(type, path))
-        name_value = self.get_name_value_pair(ret)
-        print json.dumps(name_value, indent=4)
-        return name_value
+        return self.get_name_value_pair(ret)
 
     def set_a_configuration_item(self, type, path, data):
         # path includes name of the configuration item
         # data should be value
+        jdata = json.dumps(self.configuration_value(type, data))
+        ret = self.rest.put('config-items/{0}/{1}'.format(type, path), jdata)
+        return self.get_name_value_pair(ret)
+
+    @staticmethod
+    def configuration_value(type, data):
+        """
+        The value central keeps for data, system-accounts are given as
+        username:password or a dict with username and password.
+        """
         if type == 'system-accounts':
-            user_pass = data.partition(':')
-            username = user_pass[0]
-            password = user_pass[2]
+            if isinstance(data, dict):
+                username = data.get('username')
+                password = data.get('password')
+            else:
+                user_pass = data.partition(':')
+                username = user_pass[0]
+                password = user_pass[2]
             dct = {'username': username, 'password': password}
-            data = json.dumps(dct)
-        jdata = json.dumps(data)
-        print jdata
-        ret = self.rest.put('config-items/{0}/{1}'.format(type, path), jdata)
-        res = self.get_name_value_pair(ret)
-        print json.dumps(res, indent=4)
-        return res
+            return json.dumps(dct)
+        return data
+
+    def sync_configuration_items(self, items, dry_run=False, workers=4):
+        """
+        Make central's configuration items match items, a list of dicts
+        with type, path (or name) and value, or {type: {path: value}}.
+        Central's items are fetched once and only those that differ are
+        set, `workers` at a time. system-accounts are always set as
+        central masks their passwords. Items not given are left alone.
+        Returns the (type, path) of the items 'changed' (or that would
+        be with dry_run), 'unchanged' and 'failed', where items missing a
+        type, path or value are listed as given.
+        """
+        if isinstance(items, dict):
+            items = [{'type': type, 'path': path, 'value': value}
+                     for type, paths in sorted(items.items())
+                     for path, value in sorted(paths.items())]
+        current = {}
+        for item in self.rest.iter_get('config-items'):
+            current[(item['type'], item['path'])] = item['value']
+        result = {'changed': [], 'unchanged': [], 'failed': []}
+        changes = []
+        for item in items:
+            try:
+                key = (item['type'], item.get('path') or item['name'])
+                value = self.configuration_value(item['type'], item['value'])
+            except (KeyError, TypeError, AttributeError):
+                self.log.error("Configuration items need a type, path and"
+                               " value: {0}".format(item))
+                result['failed'].append(item)
+                continue
+            if key not in current:
+                self.log.error("No configuration item {0}/{1} on"
+                               " central".format(*key))
+                result['failed'].append(key)
+            elif key[0] != 'system-accounts' and current[key] == value:
+                result['unchanged'].append(key)
+            else:
+                changes.append((key, value))
+        for key, value in changes:
+            if key[0] == 'system-accounts':
+                change = 'account'
+            else:
+                change = '{0!r} -> {1!r}'.format(current[key], value)
+            self.log.info("{0} {1}/{2}: {3}".format(
+                'Would set' if dry_run else 'Setting', key[0], key[1],
+                change))
+        if dry_run:
+            result['changed'] = [key for key, _ in changes]
+            return result
+
+        def apply(change):
+            key, value = change
+            try:
+                self.rest.put('config-items/{0}/{1}'.format(*key),
+                              json.dumps(value))
+                return key, True
+            except (errors.HTTPNon200,
+                    requests.exceptions.RequestException) as e:
+                self.log.error("Failed to set {0}/{1}: {2}".format(
+                    key[0], key[1], e))
+                return key, False
+
+        if workers < 2 or len(changes) < 2:
+            applied = [apply(change) for change in changes]
+        else:
+            pool = ThreadPool(min(workers, len(changes)))
+            try:
+                applied = pool.map(apply, changes)
+            finally:
+                pool.terminate()
+        for key, ok in applied:
+            result['changed' if ok else 'failed'].append(key)
+        self.log.info("Configuration items: {0} changed, {1} unchanged,"
+                      " {2} failed".format(len(result['changed']),
+                                           len(result['unchanged']),
+                                           len(result['failed'])))
+        return result
 
     def get_configuration_items_by_type(self, type):
-        ret = self.rest.get('config-items/{0}'.format(type))
-        name_val = [{'name': d['name'], 'value': d['value']} for d in ret]
-        print json.dumps(name_val, indent=4)
-        return name_val
+        return [{'name': d['name'], 'value': d['value']}
+                for d in self.iter_configuration_items(type)]
 
     def get_all_configuration_items(self):
-        ret = self.rest.get('config-items')
-        print ret
-        triple = [{'type': d['type'], 'name': d['name'], 'value': d['value']} for d in ret]
-        print json.dumps(triple, indent=4)
-        return triple
+        return list(self.iter_configuration_items())
+
+    def iter_configuration_items(self, type=None):
+        """
+        Yield the type, name and value of every configuration item, or
+        every one of a type, as they are read from central.
+        """
+        if type:
+            items = self.rest.iter_get('config-items/{0}'.format(type))
+        else:
+            items = self.rest.iter_get('config-items')
+        for d in items:
+            yield {'type': d.get('type', type), 'name': d['name'],
+                   'value': d['value']}
@@ -0,0 +1,226 @@
+import logging
+import threading
+from multiprocessing.pool import ThreadPool
+from Queue import Queue, Empty
+import oo_client.utils as utils
+from oo_client.hpoo import OOClient
+from oo_client.watcher import ExecutionWatcher
+
+
+def _in_pool(name):
+    def method(self, *args, **kwargs):
+        return self.submit(getattr(self.oo, name), *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = 'OOClient.{0} on the worker pool, returns a ' \
+                     'utils.Future'.format(name)
+    return method
+
+
+class AsyncOOClient(object):
+    """
+    OOClient whose methods return a utils.Future straight away instead of
+    blocking. Requests are made from a small pool of worker threads and
+    every run and deployment being waited on is polled by one
+    ExecutionWatcher thread, so thousands of executions in flight don't
+    need a thread each. Errors are the same oo_client.errors as OOClient
+    raises, from Future.result().
+    """
+    def __init__(self, central_url, user, password, version="v1", ssl=True,
+                 workers=8, poll_policy=None, flow_cache=None, metrics=None):
+        self.oo = OOClient(central_url, user, password, version=version,
+                           ssl=ssl, poll_policy=poll_policy,
+                           flow_cache=flow_cache, pool_size=workers + 1,
+                           metrics=metrics)
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.pool = ThreadPool(workers)
+        self.watcher = ExecutionWatcher(self.oo, self.oo.poll_policy)
+        self._to_watch = Queue()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._watch,
+                                        name='AsyncOOClient-watcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        self.pool.close()
+        self.pool.join()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Call func on the worker pool, returns a Future for its result.
+        """
+        future = utils.Future()
+
+        def call():
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+        self.pool.apply_async(call)
+        return future
+
+    def run_flow_async(self, flow, run_name=None, inputs={}):
+        """
+        Future for the hpoo.Execution once the run has been started.
+        """
+        return self.submit(self.oo.run_flow_async, flow, run_name=run_name,
+                           inputs=inputs)
+
+    def wait_for_execution(self, execution, timeout=300):
+        """
+        Future for the run summary once the execution has finished.
+        """
+        return self._watch_later('watch_execution', execution, timeout)
+
+    def run_flow(self, flow, run_name=None, inputs={}, timeout=300):
+        """
+        Future for the same result type OOClient.run_flow returns.
+        """
+        result = utils.Future()
+
+        def finished(execution, future):
+            if future.exception() is not None:
+                result.set_exception(future.exception())
+                return
+            self.oo.log_execution(execution)
+            result.set_result(execution.result)
+
+        def started(future):
+            if future.exception() is not None:
+                result.set_exception(future.exception())
+                return
+            execution = future.result()
+            self.wait_for_execution(execution, timeout).add_done_callback(
+                lambda done: finished(execution, done))
+
+        self.run_flow_async(flow, run_name=run_name,
+                            inputs=inputs).add_done_callback(started)
+        return result
+
+    def run_flows(self, flows, timeout=300):
+        """
+        Start every flow at once, Future for False if any returned ERROR.
+        """
+        result = utils.Future()
+
+        def finished(future):
+            if future.exception() is not None:
+                result.set_exception(future.exception())
+            else:
+                result.set_result('ERROR' not in future.result())
+        utils.gather([self.run_flow(flow, timeout=timeout)
+                      for flow in flows]).add_done_callback(finished)
+        return result
+
+    def wait_for_deployment(self, deploy_id, timeout=3600):
+        """
+        Future for the deploymentResultVO once the deployment finishes.
+        """
+        return self._watch_later('watch_deployment', deploy_id, timeout)
+
+    def deploy_content_packs(self, path_list, timeout=3600,
+                             upload_workers=4, upload_retries=2,
+                             force=False):
+        """
+        Future for True if all the content packs deployed, jars already
+        on central are skipped unless force is True.
+        """
+        result = utils.Future()
+
+        def start():
+            if not force:
+                paths = self.oo.undeployed_content_packs(path_list)
+                if not paths:
+                    self.log.info("Every content pack is already deployed")
+                    return paths, None
+            else:
+                paths = path_list
+            return paths, self.oo.start_deployment(
+                paths, upload_workers=upload_workers,
+                upload_retries=upload_retries)
+
+        def finished(paths, future):
+            if future.exception() is not None:
+                result.set_exception(future.exception())
+                return
+            try:
+                self.oo.record_deployment(paths, future.result())
+                result.set_result(
+                    self.oo.deployment_succeeded(future.result()))
+            except Exception as e:
+                result.set_exception(e)
+
+        def started(future):
+            if future.exception() is not None:
+                result.set_exception(future.exception())
+                return
+            paths, deploy_id = future.result()
+            if deploy_id is None:
+                result.set_result(True)
+                return
+            self.wait_for_deployment(deploy_id, timeout).add_done_callback(
+                lambda done: finished(paths, done))
+
+        self.submit(start).add_done_callback(started)
+        return result
+
+    get_run_summary = _in_pool('get_run_summary')
+    cancel_run = _in_pool('cancel_run')
+    get_flow_uuid_from_path = _in_pool('get_flow_uuid_from_path')
+    get_content_pack_id = _in_pool('get_content_pack_id')
+    get_content_pack_from_flow = _in_pool('get_content_pack_from_flow')
+    get_all_flows_in_cp = _in_pool('get_all_flows_in_cp')
+    get_a_configuration_item = _in_pool('get_a_configuration_item')
+    set_a_configuration_item = _in_pool('set_a_configuration_item')
+    get_configuration_items_by_type = \
+        _in_pool('get_configuration_items_by_type')
+    get_all_configuration_items = _in_pool('get_all_configuration_items')
+    sync_configuration_items = _in_pool('sync_configuration_items')
+
+    def _watch_later(self, method, watched, timeout):
+        # the watcher isn't thread safe, only its own thread touches it
+        future = utils.Future()
+        self._to_watch.put((method, watched, timeout, future))
+        self._wakeup.set()
+        return future
+
+    def _watch(self):
+        while not self._closed:
+            self._wakeup.clear()
+            while True:
+                try:
+                    method, watched, timeout, future = \
+                        self._to_watch.get_nowait()
+                except Empty:
+                    break
+                getattr(self.watcher, method)(
+                    watched, timeout=timeout).add_done_callback(
+                        lambda done, future=future: self._forward(done,
+                                                                  future))
+            if not self.watcher.pending():
+                self._wakeup.wait()
+                continue
+            try:
+                self.watcher.poll()
+            except Exception as e:
+                # keep watching, anything that doesn't recover times out
+                self.log.error("Polling central failed: {0}".format(e))
+            if self.watcher.pending():
+                self._wakeup.wait(self.watcher.next_interval())
+
+    @staticmethod
+    def _forward(done, future):
+        if done.exception() is not None:
+            future.set_exception(done.exception())
+        else:
+            future.set_result(done.result())
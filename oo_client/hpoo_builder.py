@@ -1,13 +1,252 @@
 import StringIO
 import xml.etree.ElementTree as ET
 import ConfigParser
+import hashlib
+import json
 import os
+import struct
+import threading
+import zlib
 import oo_client.errors as errors
+from multiprocessing.pool import ThreadPool
 from subprocess import check_call
 from subprocess import call
 from subprocess import check_output
 import logging
 
+# every entry gets the same timestamp so unchanged sources give the
+# same jar byte for byte: 1980-01-01 00:00, the earliest zip can hold
+_DOS_TIME = 0
+_DOS_DATE = (1 << 5) | 1
+_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+_CENTRAL_HEADER = struct.Struct('<4s4B4HL2L5H2L')
+_END_RECORD = struct.Struct('<4s4H2LH')
+_MANIFEST = 'Manifest-Version: 1.0\r\nCreated-By: oo_client\r\n\r\n'
+
+
+def _deflate(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class JarBuilder(object):
+    """
+    Writes a directory out as a jar without needing a JDK. Entries are
+    sorted with fixed timestamps and permissions so the same sources
+    always give the same jar. A manifest of every file's sha1 is kept
+    next to the jar and the next build copies the compressed bytes of
+    files whose hash hasn't changed straight out of the previous jar,
+    only compressing what changed, on `workers` threads if more than one.
+    Directories named in exclude are left out wherever they are.
+    """
+    def __init__(self, source, exclude=('target', '.svn', '.git'),
+                 workers=1, level=6, extra_dirs=('Lib',)):
+        self.source = source
+        self.exclude = set(exclude)
+        self.workers = workers
+        self.level = level
+        self.extra_dirs = extra_dirs
+        self.log = logging.getLogger(self.__class__.__name__)
+
+    def entries(self):
+        """
+        Sorted (name in the jar, path on disk), the path is None for a
+        directory and '' for the generated META-INF/MANIFEST.MF.
+        """
+        found = {}
+        for root, dirs, files in os.walk(self.source):
+            dirs[:] = [d for d in dirs if d not in self.exclude]
+            rel = os.path.relpath(root, self.source)
+            prefix = '' if rel == '.' else rel.replace(os.sep, '/') + '/'
+            if prefix:
+                found[prefix] = None
+            for name in files:
+                found[prefix + name] = os.path.join(root, name)
+        for extra in self.extra_dirs:
+            found.setdefault(extra + '/', None)
+        if 'META-INF/MANIFEST.MF' not in found:
+            found['META-INF/'] = None
+            found['META-INF/MANIFEST.MF'] = ''
+        # the manifest has to come first for jar tools to find it
+        return sorted(found.items(),
+                      key=lambda item: (not item[0].startswith('META-INF/'),
+                                        item[0]))
+
+    def build(self, jar_path, manifest_path=None):
+        """
+        Write the jar, returns counts of the files reused from the last
+        build and compressed again.
+        """
+        if manifest_path is None:
+            manifest_path = os.path.join(os.path.dirname(jar_path),
+                                         'build-manifest.json')
+        previous = self._load_manifest(manifest_path)
+        hashes = {}
+        for name, path in self.entries():
+            if path:
+                with open(path, 'rb') as source:
+                    hashes[name] = hashlib.sha1(source.read()).hexdigest()
+        tmp_path = '{0}.tmp'.format(jar_path)
+        stats = {'reused': 0, 'compressed': 0}
+        files = {}
+        try:
+            with open(tmp_path, 'wb') as jar:
+                with self._previous_jar(previous) as old_jar:
+                    records = []
+                    for name, raw, info, reused in self._compressed(
+                            hashes, previous, old_jar):
+                        offset = jar.tell()
+                        records.append(self._write_local(jar, name, raw,
+                                                         info, offset))
+                        if name in hashes:
+                            files[name] = dict(info, sha1=hashes[name],
+                                               offset=offset)
+                            stats['reused' if reused else 'compressed'] += 1
+                self._write_central(jar, records)
+            os.rename(tmp_path, jar_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._save_manifest(manifest_path, jar_path, files)
+        self.log.info("Wrote {0}: {1} files compressed, {2} reused from the"
+                      " last build".format(os.path.basename(jar_path),
+                                           stats['compressed'],
+                                           stats['reused']))
+        return stats
+
+    def _compressed(self, hashes, previous, old_jar):
+        """
+        Yield (name, compressed bytes, info, reused) for every entry in
+        order.
+        """
+        entries = self.entries()
+        reusable = previous.get('files', {})
+        # the workers take turns reading the previous jar
+        old_jar_lock = threading.Lock()
+
+        def compress(entry):
+            name, path = entry
+            if path is None:
+                return name, b'', {'crc': 0, 'size': 0, 'csize': 0,
+                                   'method': 0}, False
+            old = reusable.get(name)
+            if old_jar is not None and old and \
+                    old['sha1'] == hashes.get(name):
+                with old_jar_lock:
+                    raw = self._read_raw(old_jar, name, old)
+                if raw is not None:
+                    return name, raw, dict((k, old[k]) for k in
+                                           ('crc', 'size', 'csize',
+                                            'method')), True
+            if path == '':
+                data = _MANIFEST
+            else:
+                with open(path, 'rb') as source:
+                    data = source.read()
+            raw = _deflate(data, self.level)
+            return name, raw, {'crc': zlib.crc32(data) & 0xffffffff,
+                               'size': len(data), 'csize': len(raw),
+                               'method': 8}, False
+
+        if self.workers > 1:
+            # zlib lets go of the GIL while it compresses
+            pool = ThreadPool(self.workers)
+            try:
+                for result in pool.imap(compress, entries):
+                    yield result
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for entry in entries:
+                yield compress(entry)
+
+    @staticmethod
+    def _write_local(jar, name, raw, info, offset):
+        flags = 0
+        try:
+            name.decode('ascii')
+        except UnicodeDecodeError:
+            flags = 0x800
+        jar.write(_LOCAL_HEADER.pack(b'PK\003\004', 20, 0, flags,
+                                     info['method'], _DOS_TIME, _DOS_DATE,
+                                     info['crc'], info['csize'],
+                                     info['size'], len(name), 0))
+        jar.write(name)
+        jar.write(raw)
+        if name.endswith('/'):
+            attr = (0o40755 << 16) | 0x10
+        else:
+            attr = 0o100644 << 16
+        return _CENTRAL_HEADER.pack(b'PK\001\002', 20, 3, 20, 0, flags,
+                                    info['method'], _DOS_TIME, _DOS_DATE,
+                                    info['crc'], info['csize'], info['size'],
+                                    len(name), 0, 0, 0, 0, attr,
+                                    offset) + name
+
+    @staticmethod
+    def _write_central(jar, records):
+        start = jar.tell()
+        for record in records:
+            jar.write(record)
+        if len(records) > 0xffff or start > 0xffffffff:
+            raise errors.OOClientError('Content pack is too big for a'
+                                       ' zip without zip64')
+        jar.write(_END_RECORD.pack(b'PK\005\006', 0, 0, len(records),
+                                   len(records), jar.tell() - start, start,
+                                   0))
+
+    @staticmethod
+    def _read_raw(old_jar, name, old):
+        """
+        Compressed bytes of an entry in the previous jar, None if it
+        isn't where the manifest says.
+        """
+        old_jar.seek(old['offset'])
+        header = old_jar.read(_LOCAL_HEADER.size)
+        if len(header) < _LOCAL_HEADER.size:
+            return None
+        fields = _LOCAL_HEADER.unpack(header)
+        if fields[0] != b'PK\003\004' or fields[10] != len(name) or \
+                old_jar.read(fields[10] + fields[11])[:fields[10]] != name:
+            return None
+        raw = old_jar.read(old['csize'])
+        if len(raw) != old['csize']:
+            return None
+        return raw
+
+    def _previous_jar(self, previous):
+        jar_path = previous.get('jar')
+        if previous.get('level') == self.level and jar_path and \
+                os.path.isfile(jar_path):
+            return open(jar_path, 'rb')
+        return _NoJar()
+
+    def _load_manifest(self, manifest_path):
+        if not os.path.exists(manifest_path):
+            return {}
+        try:
+            with open(manifest_path) as manifest:
+                return json.load(manifest)
+        except (ValueError, IOError) as e:
+            self.log.warning("Ignoring unreadable build manifest"
+                             " {0}: {1}".format(manifest_path, e))
+            return {}
+
+    def _save_manifest(self, manifest_path, jar_path, files):
+        with open(manifest_path, 'w') as manifest:
+            json.dump({'jar': os.path.abspath(jar_path), 'level': self.level,
+                       'files': files}, manifest, indent=1, sort_keys=True)
+
+
+class _NoJar(object):
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
 
 class ContentBuilder(object):
     def __init__(self, path_to_content, svn_path=""):
@@ -19,8 +258,7 @@ class ContentBuilder(object):
 
     def run_build(self, release=False, version=None, system_props=True,
                   system_accts=True, system_accts_passwds=False,
-                  branch="trunk"):
-        os.chdir(self.path)
+                  branch="trunk", workers=1):
         if release:
             if not version:
                 version = self.config.get('cp', 'content.pack.version')
@@ -35,7 +273,7 @@ class ContentBuilder(object):
                             'releases/{1}-{2}'.format(self.svn_path,
                                                       self.cp_name,
                                                       version),
-                            '-m', 'Creating release branch'])
+                            '-m', 'Creating release branch'], cwd=self.path)
             self.log.info("Tagging release")
             check_call(['svn', 'copy',
                         '^{0}/branches/releases/{1}-{2}'.format(self.svn_path,
@@ -44,25 +282,28 @@ class ContentBuilder(object):
                         '^{0}/tags/releases/{1}-{2}'.format(self.svn_path,
                                                             self.cp_name,
                                                             version),
-                        '-m', 'Creating release branch'])
+                        '-m', 'Creating release branch'], cwd=self.path)
         else:
-            self.rev = check_output('svnversion').strip()
+            self.rev = check_output('svnversion', cwd=self.path).strip()
             version = self.config.get('cp', 'content.pack.version')
             version = version.replace('-SNAPSHOT', '')
             cp_name = '{0}-cp-{1}-{2}-SNAPSHOT.jar'.format(self.cp_name,
                                                            version,
                                                            self.rev)
-        os.mkdir('{0}/Lib'.format(self.path))
         self.log.info("Creating content pack {0}".format(cp_name))
-        cp_path = "./target/{0}".format(cp_name)
-        check_call(['jar', 'cf', cp_path, '-C', self.path, '.'])
-        os.rmdir('{0}/Lib'.format(self.path))
+        target = os.path.join(self.path, 'target')
+        if not os.path.isdir(target):
+            os.makedirs(target)
+        cp_path = os.path.join(target, cp_name)
+        JarBuilder(self.path, workers=workers).build(cp_path)
         if release:
             version = self.increase_version(version)
             self.set_cp_version("{0}-SNAPSHOT".format(version))
             check_call(['svn', 'commit',
-                        '-m', 'Updating contentpack.properties'])
+                        '-m', 'Updating contentpack.properties'],
+                       cwd=self.path)
         self.log.info("Done")
+        return cp_path
 
     def increase_version(self, version, increment=1):
         version = version.split('.')
@@ -77,7 +318,8 @@ class ContentBuilder(object):
         ret = call(['svn', 'info',
                     '^{0}/tags/releases/{1}-{2}'.format(self.svn_path,
                                                         self.cp_name,
-                                                        version)])
+                                                        version)],
+                   cwd=self.path)
         if ret == 0:
             raise errors.ReleaseAlreadyExists(version)
         return True
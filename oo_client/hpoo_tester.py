@@ -1,23 +1,194 @@
 import logging
+import xml.etree.ElementTree as ET
+import zipfile
 import oo_client.errors as errors
+from oo_client.report import TestReport
+
+CONTENT_DIR = 'Content/'
 
 
 class IntegrationTester(object):
-    def __init__(self, oo_client, test_filter):
+    def __init__(self, oo_client, test_filter, history=None):
+        """
+        history is a durations.DurationHistory of earlier runs, used to
+        start the longest tests first when running them in parallel and
+        updated with the durations of each run.
+        """
         self.oo = oo_client
         self.int_test_path = test_filter
         self.log = logging.getLogger(self.__class__.__name__)
+        self.report = None
+        self.history = history
 
     def filter_flows(self, flows, path_filter):
         ret = [flow for flow in flows if path_filter in flow]
         return ret
 
-    def run_tests(self, content_pack, timeout=300):
-        flows = self.oo.get_all_flows_in_cp(content_pack)
+    def get_flows_from_jar(self, jar_path):
+        """
+        Same as OOClient.get_all_flows_in_cp but read from the flow XML in
+        a built content pack rather than asking central, returns a dict of
+        UUID: library path.
+        """
+        flows = {}
+        with zipfile.ZipFile(jar_path) as jar:
+            for name in jar.namelist():
+                if not name.startswith(CONTENT_DIR) or \
+                        not name.endswith('.xml'):
+                    continue
+                with jar.open(name) as xml:
+                    uuid = self.get_flow_uuid_from_xml(xml)
+                if uuid:
+                    flows[uuid] = name[len(CONTENT_DIR):]
+        return flows
+
+    def get_flow_uuid_from_xml(self, xml):
+        """
+        UUID of the flow in a file object of OO XML, None if it's not a
+        flow (operations, config items etc). Stops reading as soon as the
+        UUID has been found.
+        """
+        depth = 0
+        for event, elem in ET.iterparse(xml, events=('start', 'end')):
+            tag = elem.tag.rsplit('}', 1)[-1]
+            if event == 'start':
+                depth += 1
+                if depth == 1:
+                    if tag != 'flow':
+                        return None
+                    if elem.get('id'):
+                        return elem.get('id')
+            else:
+                depth -= 1
+                if depth == 1 and tag in ('id', 'uuid') and elem.text:
+                    return elem.text.strip()
+                elem.clear()
+        return None
+
+    def find_tests(self, content_pack, jar=None):
+        """
+        Paths of the test flows in a content pack, from the built jar if
+        given otherwise from central. Flows found in the jar are added to
+        the client's flow index so running them needs no lookups, the
+        client can be None to only list them.
+        """
+        if jar:
+            flows = self.get_flows_from_jar(jar)
+            if self.oo is not None:
+                for uuid, path in flows.items():
+                    self.oo.flows.add(path, uuid, content_pack)
+        else:
+            flows = self.oo.get_all_flows_in_cp(content_pack)
         test_flows = self.filter_flows(flows.values(), self.int_test_path)
         if not test_flows:
             raise errors.NoFlowsFound(self.int_test_path)
-        self.log.info("Found the following test flows, running sequentially")
+        return test_flows
+
+    def shard(self, test_flows, index, count):
+        """
+        The test_flows that agent index (from 1) of count runs. Flows are
+        dealt out in path order or, with a history, longest first to the
+        shard with the least expected time so far, so shards take about
+        as long as each other. Every agent gets the same split as long as
+        they find the same flows and have the same history.
+        """
+        if not 1 <= index <= count:
+            raise ValueError("Shard {0}/{1} doesn't exist".format(index,
+                                                                  count))
+        flows = sorted(test_flows)
+        if self.history is None or not len(self.history):
+            return flows[index - 1::count]
+        longest = self.history.longest()
+
+        def expected(flow):
+            seconds = self.history.expected(flow)
+            return longest if seconds is None else seconds
+        shards = [[] for _ in range(count)]
+        load = [0.0] * count
+        for flow in sorted(flows, key=lambda flow: (-expected(flow), flow)):
+            least = load.index(min(load))
+            shards[least].append(flow)
+            load[least] += expected(flow)
+        return shards[index - 1]
+
+    def run_tests(self, content_pack, timeout=300, parallel=1, jar=None,
+                  junit_xml=None, json_report=None, shard=None,
+                  fail_fast=False):
+        """
+        Run the content pack's test flows, True unless one ends in ERROR.
+        shard (index, count) only runs that share of them, see shard().
+        With fail_fast the first ERROR cancels the tests still running
+        and skips the rest, which are reported as not finished.
+        The timings of every run are kept in self.report, a
+        report.TestReport, and written to junit_xml and json_report if
+        given, even if the tests time out. The history isn't saved for a
+        shard, every shard must read the same one to split the suite the
+        same way, so -a merge_reports records their durations instead.
+        """
+        test_flows = suite_flows = self.find_tests(content_pack, jar=jar)
+        if shard:
+            test_flows = self.shard(suite_flows, *shard)
+            self.log.info("Shard {0}/{1}: running {2} of {3} test"
+                          " flows".format(shard[0], shard[1],
+                                          len(test_flows), len(suite_flows)))
+        test_flows = self.schedule(test_flows, parallel)
+        if parallel > 1:
+            self.log.info("Found the following test flows, running up to"
+                          " {0} in parallel".format(parallel))
+        else:
+            self.log.info("Found the following test flows, running"
+                          " sequentially")
         for flow in test_flows:
             self.log.info(flow)
-        return self.oo.run_flows(test_flows, timeout=timeout)
+        self.report = TestReport(content_pack, test_flows, shard=shard,
+                                 suite_flows=suite_flows if shard else None)
+        try:
+            return self.oo.run_flows(test_flows, timeout=timeout,
+                                     parallel=parallel,
+                                     callback=self.report.add,
+                                     fail_fast=fail_fast)
+        finally:
+            self.report.finish()
+            self.log_report(self.report)
+            self.record_durations(self.report)
+            if junit_xml:
+                self.report.write_junit(junit_xml)
+            if json_report:
+                self.report.write_json(json_report)
+
+    def schedule(self, test_flows, parallel):
+        """
+        The order to run test_flows in: longest expected first when
+        running them in parallel, so the suite doesn't wait on a long
+        test started last. Unchanged without a history.
+        """
+        if self.history is None or parallel < 2 or not len(self.history):
+            return test_flows
+        ordered = self.history.order(test_flows)
+        unknown = len([flow for flow in test_flows
+                       if self.history.expected(flow) is None])
+        if unknown:
+            self.log.info("Running the longest tests first, {0} without a"
+                          " recorded duration".format(unknown))
+        else:
+            self.log.info("Running the longest tests first, expected to"
+                          " take {0:.0f}s".format(
+                              self.history.makespan(ordered, parallel)))
+        return ordered
+
+    def record_durations(self, report):
+        if self.history is None or report.shard:
+            return
+        self.history.record(report)
+        self.history.save()
+
+    def log_report(self, report):
+        summary = report.summary()
+        self.log.info("{0} tests in {1}s: {2} passed, {3} failed, {4} did"
+                      " not complete".format(summary['tests'],
+                                             report.elapsed(),
+                                             summary['passed'],
+                                             summary['failed'],
+                                             summary['error']))
+        for test in report.slowest():
+            self.log.info("{0}s {1}".format(test['duration'], test['flow']))
@@ -0,0 +1,138 @@
+"""
+JSON decoding for central's responses. loads is the fastest decoder
+installed (ujson, simplejson's C speedups, else the json module) and
+iter_array streams the elements of a JSON array out of the chunks of a
+response, with ijson if it's installed.
+"""
+import codecs
+import decimal
+import json
+
+try:
+    import ujson as _decoder
+except ImportError:
+    try:
+        import simplejson as _decoder
+    except ImportError:
+        _decoder = json
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+DECODER = _decoder.__name__
+loads = _decoder.loads
+
+_WHITESPACE = ' \t\n\r'
+_AFTER_VALUE = _WHITESPACE + ',]'
+
+
+class _ChunkReader(object):
+    """
+    File-like read() over an iterator of byte strings, for ijson.
+    """
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = b''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            try:
+                self.buffer += next(self.chunks)
+            except StopIteration:
+                break
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def iter_array(chunks):
+    """
+    Yield each element of the JSON array spread over the byte strings in
+    chunks, only one element is decoded and held at a time. Raises
+    ValueError if the document isn't an array or is cut short.
+    Numbers with a fraction are floats whichever way it's decoded.
+    """
+    if ijson is not None:
+        try:
+            return ijson.items(_ChunkReader(chunks), 'item', use_float=True)
+        except TypeError:
+            # ijson before 3.1 only gives decimal.Decimal
+            return (_floats(item)
+                    for item in ijson.items(_ChunkReader(chunks), 'item'))
+    return _iter_array(chunks)
+
+
+def _floats(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, list):
+        return [_floats(item) for item in value]
+    if isinstance(value, dict):
+        return dict((key, _floats(item)) for key, item in value.items())
+    return value
+
+
+def _iter_array(chunks):
+    chunks = iter(chunks)
+    decode = codecs.getincrementaldecoder('utf-8')().decode
+    raw_decode = json.JSONDecoder().raw_decode
+    state = {'text': u'', 'done': False}
+
+    def more(wanted=1):
+        # read until wanted more characters arrived or the response ended
+        start = len(state['text'])
+        while not state['done'] and len(state['text']) - start < wanted:
+            try:
+                state['text'] += decode(next(chunks))
+            except StopIteration:
+                state['text'] += decode(b'', True)
+                state['done'] = True
+        return len(state['text']) > start
+
+    def skip(pos):
+        # position of the next non-whitespace character, reading on
+        while True:
+            text = state['text']
+            while pos < len(text) and text[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(text) or not more():
+                return pos
+
+    pos = skip(0)
+    if state['text'][pos:pos + 1] != u'[':
+        raise ValueError("Expected a JSON array")
+    pos = skip(pos + 1)
+    if state['text'][pos:pos + 1] == u']':
+        return
+    while True:
+        try:
+            item, end = raw_decode(state['text'], pos)
+        except ValueError:
+            item, end = None, None
+        # a number could carry on in the next chunk (1.5e10 split after
+        # the 1 or the e decodes fine) so only trust a value once a
+        # separator follows it; retry a cut off value once at least
+        # as much again has arrived to keep long values linear
+        if end is None or end >= len(state['text']) or \
+                state['text'][end] not in _AFTER_VALUE:
+            if not more(max(1, len(state['text']) - pos)):
+                raise ValueError("JSON array is cut short")
+            continue
+        after = skip(end)
+        if after >= len(state['text']):
+            raise ValueError("JSON array is cut short")
+        yield item
+        separator = state['text'][after]
+        if separator == u']':
+            return
+        if separator != u',':
+            raise ValueError("Expected , or ] at {0}".format(after))
+        pos = after + 1
+        if pos > 65536:
+            # let the decoded text go
+            state['text'] = state['text'][pos:]
+            pos = 0
+        pos = skip(pos)
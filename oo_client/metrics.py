@@ -0,0 +1,205 @@
+"""
+Counts of what the client asks central: latency histograms, status
+codes and bytes per endpoint, retries and polls. Give OOClient or
+OORestCaller a Metrics to fill in, then read it with to_dict or write
+it out as JSON or a Prometheus textfile.
+"""
+import json
+import os
+import re
+import threading
+
+FORMATS = ('json', 'prometheus')
+# upper bounds of the latency histogram buckets in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+           30.0, 60.0)
+_IDS = re.compile(r'(?<=/)(\d+(,\d+)*|[0-9a-fA-F-]{36})(?=/|$)')
+
+
+def endpoint(url_path):
+    """
+    url_path with run, deployment and content pack IDs and configuration
+    item paths replaced so calls to the same endpoint count together,
+    e.g. executions/{id}/summary.
+    """
+    path = _IDS.sub('{id}', url_path.split('?', 1)[0].strip('/'))
+    parts = path.split('/')
+    if parts[0] == 'config-items' and len(parts) > 2:
+        return '/'.join(parts[:2] + ['{path}'])
+    if parts[0] == 'content-packs' and len(parts) == 2 and \
+            parts[1] != '{id}':
+        return 'content-packs/{name}'
+    return path
+
+
+class _Endpoint(object):
+    __slots__ = ('count', 'seconds', 'max_seconds', 'buckets', 'statuses',
+                 'bytes_sent', 'bytes_received')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.statuses = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def to_dict(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(BUCKETS, self.buckets):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets['+Inf'] = self.count
+        return {'count': self.count, 'seconds': round(self.seconds, 6),
+                'max_seconds': round(self.max_seconds, 6),
+                'mean_seconds': round(self.seconds / self.count, 6)
+                if self.count else 0,
+                'buckets': buckets, 'statuses': dict(self.statuses),
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received}
+
+
+class Metrics(object):
+    """
+    Thread safe. OORestCaller calls request() once for every request
+    it makes with the time until the response headers arrived and the
+    status, or 'error' if there was no response. hooks are called with
+    the same arguments after each one is counted.
+    """
+    def __init__(self, hooks=()):
+        self.hooks = list(hooks)
+        self.endpoints = {}
+        self.retries = {}
+        self.polls = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, url_path, status, seconds, bytes_sent=0,
+                bytes_received=0):
+        key = (method, endpoint(url_path))
+        with self._lock:
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = self.endpoints[key] = _Endpoint()
+            stats.count += 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    stats.buckets[i] += 1
+                    break
+            status = str(status)
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+        for hook in self.hooks:
+            hook(method, url_path, status, seconds, bytes_sent,
+                 bytes_received)
+
+    def received(self, method, url_path, bytes_received):
+        """
+        Add the body of a streamed response once it has been read.
+        """
+        key = (method, endpoint(url_path))
+        with self._lock:
+            stats = self.endpoints.get(key)
+            if stats is not None:
+                stats.bytes_received += bytes_received
+
+    def retry(self, url_path):
+        key = endpoint(url_path)
+        with self._lock:
+            self.retries[key] = self.retries.get(key, 0) + 1
+
+    def poll(self, kind, count=1):
+        """
+        Count checks on whether runs or deployments (kind) finished.
+        """
+        with self._lock:
+            self.polls[kind] = self.polls.get(kind, 0) + count
+
+    def clear(self):
+        with self._lock:
+            self.endpoints = {}
+            self.retries = {}
+            self.polls = {}
+
+    def to_dict(self):
+        with self._lock:
+            requests = dict(('{0} {1}'.format(*key), stats.to_dict())
+                            for key, stats in self.endpoints.items())
+            return {'requests': requests, 'retries': dict(self.retries),
+                    'polls': dict(self.polls),
+                    'total': {'requests': sum(stats.count for stats in
+                                              self.endpoints.values()),
+                              'seconds': round(sum(
+                                  stats.seconds for stats in
+                                  self.endpoints.values()), 6)}}
+
+    def to_prometheus(self):
+        lines = ['# HELP oo_client_request_seconds Time until central'
+                 ' answered',
+                 '# TYPE oo_client_request_seconds histogram']
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            for (method, path), stats in endpoints:
+                labels = 'method="{0}",endpoint="{1}"'.format(method, path)
+                cumulative = 0
+                for bound, count in zip(BUCKETS, stats.buckets):
+                    cumulative += count
+                    lines.append('oo_client_request_seconds_bucket{{{0},'
+                                 'le="{1}"}} {2}'.format(labels, bound,
+                                                         cumulative))
+                lines.append('oo_client_request_seconds_bucket{{{0},'
+                             'le="+Inf"}} {1}'.format(labels, stats.count))
+                lines.append('oo_client_request_seconds_sum{{{0}}} '
+                             '{1}'.format(labels, repr(stats.seconds)))
+                lines.append('oo_client_request_seconds_count{{{0}}} '
+                             '{1}'.format(labels, stats.count))
+            lines += ['# HELP oo_client_responses_total Responses by'
+                      ' status, error where there was none',
+                      '# TYPE oo_client_responses_total counter']
+            for (method, path), stats in endpoints:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append('oo_client_responses_total{{method="{0}",'
+                                 'endpoint="{1}",status="{2}"}} '
+                                 '{3}'.format(method, path, status, count))
+            for name, attr in (('sent', 'bytes_sent'),
+                               ('received', 'bytes_received')):
+                lines += ['# HELP oo_client_bytes_{0}_total Body bytes'
+                          ' {0}'.format(name),
+                          '# TYPE oo_client_bytes_{0}_total'
+                          ' counter'.format(name)]
+                for (method, path), stats in endpoints:
+                    lines.append('oo_client_bytes_{0}_total{{method="{1}",'
+                                 'endpoint="{2}"}} {3}'.format(
+                                     name, method, path,
+                                     getattr(stats, attr)))
+            lines += ['# HELP oo_client_retries_total Requests made again'
+                      ' after failing',
+                      '# TYPE oo_client_retries_total counter']
+            for path, count in sorted(self.retries.items()):
+                lines.append('oo_client_retries_total{{endpoint="{0}"}} '
+                             '{1}'.format(path, count))
+            lines += ['# HELP oo_client_polls_total Checks on whether runs'
+                      ' or deployments finished',
+                      '# TYPE oo_client_polls_total counter']
+            for kind, count in sorted(self.polls.items()):
+                lines.append('oo_client_polls_total{{kind="{0}"}} '
+                             '{1}'.format(kind, count))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path, format='json'):
+        """
+        Write to path as JSON or a Prometheus textfile, replacing it in
+        one go so a collector never reads half a file.
+        """
+        if format == 'prometheus':
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.to_dict(), indent=4, sort_keys=True)
+        tmp_path = '{0}.tmp'.format(path)
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.rename(tmp_path, path)
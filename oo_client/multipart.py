@@ -0,0 +1,124 @@
+import logging
+import os
+import threading
+import time
+from uuid import uuid4
+
+
+class MultipartFile(object):
+    """
+    multipart/form-data body holding a single file which is read from disk
+    chunk_size bytes at a time as it's sent, so memory use stays flat no
+    matter how big the file is. requests streams anything with read() and
+    a length, sending a Content-Length header rather than chunking.
+    progress is called with (bytes sent, total bytes, seconds elapsed)
+    every time a block is read.
+    """
+    def __init__(self, field, file_path, chunk_size=1024 * 1024,
+                 progress=None):
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.progress = progress
+        boundary = uuid4().hex
+        self.content_type = 'multipart/form-data; ' \
+                            'boundary={0}'.format(boundary)
+        filename = os.path.basename(file_path)
+        self._head = ('--{0}\r\n'
+                      'Content-Disposition: form-data; name="{1}";'
+                      ' filename="{2}"\r\n'
+                      'Content-Type: application/octet-stream\r\n'
+                      '\r\n'.format(boundary, field, filename))
+        self._head = self._head.encode('utf-8')
+        self._tail = '\r\n--{0}--\r\n'.format(boundary).encode('utf-8')
+        self.total = len(self._head) + os.path.getsize(file_path) + \
+            len(self._tail)
+        self.sent = 0
+        self._started = None
+        self._block = b''
+        self._offset = 0
+        self._parts = None
+
+    def __len__(self):
+        return self.total - self.sent
+
+    def _blocks(self):
+        yield self._head
+        with open(self.file_path, 'rb') as upload:
+            while True:
+                block = upload.read(self.chunk_size)
+                if not block:
+                    break
+                yield block
+        yield self._tail
+
+    def read(self, size=-1):
+        if self._parts is None:
+            self._parts = self._blocks()
+            self._started = time.time()
+        if size is None or size < 0:
+            size = self.total
+        chunks = []
+        while size > 0:
+            if self._offset >= len(self._block):
+                try:
+                    self._block = next(self._parts)
+                    self._offset = 0
+                except StopIteration:
+                    break
+            chunk = self._block[self._offset:self._offset + size]
+            self._offset += len(chunk)
+            size -= len(chunk)
+            chunks.append(chunk)
+        data = b''.join(chunks)
+        self.sent += len(data)
+        if data and self.progress:
+            self.progress(self.sent, self.total, time.time() - self._started)
+        return data
+
+
+class UploadProgress(object):
+    """
+    progress callback for MultipartFile which logs every `step` percent
+    with the throughput so far. Uploads running side by side can share
+    one UploadProgress through for_file(), the log then shows their
+    combined progress.
+    """
+    def __init__(self, name, step=10, log=None):
+        self.name = name
+        self.step = step
+        self.next_report = step
+        self.files = {}
+        self.log = log or logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        self._started = None
+
+    def for_file(self, key, size=0):
+        """
+        Callback for one of several uploads, size (if known) counts
+        towards the total before that upload starts.
+        """
+        self.files[key] = (0, size)
+
+        def progress(sent, total, elapsed):
+            self.update(key, sent, total)
+        return progress
+
+    def __call__(self, sent, total, elapsed):
+        self.update(self.name, sent, total)
+
+    def update(self, key, sent, total):
+        with self._lock:
+            if self._started is None:
+                self._started = time.time()
+            self.files[key] = (sent, total)
+            sent = sum(done for done, _ in self.files.values())
+            total = sum(size for _, size in self.files.values())
+            percent = 100 * sent // total if total else 100
+            if percent < self.next_report:
+                return
+            self.next_report = (percent // self.step + 1) * self.step
+            elapsed = time.time() - self._started
+        rate = sent / elapsed / 1024 / 1024 if elapsed else 0
+        self.log.info("Uploading {0}: {1}% of {2:.1f}MB at"
+                      " {3:.1f}MB/s".format(self.name, percent,
+                                            total / 1024.0 / 1024, rate))
@@ -0,0 +1,61 @@
+import fnmatch
+import json
+import sys
+
+FORMATS = ('pretty', 'json', 'jsonl')
+_COMPACT = (',', ':')
+
+
+def matches(item, pattern):
+    """
+    True if the fnmatch style pattern matches the item's name or its
+    type/name, e.g. system-properties/db_*.
+    """
+    name = item.get('name', '')
+    return fnmatch.fnmatchcase(name, pattern) or \
+        fnmatch.fnmatchcase('{0}/{1}'.format(item.get('type', ''), name),
+                            pattern)
+
+
+def filter_items(items, pattern=None):
+    if not pattern:
+        return items
+    return (item for item in items if matches(item, pattern))
+
+
+def write(data, format='pretty', stream=None):
+    """
+    Write a dict, or an iterable of them, to stream (stdout by default)
+    as indented JSON (pretty), compact JSON or JSON lines, returns how
+    many items were written. json and jsonl write each item as it comes
+    so an iterator is never held in memory, pretty has to collect it.
+    """
+    stream = stream or sys.stdout
+    if isinstance(data, dict):
+        if format == 'pretty':
+            stream.write(json.dumps(data, indent=4))
+        else:
+            stream.write(json.dumps(data, separators=_COMPACT))
+        stream.write('\n')
+        return 1
+    if format == 'pretty':
+        data = list(data)
+        stream.write(json.dumps(data, indent=4))
+        stream.write('\n')
+        return len(data)
+    count = 0
+    if format == 'json':
+        stream.write('[')
+    for item in data:
+        if format == 'json':
+            if count:
+                stream.write(',')
+            stream.write(json.dumps(item, separators=_COMPACT))
+        else:
+            stream.write(json.dumps(item, separators=_COMPACT))
+            stream.write('\n')
+        count += 1
+    if format == 'json':
+        stream.write(']\n')
+    stream.flush()
+    return count
@@ -0,0 +1,224 @@
+"""
+Reports of integration test runs for CI, as JUnit XML and JSON.
+"""
+import json
+import posixpath
+import socket
+import time
+import xml.etree.ElementTree as ET
+
+PASSED = 'passed'
+FAILED = 'failed'
+ERROR = 'error'
+
+
+def outcome(timings):
+    """
+    passed or failed for a completed run by its result type (only ERROR
+    fails, like OOClient.run_flows), error if it never completed.
+    """
+    if timings.get('status') != 'COMPLETED':
+        return ERROR
+    if timings.get('result_type') == 'ERROR':
+        return FAILED
+    return PASSED
+
+
+class TestReport(object):
+    """
+    The Execution.timings of each flow of a test suite, in the order of
+    flows. Flows without any are reported as errors, e.g. when the suite
+    timed out before they ran. add is meant as OOClient.run_flows'
+    callback. A shard's report also keeps suite_flows, the flows of the
+    whole suite it was dealt its flows from.
+    """
+    def __init__(self, suite, flows=(), shard=None, suite_flows=None):
+        self.suite = suite
+        self.flows = list(flows)
+        self.shard = shard
+        self.suite_flows = sorted(suite_flows) if suite_flows else None
+        self.results = {}
+        self.started = time.time()
+        self.finished = None
+
+    def add(self, execution):
+        """
+        Record an Execution, or the dict of its timings.
+        """
+        timings = execution if isinstance(execution, dict) \
+            else execution.timings()
+        if timings['flow'] not in self.results and \
+                timings['flow'] not in self.flows:
+            self.flows.append(timings['flow'])
+        self.results[timings['flow']] = timings
+
+    def finish(self):
+        self.finished = time.time()
+
+    def tests(self):
+        tests = []
+        for flow in self.flows:
+            timings = dict(self.results.get(flow) or
+                           {'flow': flow, 'status': None,
+                            'result_type': None, 'duration': None,
+                            'wall': None, 'polls': 0})
+            timings['outcome'] = outcome(timings)
+            tests.append(timings)
+        return tests
+
+    def summary(self):
+        counts = {'tests': len(self.flows), PASSED: 0, FAILED: 0, ERROR: 0}
+        for test in self.tests():
+            counts[test['outcome']] += 1
+        return counts
+
+    def elapsed(self):
+        return round((self.finished or time.time()) - self.started, 3)
+
+    def slowest(self, count=5):
+        """
+        The count tests that took longest, by central's duration.
+        """
+        timed = [test for test in self.tests()
+                 if test.get('duration') is not None]
+        timed.sort(key=lambda test: test['duration'], reverse=True)
+        return timed[:count]
+
+    def to_dict(self):
+        data = {'suite': self.suite, 'started': round(self.started, 3),
+                'elapsed': self.elapsed(), 'summary': self.summary(),
+                'tests': self.tests()}
+        if self.shard:
+            data['shard'] = '{0}/{1}'.format(*self.shard)
+        if self.suite_flows:
+            data['suite_flows'] = self.suite_flows
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        shard = None
+        if data.get('shard'):
+            shard = tuple(int(n) for n in data['shard'].split('/'))
+        report = cls(data['suite'], shard=shard,
+                     suite_flows=data.get('suite_flows'))
+        report.started = data['started']
+        report.finished = data['started'] + data['elapsed']
+        for test in data['tests']:
+            report.flows.append(test['flow'])
+            if test.get('run_id'):
+                test = dict(test)
+                test.pop('outcome', None)
+                report.results[test['flow']] = test
+        return report
+
+    def write_json(self, path):
+        with open(path, 'w') as report:
+            json.dump(self.to_dict(), report, indent=4, sort_keys=True)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as report:
+            return cls.from_dict(json.load(report))
+
+    def to_junit(self):
+        summary = self.summary()
+        suites = ET.Element('testsuites', {
+            'name': self.suite, 'tests': str(summary['tests']),
+            'failures': str(summary[FAILED]), 'errors': str(summary[ERROR]),
+            'time': str(self.elapsed())})
+        suite = ET.SubElement(suites, 'testsuite', {
+            'name': self.suite, 'tests': str(summary['tests']),
+            'failures': str(summary[FAILED]), 'errors': str(summary[ERROR]),
+            'skipped': '0', 'time': str(self.elapsed()),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S',
+                                       time.localtime(self.started)),
+            'hostname': socket.gethostname()})
+        for test in self.tests():
+            folder, name = posixpath.split(test['flow'])
+            seconds = test.get('duration')
+            if seconds is None:
+                seconds = test.get('wall') or 0
+            case = ET.SubElement(suite, 'testcase', {
+                'classname': folder.replace('/', '.'),
+                'name': posixpath.splitext(name)[0],
+                'time': str(seconds)})
+            if test['outcome'] == FAILED:
+                ET.SubElement(case, 'failure', {
+                    'type': 'ERROR',
+                    'message': 'Flow finished with result ERROR'}
+                ).text = test.get('link')
+            elif test['outcome'] == ERROR:
+                if test.get('status'):
+                    message = 'Run ended {0}'.format(test['status'])
+                else:
+                    message = 'Run did not finish'
+                ET.SubElement(case, 'error', {
+                    'type': test.get('status') or 'NOT_FINISHED',
+                    'message': message}).text = test.get('link')
+            if test.get('run_id'):
+                ET.SubElement(case, 'system-out').text = \
+                    'run {0} {1}, polled {2} times, {3}s from submit to' \
+                    ' finish\n{4}\n'.format(test['run_id'],
+                                            test.get('result_type'),
+                                            test.get('polls'),
+                                            test.get('wall'),
+                                            test.get('link'))
+        return suites
+
+    def write_junit(self, path):
+        ET.ElementTree(self.to_junit()).write(path, encoding='utf-8',
+                                              xml_declaration=True)
+
+
+def missing_shards(reports):
+    """
+    The shards, as (index, count), of the suite that have no report in
+    reports, empty if they weren't sharded.
+    """
+    shards = set(report.shard for report in reports if report.shard)
+    counts = set(count for _, count in shards)
+    return sorted((index, count) for count in counts
+                  for index in range(1, count + 1)
+                  if (index, count) not in shards)
+
+
+def misassigned_flows(reports):
+    """
+    The flows of a sharded suite that no shard ran and those that more
+    than one ran, as two sorted lists. Either means the agents didn't
+    split the suite the same way, e.g. they found different flows or
+    read different duration histories.
+    """
+    expected = set()
+    counts = {}
+    for report in reports:
+        if not report.shard:
+            continue
+        expected.update(report.suite_flows or ())
+        for flow in report.flows:
+            counts[flow] = counts.get(flow, 0) + 1
+    missing = sorted(flow for flow in expected if flow not in counts)
+    repeated = sorted(flow for flow, count in counts.items() if count > 1)
+    return missing, repeated
+
+
+def merge(reports):
+    """
+    One report of the tests in reports, e.g. the shards of a suite run
+    on several agents, from the start of the first to the end of the
+    last.
+    """
+    if not reports:
+        raise ValueError("No reports to merge")
+    merged = TestReport(reports[0].suite)
+    merged.started = min(report.started for report in reports)
+    merged.finished = max(report.finished or report.started
+                          for report in reports)
+    seen = set()
+    for report in reports:
+        for flow in report.flows:
+            if flow not in seen:
+                seen.add(flow)
+                merged.flows.append(flow)
+        merged.results.update(report.results)
+    return merged
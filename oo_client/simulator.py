@@ -0,0 +1,507 @@
+"""
+A stand-in OO Central for tests and benchmarks, speaking just enough of
+the REST API for everything OOClient does over plain HTTP:
+
+    python -m oo_client.simulator --port 8080 --flows 500 --latency 0.02
+"""
+import argparse
+import base64
+import json
+import logging
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from urlparse import parse_qs, urlparse
+
+from oo_client.metrics import endpoint
+
+CONFIG_TYPES = ['system-accounts', 'system-properties', 'group-aliases',
+                'domain-terms', 'selection-lists']
+_API = '/oo/rest/v1/'
+
+
+class _Run(object):
+    __slots__ = ('id', 'flow', 'name', 'start', 'duration', 'result',
+                 'status')
+
+    def __init__(self, run_id, flow, name, duration, result):
+        self.id = run_id
+        self.flow = flow
+        self.name = name
+        self.start = time.time()
+        self.duration = duration
+        self.result = result
+        self.status = None
+
+    def summary(self):
+        finished = self.status or (
+            'COMPLETED' if time.time() - self.start >= self.duration
+            else None)
+        summary = {'executionId': str(self.id), 'flowUuid': self.flow['id'],
+                   'flowPath': self.flow['path'], 'executionName': self.name,
+                   'startTime': int(self.start * 1000),
+                   'status': finished or 'RUNNING',
+                   'resultStatusType': None, 'endTime': None}
+        if finished:
+            summary['endTime'] = int((self.start + self.duration) * 1000)
+            if finished == 'COMPLETED':
+                summary['resultStatusType'] = self.result
+        return summary
+
+
+class CentralSimulator(object):
+    """
+    Runs a threaded HTTP server on localhost pretending to be central.
+    The library holds `content_packs` content packs of `flows` flows
+    each, in folders of `folder_size`, the first `test_flows` of every
+    pack under tests/integration_tests. Each response is delayed by
+    `latency` seconds and `error_rate` of them fail with a 503. Runs take
+    `run_duration` seconds and finish in ERROR `failure_rate` of the time
+    (each a number or a function of the flow path), deployments take
+    `deploy_duration`. Listings carry `padding` extra bytes per item to
+    make payloads as big as a real central's.
+    CSRF and basic auth work like central: GETs hand out a token for the
+    session cookie and puts/posts without it are refused.
+    stats counts requests per endpoint and bytes in both directions.
+    """
+    def __init__(self, user='admin', password='admin', content_packs=1,
+                 flows=20, folder_size=50, test_flows=5, config_items=10,
+                 latency=0, error_rate=0, run_duration=0.1, failure_rate=0,
+                 deploy_duration=0.1, padding=0, seed=0, port=0):
+        self.user = user
+        self.password = password
+        self.latency = latency
+        self.error_rate = error_rate
+        self.run_duration = run_duration
+        self.failure_rate = failure_rate
+        self.deploy_duration = deploy_duration
+        self.padding = 'x' * padding
+        self.random = random.Random(seed)
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.flows = {}
+        self.content_packs = {}
+        self.config_items = {}
+        self.runs = {}
+        self.deployments = {}
+        self.connections = {}
+        self._ids = iter(xrange(100000001, 999999999))
+        self.stats = {'requests': 0, 'bytes_in': 0, 'bytes_out': 0,
+                      'endpoints': {}}
+        for cp in range(content_packs):
+            cp_name = 'cp{0}'.format(cp)
+            self.add_content_pack(cp_name)
+            for i in range(test_flows):
+                self.add_flow('Library/{0}/tests/integration_tests/'
+                              'test_flow{1}.xml'.format(cp_name, i), cp_name)
+            for i in range(flows - test_flows):
+                self.add_flow('Library/{0}/folder{1}/flow{2}.xml'.format(
+                    cp_name, i // folder_size, i), cp_name)
+        for i in range(config_items):
+            config_type = CONFIG_TYPES[i % len(CONFIG_TYPES)]
+            if config_type == 'system-accounts':
+                value = {'username': 'user{0}'.format(i),
+                         'password': 'pass{0}'.format(i)}
+            else:
+                value = 'value{0}'.format(i)
+            self.add_config_item(config_type, 'item{0}'.format(i), value)
+        self.server = _Server(('127.0.0.1', port), _Handler)
+        self.server.central = self
+        self.url = 'http://127.0.0.1:{0}'.format(self.server.server_port)
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever,
+                                        args=(0.05,), name='CentralSimulator')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+        # and hang up on clients keeping connections alive
+        with self.lock:
+            connections = list(self.connections.items())
+        for connection, thread in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            thread.join(5)
+
+    def next_id(self):
+        with self.lock:
+            return next(self._ids)
+
+    def add_content_pack(self, name, version='1.0.0'):
+        cp_id = str(uuid.uuid5(uuid.NAMESPACE_URL, name))
+        self.content_packs[name] = {'id': cp_id, 'name': name,
+                                    'version': version,
+                                    'publisher': 'oo_client'}
+        return cp_id
+
+    def add_flow(self, path, cp_name):
+        flow_id = str(uuid.uuid5(uuid.NAMESPACE_URL, path))
+        self.flows[flow_id] = {'id': flow_id, 'path': path,
+                               'cpName': cp_name,
+                               'name': path.rsplit('/', 1)[-1][:-4]}
+        return flow_id
+
+    def add_config_item(self, config_type, path, value):
+        if config_type == 'system-accounts' and not isinstance(value, dict):
+            user, _, password = value.partition(':')
+            value = {'username': user, 'password': password}
+        self.config_items[(config_type, path)] = {
+            'type': config_type, 'path': path,
+            'name': path.rsplit('/', 1)[-1], 'value': value,
+            'uuid': str(uuid.uuid5(uuid.NAMESPACE_URL,
+                                   config_type + path))}
+
+    def config_item(self, key):
+        item = dict(self.config_items[key])
+        value = item['value']
+        if isinstance(value, dict):
+            value = json.dumps({'username': value['username'],
+                                'password': '************'},
+                               separators=(',', ':'))
+        item['value'] = item['customValue'] = value
+        item['fullPath'] = 'Configuration/{0}/{1}.xml'.format(item['type'],
+                                                              item['path'])
+        return item
+
+    def count(self, method, path, bytes_in, bytes_out):
+        key = '{0} {1}'.format(method, endpoint(path))
+        with self.lock:
+            stats = self.stats
+            stats['requests'] += 1
+            stats['bytes_in'] += bytes_in
+            stats['bytes_out'] += bytes_out
+            stats['endpoints'][key] = stats['endpoints'].get(key, 0) + 1
+
+    def pad(self, item):
+        if self.padding:
+            item = dict(item, description=self.padding)
+        return item
+
+    # endpoints, each returns (status, body)
+
+    def get(self, path, query):
+        parts = path.split('/')
+        if path == 'version':
+            return 200, {'version': '10.60', 'revision': 'simulated'}
+        if path == 'content-packs':
+            return 200, [self.pad(cp) for _, cp in
+                         sorted(self.content_packs.items())]
+        if parts[0] == 'content-packs' and len(parts) == 3 and \
+                parts[2] == 'content-tree':
+            names = [name for name, cp in self.content_packs.items()
+                     if cp['id'] == parts[1]]
+            if not names:
+                return 404, {'message': 'No such content pack'}
+            return 200, [self.pad({'id': flow['id'], 'path': flow['path'],
+                                   'type': 'FLOW'})
+                         for flow in self._sorted_flows()
+                         if flow['cpName'] == names[0]]
+        if path == 'flows/tree/level':
+            return 200, self._tree_level(query.get('path', ['Library'])[0])
+        if parts[0] == 'flows' and len(parts) == 2:
+            if parts[1] not in self.flows:
+                return 404, {'message': 'No such flow'}
+            return 200, self.pad(self.flows[parts[1]])
+        if parts[0] == 'executions' and len(parts) == 3 and \
+                parts[2] == 'summary':
+            summaries = [self.runs[int(run_id)].summary()
+                         for run_id in parts[1].split(',')
+                         if run_id.isdigit() and int(run_id) in self.runs]
+            return 200, summaries
+        if parts[0] == 'deployments' and len(parts) == 2:
+            return self._deployment(parts[1])
+        if parts[0] == 'config-items':
+            if len(parts) == 1:
+                return 200, [self.pad(self.config_item(key)) for key in
+                             sorted(self.config_items)]
+            if len(parts) == 2:
+                return 200, [self.pad(self.config_item(key)) for key in
+                             sorted(self.config_items) if key[0] == parts[1]]
+            key = (parts[1], '/'.join(parts[2:]))
+            if key not in self.config_items:
+                return 404, {'message': 'No such configuration item'}
+            return 200, self.config_item(key)
+        return 404, {'message': 'Not simulated'}
+
+    def post(self, path, body, filename=None):
+        parts = path.split('/')
+        if path == 'executions':
+            request = json.loads(body)
+            flow = self.flows.get(request.get('uuid'))
+            if flow is None:
+                return 404, {'message': 'No such flow'}
+            run_id = self.next_id()
+            duration = self.run_duration
+            if callable(duration):
+                duration = duration(flow['path'])
+            failure_rate = self.failure_rate
+            if callable(failure_rate):
+                failure_rate = failure_rate(flow['path'])
+            with self.lock:
+                failed = self.random.random() < failure_rate
+            self.runs[run_id] = _Run(run_id, flow, request.get('runName'),
+                                     duration,
+                                     'ERROR' if failed else 'RESOLVED')
+            return 201, {'executionId': str(run_id), 'errorCode': 'NO_ERROR'}
+        if path == 'deployments':
+            deploy_id = self.next_id()
+            self.deployments[deploy_id] = {'files': [], 'started': None}
+            return 201, {'deploymentProcessId': deploy_id}
+        if parts[0] == 'deployments' and len(parts) == 3 and \
+                parts[2] == 'files':
+            deployment = self.deployments.get(int(parts[1]))
+            if deployment is None:
+                return 404, {'message': 'No such deployment'}
+            deployment['files'].append(filename)
+            return 201, {'name': filename}
+        return 404, {'message': 'Not simulated'}
+
+    def put(self, path, body):
+        parts = path.split('/')
+        if parts[0] == 'deployments' and len(parts) == 2:
+            deployment = self.deployments.get(int(parts[1]))
+            if deployment is None:
+                return 404, {'message': 'No such deployment'}
+            deployment['started'] = time.time()
+            return 200, {'deploymentProcessId': int(parts[1]),
+                         'status': 'PENDING'}
+        if parts[0] == 'content-packs' and len(parts) == 2:
+            self.add_content_pack(parts[1])
+            return 200, self._deployed(['{0}.jar'.format(parts[1])])
+        if parts[0] == 'executions' and len(parts) == 3 and \
+                parts[2] == 'status':
+            run = self.runs.get(int(parts[1]))
+            if run is None:
+                return 404, {'message': 'No such execution'}
+            if json.loads(body).get('action') == 'cancel' and \
+                    run.summary()['status'] == 'RUNNING':
+                run.status = 'CANCELED'
+                run.duration = time.time() - run.start
+            return 200, None
+        if parts[0] == 'config-items' and len(parts) > 2:
+            key = (parts[1], '/'.join(parts[2:]))
+            if key not in self.config_items:
+                return 404, {'message': 'No such configuration item'}
+            value = json.loads(body)
+            if key[0] == 'system-accounts':
+                value = json.loads(value)
+            self.config_items[key]['value'] = value
+            return 200, self.config_item(key)
+        return 404, {'message': 'Not simulated'}
+
+    def _sorted_flows(self):
+        return sorted(self.flows.values(), key=lambda flow: flow['path'])
+
+    def _tree_level(self, folder):
+        prefix = folder.rstrip('/') + '/'
+        children = {}
+        for flow in self.flows.values():
+            if not flow['path'].startswith(prefix):
+                continue
+            rest = flow['path'][len(prefix):]
+            if '/' in rest:
+                name = rest.split('/', 1)[0]
+                children[name] = {'id': prefix + name, 'name': name,
+                                  'path': prefix + name, 'leaf': False}
+            else:
+                children[flow['name']] = self.pad(
+                    {'id': flow['id'], 'name': flow['name'],
+                     'path': flow['path'], 'leaf': True})
+        return [children[name] for name in sorted(children)]
+
+    def _deployment(self, deploy_id):
+        deployment = self.deployments.get(int(deploy_id))
+        if deployment is None:
+            return 404, {'message': 'No such deployment'}
+        started = deployment['started']
+        if started is None or time.time() - started < self.deploy_duration:
+            return 200, {'deploymentProcessId': int(deploy_id),
+                         'status': 'PENDING' if started is None
+                         else 'DEPLOYING',
+                         'deploymentResultVO': None}
+        for filename in deployment['files']:
+            self.add_content_pack(filename.rsplit('.', 1)[0])
+        return 200, {'deploymentProcessId': int(deploy_id),
+                     'status': 'FINISHED',
+                     'deploymentResultVO': self._deployed(
+                         deployment['files'])}
+
+    @staticmethod
+    def _deployed(filenames):
+        success = {'responses': [{'responseCategory': 'Success',
+                                  'message': 'Deployed'}]}
+        return {'contentPackResponses': dict((name, success)
+                                             for name in filenames)}
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        self.central.log.debug("Error handling a request from {0}".format(
+            client_address), exc_info=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'CentralSimulator'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.central.lock:
+            self.server.central.connections[self.connection] = \
+                threading.current_thread()
+
+    def finish(self):
+        with self.server.central.lock:
+            self.server.central.connections.pop(self.connection, None)
+        try:
+            BaseHTTPRequestHandler.finish(self)
+        except socket.error:
+            pass
+
+    def log_message(self, format, *args):
+        self.server.central.log.debug(format, *args)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def _handle(self, method):
+        central = self.server.central
+        url = urlparse(self.path)
+        path = url.path[len(_API):] if url.path.startswith(_API) else None
+        filename = None
+        length = int(self.headers.get('content-length') or 0)
+        if 'multipart/form-data' in self.headers.get('content-type', ''):
+            filename, bytes_in = self._discard_upload(length)
+            body = ''
+        else:
+            body = self.rfile.read(length)
+            bytes_in = len(body)
+        if central.latency:
+            time.sleep(central.latency)
+        session = self._session()
+        with central.lock:
+            failed = central.error_rate and \
+                central.random.random() < central.error_rate
+        if path is None:
+            status, data = 404, {'message': 'Not central'}
+        elif not self._authorised():
+            status, data = 401, {'message': 'Unauthorized'}
+        elif failed:
+            status, data = 503, {'message': 'Simulated failure'}
+        elif method != 'GET' and self.headers.get('X-CSRF-TOKEN') != \
+                central.sessions.get(session):
+            status, data = 403, {'message': 'Invalid CSRF token'}
+        elif method == 'GET':
+            status, data = central.get(path, parse_qs(url.query))
+        elif method == 'POST':
+            status, data = central.post(path, body, filename)
+        else:
+            status, data = central.put(path, body)
+        text = '' if data is None else json.dumps(data)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(text)))
+        if method == 'GET':
+            self.send_header('X-CSRF-TOKEN', central.sessions[session])
+        if self._new_session:
+            self.send_header('Set-Cookie',
+                             'JSESSIONID={0}; Path=/oo'.format(session))
+        self.end_headers()
+        self.wfile.write(text)
+        central.count(method, path or url.path, bytes_in, len(text))
+
+    def _session(self):
+        central = self.server.central
+        cookies = self.headers.get('cookie', '')
+        match = re.search(r'JSESSIONID=([0-9a-f]+)', cookies)
+        self._new_session = not match or match.group(1) not in \
+            central.sessions
+        if self._new_session:
+            session = uuid.uuid4().hex
+            with central.lock:
+                central.sessions[session] = uuid.uuid4().hex
+            return session
+        return match.group(1)
+
+    def _authorised(self):
+        central = self.server.central
+        expected = 'Basic ' + base64.b64encode('{0}:{1}'.format(
+            central.user, central.password))
+        return self.headers.get('authorization') == expected
+
+    def _discard_upload(self, length):
+        # read uploads in blocks so 200MB content packs don't stay in memory
+        head = self.rfile.read(min(length, 4096))
+        match = re.search(r'filename="([^"]+)"', head)
+        remaining = length - len(head)
+        while remaining > 0:
+            block = self.rfile.read(min(remaining, 1024 * 1024))
+            if not block:
+                break
+            remaining -= len(block)
+        return (match.group(1) if match else None), length - remaining
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a stand-in OO'
+                                                 ' central')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--content-packs', type=int, default=1)
+    parser.add_argument('--flows', type=int, default=20,
+                        help='Flows in each content pack')
+    parser.add_argument('--config-items', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--run-duration', type=float, default=1)
+    parser.add_argument('--failure-rate', type=float, default=0)
+    parser.add_argument('--padding', type=int, default=0)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    central = CentralSimulator(content_packs=args.content_packs,
+                               flows=args.flows,
+                               config_items=args.config_items,
+                               latency=args.latency,
+                               error_rate=args.error_rate,
+                               run_duration=args.run_duration,
+                               failure_rate=args.failure_rate,
+                               padding=args.padding, port=args.port)
+    central.log.info("Simulating central on {0}, user admin password"
+                     " admin".format(central.url))
+    try:
+        central.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
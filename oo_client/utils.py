@@ -1,24 +1,118 @@
+import hashlib
+import os
+import random
+import threading
 import time
 from uuid import UUID
 import oo_client.errors as errors
 
 
-def timeout(timeout, interval):
+def clock():
+    """
+    Seconds from a monotonic clock where python has one, python 2 only
+    has time.time so fall back to that.
+    """
+    if hasattr(time, 'monotonic'):
+        return time.monotonic()
+    return time.time()
+
+
+class PollPolicy(object):
+    """
+    How long to sleep between polls. Starts at initial and multiplies by
+    factor after every poll up to maximum, each sleep is randomised by
+    +/- jitter (a fraction) so many pollers don't hit central in step.
+    """
+    def __init__(self, initial=0.5, factor=2.0, maximum=5.0, jitter=0.1):
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self.jitter = jitter
+
+    @classmethod
+    def fixed(cls, interval):
+        return cls(initial=interval, factor=1, maximum=interval, jitter=0)
+
+    def intervals(self):
+        interval = self.initial
+        while True:
+            interval = min(interval, self.maximum)
+            if self.jitter:
+                yield interval * random.uniform(1 - self.jitter,
+                                                1 + self.jitter)
+            else:
+                yield interval
+            interval *= self.factor
+
+
+_interrupted = threading.Event()
+
+
+def interrupt():
+    """
+    Make waits for runs and deployments raise KeyboardInterrupt after
+    their next sleep, as if Ctrl-C was pressed, so the command gives up
+    and cancels the runs it started. For when the interrupt can't come
+    from a signal, e.g. the daemon's client hanging up.
+    """
+    _interrupted.set()
+
+
+def clear_interrupt():
+    _interrupted.clear()
+
+
+def check_interrupt():
+    if _interrupted.is_set():
+        raise KeyboardInterrupt()
+
+
+def timeout(timeout, interval=None, policy=None):
+    """
+    Call the decorated function until it returns something truthy or
+    timeout seconds have passed. Sleeps interval seconds between calls if
+    given, even with a policy, otherwise follows policy (PollPolicy() by
+    default).
+    """
+    if interval:
+        policy = PollPolicy.fixed(interval)
+    elif policy is None:
+        policy = PollPolicy()
+
     def decorate(func):
         def wrapper(*args, **kwargs):
-            attempts = 0
+            deadline = clock() + timeout
+            intervals = policy.intervals()
             while True:
                 result = func(*args, **kwargs)
                 if result:
                     return result
-                if attempts >= timeout / interval:
+                remaining = deadline - clock()
+                if remaining <= 0:
                     raise errors.TimeoutError(format(func.__name__), timeout)
-                attempts += 1
-                time.sleep(interval)
+                time.sleep(min(next(intervals), remaining))
+                check_interrupt()
         return wrapper
     return decorate
 
 
+def cache_dir():
+    """
+    oo_client's directory under $XDG_CACHE_HOME or ~/.cache.
+    """
+    base = os.environ.get('XDG_CACHE_HOME',
+                          os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'oo_client')
+
+
+def cache_file(central_url, name):
+    """
+    Path of a cache file for a given central, under cache_dir().
+    """
+    key = hashlib.sha1(central_url.rstrip('/').encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir(), '{0}-{1}.json'.format(name, key[:16]))
+
+
 def validate_uuid4(uuid_string):
     """
     Validate that a UUID string is in
@@ -40,3 +134,84 @@ def validate_uuid4(uuid_string):
     # the UUID.__init__ will convert it to a
     # valid uuid4. This is bad for validation purposes.
     return val.hex == uuid_string or val.__str__() == uuid_string
+
+
+class Future(object):
+    """
+    Result of something that completes later, a cut down version of
+    concurrent.futures.Future which isn't available on python 2.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._result = None
+        self._exception = None
+
+    def done(self):
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        if not self._event.wait(timeout):
+            raise errors.TimeoutError('Future.result', timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        if not self._event.wait(timeout):
+            raise errors.TimeoutError('Future.exception', timeout)
+        return self._exception
+
+    def add_done_callback(self, fn):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def set_result(self, result):
+        self._result = result
+        self._finish()
+
+    def set_exception(self, exception):
+        self._exception = exception
+        self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+
+def gather(futures):
+    """
+    A Future for the list of results of all the given futures, which
+    fails with the first exception raised by any of them.
+    """
+    futures = list(futures)
+    combined = Future()
+    state = {'remaining': len(futures), 'failed': False}
+    lock = threading.Lock()
+
+    def done(future):
+        error = future.exception()
+        with lock:
+            if state['failed']:
+                return
+            state['remaining'] -= 1
+            if error is not None:
+                state['failed'] = True
+            finished = state['remaining'] == 0
+        if error is not None:
+            combined.set_exception(error)
+        elif finished:
+            combined.set_result([f.result() for f in futures])
+
+    if not futures:
+        combined.set_result([])
+    for future in futures:
+        future.add_done_callback(done)
+    return combined
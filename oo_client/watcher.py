@@ -0,0 +1,175 @@
+import logging
+import time
+from collections import OrderedDict
+import oo_client.errors as errors
+import oo_client.utils as utils
+
+RUN_FINISHED_STATES = ['COMPLETED', 'SYSTEM_FAILURE', 'CANCELED']
+# answers to a batched summary request from a central that can't batch
+BATCH_UNSUPPORTED = (400, 404, 405)
+
+
+class _Watched(object):
+    __slots__ = ('id', 'future', 'deadline', 'timeout', 'execution')
+
+    def __init__(self, watched_id, timeout):
+        self.id = watched_id
+        self.execution = None
+        self.future = utils.Future()
+        self.timeout = timeout
+        if timeout is None:
+            self.deadline = None
+        else:
+            self.deadline = utils.clock() + timeout
+
+
+class ExecutionWatcher(object):
+    """
+    Tracks many runs and deployments from a single polling loop.
+    Run summaries are fetched batch_size at a time through
+    executions/{id1,id2,...}/summary, deployments one call each.
+    Every watched item gets a utils.Future which resolves to the run
+    summary or the deploymentResultVO, or fails with TimeoutError.
+    Sleeps between polls follow policy, starting again from the shortest
+    interval whenever something new is watched.
+    """
+    def __init__(self, oo_client, policy=None, batch_size=50):
+        self.oo = oo_client
+        self.policy = policy or utils.PollPolicy()
+        self.batch_size = batch_size
+        self._intervals = self.policy.intervals()
+        self.runs = OrderedDict()
+        self.deployments = OrderedDict()
+        self.log = logging.getLogger(self.__class__.__name__)
+
+    def watch_run(self, run_id, callback=None, timeout=None):
+        """
+        callback is called with the run id and its summary once the run
+        has finished.
+        """
+        watched = _Watched(run_id, timeout)
+        self._add_callback(watched, callback)
+        self.runs[str(run_id)] = watched
+        self._intervals = self.policy.intervals()
+        return watched.future
+
+    def watch_execution(self, execution, callback=None, timeout=None):
+        """
+        Like watch_run for an hpoo.Execution, its cached summary is kept
+        up to date from every poll.
+        """
+        future = self.watch_run(execution.run_id, callback, timeout)
+        self.runs[str(execution.run_id)].execution = execution
+        return future
+
+    def watch_deployment(self, deploy_id, callback=None, timeout=None):
+        """
+        callback is called with the deployment id and its
+        deploymentResultVO once the deployment has finished.
+        """
+        watched = _Watched(deploy_id, timeout)
+        self._add_callback(watched, callback)
+        self.deployments[str(deploy_id)] = watched
+        self._intervals = self.policy.intervals()
+        return watched.future
+
+    def pending(self):
+        return len(self.runs) + len(self.deployments)
+
+    def poll(self):
+        """
+        Check everything being watched once, returns the number of
+        items that completed.
+        """
+        done = self._poll_runs() + self._poll_deployments()
+        self._expire(self.runs)
+        self._expire(self.deployments)
+        return done
+
+    def next_interval(self):
+        """
+        Seconds to wait before the next poll.
+        """
+        return next(self._intervals)
+
+    def sleep(self, deadline=None):
+        """
+        Sleep until the next poll is due, but not past deadline.
+        """
+        interval = self.next_interval()
+        if deadline is not None:
+            interval = max(0, min(interval, deadline - utils.clock()))
+        time.sleep(interval)
+        utils.check_interrupt()
+
+    def wait(self, timeout=None):
+        """
+        Poll until nothing is left to watch.
+        """
+        deadline = None if timeout is None else utils.clock() + timeout
+        while True:
+            self.poll()
+            if not self.pending():
+                return
+            if deadline is not None and utils.clock() >= deadline:
+                raise errors.TimeoutError('ExecutionWatcher.wait', timeout)
+            self.sleep(deadline)
+
+    def _add_callback(self, watched, callback):
+        if callback:
+            def done(future):
+                if future.exception() is None:
+                    callback(watched.id, future.result())
+            watched.future.add_done_callback(done)
+
+    def _poll_runs(self):
+        done = 0
+        run_ids = list(self.runs.keys())
+        for i in range(0, len(run_ids), self.batch_size):
+            batch = run_ids[i:i + self.batch_size]
+            for run_id, summary in self._get_summaries(batch).items():
+                if self.runs[run_id].execution is not None:
+                    self.runs[run_id].execution.update(summary)
+                if summary['status'] in RUN_FINISHED_STATES:
+                    self.runs.pop(run_id).future.set_result(summary)
+                    done += 1
+        return done
+
+    def _get_summaries(self, run_ids):
+        if len(run_ids) > 1:
+            try:
+                summaries = self.oo.get_run_summaries(run_ids)
+            except errors.HTTPNon200 as e:
+                if e.status_code not in BATCH_UNSUPPORTED:
+                    # e.g. a 503, ask for the batch again on the next poll
+                    self.log.warning("Batched run summaries failed, retrying"
+                                     " on the next poll: {0}".format(e.msg))
+                    return {}
+                self.log.warning("Central doesn't support batched run"
+                                 " summaries, polling runs one at a time")
+                self.batch_size = 1
+                summaries = {}
+        else:
+            summaries = {}
+        for run_id in run_ids:
+            if run_id not in summaries:
+                summaries[run_id] = self.oo.get_run_summary(run_id)
+        return summaries
+
+    def _poll_deployments(self):
+        done = 0
+        for deploy_id in list(self.deployments.keys()):
+            result = self.oo.is_deployment_complete(deploy_id)
+            if result:
+                self.deployments.pop(deploy_id).future.set_result(result)
+                done += 1
+        return done
+
+    def _expire(self, watching):
+        now = utils.clock()
+        for key, watched in list(watching.items()):
+            if watched.deadline is not None and now >= watched.deadline:
+                del watching[key]
+                watched.future.set_exception(
+                    errors.TimeoutError('waiting for {0}'.format(watched.id),
+                                        watched.timeout))
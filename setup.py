@@ -1,7 +1,7 @@
 from setuptools import setup
 
 setup(name='oo_client',
-      version='0.5',
+      version='0.6',
       description='Client library for HPOO',
       author='Matthew Mead-Briggs',
       author_email='matthew@meadbriggs.co.uk',
@@ -0,0 +1,116 @@
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from mock import patch
+
+from oo_client.cache import ResponseCache
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmp_dir, 'cache', 'resp.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_key(self):
+        self.assertEqual(ResponseCache.key('flows/tree/level',
+                                           {'path': 'Library', 'a': 1}),
+                         'flows/tree/level?a=1&path=Library')
+        self.assertEqual(ResponseCache.key('config-items', {}),
+                         'config-items')
+
+    def test_cacheable(self):
+        cache = ResponseCache()
+        self.assertTrue(cache.cacheable('content-packs'))
+        self.assertTrue(cache.cacheable('content-packs/1/content-tree'))
+        self.assertTrue(cache.cacheable('flows/tree/level'))
+        self.assertTrue(cache.cacheable('config-items/system-properties'))
+        self.assertFalse(cache.cacheable('executions/1/summary'))
+        self.assertFalse(cache.cacheable('deployments/1'))
+        self.assertFalse(cache.cacheable('version'))
+
+    @patch('oo_client.cache.time.time')
+    def test_ttl(self, mock_time):
+        mock_time.return_value = 1000
+        cache = ResponseCache(ttl=60)
+        self.assertEqual(cache.lookup('content-packs'), (None, False))
+        cache.store('content-packs', '[]', etag='"1"')
+        entry, fresh = cache.lookup('content-packs')
+        self.assertTrue(fresh)
+        self.assertEqual(entry.text, '[]')
+        mock_time.return_value = 1060
+        entry, fresh = cache.lookup('content-packs')
+        self.assertFalse(fresh)
+        self.assertEqual(cache.validators(entry), {'If-None-Match': '"1"'})
+        cache.not_modified('content-packs', entry)
+        self.assertTrue(cache.lookup('content-packs')[1])
+        self.assertEqual(cache.stats()['hits'], 2)
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(cache.stats()['revalidated'], 1)
+
+    def test_lru(self):
+        cache = ResponseCache(max_entries=2)
+        cache.store('config-items/a', '1')
+        cache.store('config-items/b', '2')
+        cache.lookup('config-items/a')
+        cache.store('config-items/c', '3')
+        self.assertEqual(list(cache.entries),
+                         ['config-items/a', 'config-items/c'])
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_invalidate(self):
+        cache = ResponseCache()
+        cache.store('config-items/system-properties', '[]')
+        cache.store('config-items', '[]')
+        cache.store('content-packs', '[]')
+        cache.store('flows/tree/level?path=Library', '[]')
+        cache.invalidate('config-items/system-properties/sp1')
+        self.assertEqual(list(cache.entries),
+                         ['content-packs', 'flows/tree/level?path=Library'])
+        cache.invalidate('deployments/1')
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()['invalidations'], 4)
+
+    def test_flush(self):
+        cache = ResponseCache(cache_path=self.cache_path)
+        with patch.object(cache, 'save', wraps=cache.save) as mock_save:
+            for index in range(100):
+                cache.store('flows/{0}'.format(index), '{}')
+                cache.not_modified('flows/{0}'.format(index),
+                                   cache.lookup('flows/{0}'.format(index))[0])
+            self.assertFalse(os.path.exists(self.cache_path))
+            cache.flush()
+            cache.flush()
+            self.assertEqual(mock_save.call_count, 1)
+            # invalidations that drop nothing leave it clean
+            for _ in range(100):
+                cache.invalidate('executions')
+            cache.flush()
+            self.assertEqual(mock_save.call_count, 1)
+            cache.invalidate('deployments/1')
+            cache.flush()
+            self.assertEqual(mock_save.call_count, 2)
+
+    def test_persist(self):
+        cache = ResponseCache(cache_path=self.cache_path)
+        cache.store('content-packs', '[{"id": "1"}]', last_modified='then')
+        cache.flush()
+        mode = os.stat(self.cache_path).st_mode
+        self.assertEqual(stat.S_IMODE(mode), 0o600)
+        loaded = ResponseCache(cache_path=self.cache_path)
+        entry, fresh = loaded.lookup('content-packs')
+        self.assertTrue(fresh)
+        self.assertEqual(entry.text, '[{"id": "1"}]')
+        self.assertEqual(loaded.validators(entry),
+                         {'If-Modified-Since': 'then'})
+
+    def test_unreadable(self):
+        os.makedirs(os.path.dirname(self.cache_path))
+        with open(self.cache_path, 'w') as cache:
+            cache.write('{nope')
+        self.assertEqual(len(ResponseCache(cache_path=self.cache_path)), 0)
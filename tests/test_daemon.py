@@ -0,0 +1,147 @@
+import json
+import logging
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+from StringIO import StringIO
+
+from mock import Mock, patch
+
+from oo_client.simulator import CentralSimulator
+
+import oo_client.cli as cli
+import oo_client.daemon as daemon
+import oo_client.utils as utils
+
+
+class TestHpooDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.tmp_dir, 'hpoo.sock')
+        self.server = daemon.HpooDaemon(self.socket_path)
+        self.thread = threading.Thread(target=self.server.serve)
+        self.thread.start()
+
+    def tearDown(self):
+        daemon.stop(self.socket_path)
+        self.thread.join(5)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_not_running(self):
+        missing = os.path.join(self.tmp_dir, 'missing.sock')
+        self.assertIsNone(daemon.forward(['-a', 'run'], missing))
+        self.assertFalse(daemon.is_running(missing))
+        self.assertTrue(daemon.is_running(self.socket_path))
+
+    @patch('oo_client.daemon.cli.main')
+    def test_forward(self, mock_main):
+        def main(argv):
+            self.assertEqual(os.getcwd(), os.path.realpath(self.tmp_dir))
+            print('a/flow')
+            logging.getLogger('test').warning('careful')
+            sys.exit(3)
+        mock_main.side_effect = main
+        out, err = StringIO(), StringIO()
+        cwd = os.getcwd()
+        os.chdir(self.tmp_dir)
+        try:
+            with patch('sys.stdout', out), patch('sys.stderr', err):
+                code = daemon.forward(['-a', 'list_tests'], self.socket_path)
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(code, 3)
+        mock_main.assert_called_with(['-a', 'list_tests'])
+        self.assertEqual(out.getvalue(), 'a/flow\n')
+        self.assertIn('WARNING:test:careful', err.getvalue())
+
+    @patch('oo_client.daemon.cli.main')
+    def test_command_fails(self, mock_main):
+        mock_main.side_effect = ValueError('boom')
+        with patch('sys.stderr', StringIO()) as err:
+            self.assertEqual(daemon.forward(['-a', 'run'],
+                                            self.socket_path), 1)
+        self.assertIn('boom', err.getvalue())
+        mock_main.side_effect = None
+        self.assertEqual(daemon.forward(['-a', 'run'], self.socket_path), 0)
+
+    def test_hang_up(self):
+        central = CentralSimulator(flows=2, test_flows=0,
+                                   run_duration=30).start()
+        try:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.connect(self.socket_path)
+            conn.sendall(json.dumps({'argv': [
+                '-a', 'run', '-f', 'Library/cp0/folder0/flow0.xml',
+                'Library/cp0/folder0/flow1.xml', '--parallel', '2', '-c',
+                central.url, '-u', 'admin', '-p', 'admin', '--poll-initial',
+                '0.01', '--poll-max', '0.01']}) + '\n')
+            for _ in range(100):
+                if len(central.runs) == 2:
+                    break
+                threading.Event().wait(0.05)
+            # like Ctrl-C on hpoo --use-daemon
+            conn.close()
+            for _ in range(100):
+                statuses = [run.summary()['status']
+                            for run in central.runs.values()]
+                if statuses == ['CANCELED', 'CANCELED']:
+                    break
+                threading.Event().wait(0.05)
+            self.assertEqual(statuses, ['CANCELED', 'CANCELED'])
+            # the next command, once this one has finished, isn't
+            # interrupted
+            self.assertTrue(daemon.is_running(self.socket_path))
+            with patch('sys.stderr', StringIO()):
+                self.assertEqual(daemon.forward(['-a', 'merge_reports'],
+                                                self.socket_path), 2)
+            utils.interrupt()
+            self.assertRaises(KeyboardInterrupt, utils.check_interrupt)
+            utils.clear_interrupt()
+        finally:
+            central.stop()
+
+    def test_stop(self):
+        self.assertTrue(daemon.stop(self.socket_path))
+        self.thread.join(5)
+        self.assertFalse(self.thread.is_alive())
+        self.assertFalse(os.path.exists(self.socket_path))
+        self.assertIsNone(cli.CLIENTS)
+
+
+class TestClientReuse(unittest.TestCase):
+    def setUp(self):
+        cli.CLIENTS = {}
+        self.args = Mock(central='https://blah:1234', user='aa',
+                         password='bb', ssl=True, poll_initial=0.5,
+                         poll_factor=2, poll_max=5, flow_cache=False,
+                         parallel=1, upload_workers=4, config_workers=4,
+                         session_cache=False, response_cache=False)
+
+    def tearDown(self):
+        cli.CLIENTS = None
+
+    @patch('oo_client.hpoo.OOClient')
+    def test_get_client(self, mock_client):
+        client = cli.get_client(self.args, Mock())
+        client.deploy_id = 1234
+        self.assertIs(cli.get_client(self.args, Mock()), client)
+        self.assertIsNone(client.deploy_id)
+        self.assertEqual(mock_client.call_count, 1)
+        self.args.user = 'cc'
+        cli.get_client(self.args, Mock())
+        self.assertEqual(mock_client.call_count, 2)
+        # other caches or a bigger pool need a client of their own
+        self.args.response_cache = True
+        cli.get_client(self.args, Mock())
+        self.assertEqual(mock_client.call_count, 3)
+        self.args.parallel = 20
+        cli.get_client(self.args, Mock())
+        self.assertEqual(mock_client.call_count, 4)
+        self.assertEqual(mock_client.call_args[1]['pool_size'], 20)
+        self.args.parallel = 2
+        cli.get_client(self.args, Mock())
+        self.assertEqual(mock_client.call_count, 4)
@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from oo_client.deploy_record import DeployRecord, jar_details
+
+
+def make_jar(path, name, version, flow='<flow/>'):
+    with zipfile.ZipFile(path, 'w') as jar:
+        jar.writestr('contentpack.properties',
+                     '# built\ncontent.pack.name={0}\n'
+                     'content.pack.version = {1}\n'.format(name, version))
+        jar.writestr('Content/Library/flow.xml', flow)
+
+
+class TestDeployRecord(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.jar_path = os.path.join(self.tmp_dir, 'my-cp-1.0.jar')
+        make_jar(self.jar_path, 'my-cp', '1.0-SNAPSHOT')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_jar_details(self):
+        details = jar_details(self.jar_path)
+        self.assertEqual(details.name, 'my-cp')
+        self.assertEqual(details.version, '1.0-SNAPSHOT')
+        self.assertEqual(len(details.sha1), 40)
+        self.assertIsNone(jar_details(os.path.join(self.tmp_dir, 'no.jar')))
+        not_cp = os.path.join(self.tmp_dir, 'not-cp.jar')
+        with zipfile.ZipFile(not_cp, 'w') as jar:
+            jar.writestr('other', 'text')
+        self.assertIsNone(jar_details(not_cp))
+
+    def test_record(self):
+        cache_path = os.path.join(self.tmp_dir, 'cache', 'deployed.json')
+        record = DeployRecord(cache_path)
+        details = jar_details(self.jar_path)
+        self.assertFalse(record.matches(details))
+        record.add(details)
+        record.save()
+        loaded = DeployRecord(cache_path)
+        self.assertTrue(loaded.matches(details))
+        self.assertFalse(loaded.matches(details._replace(sha1='changed')))
+        self.assertEqual(loaded.sha1(details), details.sha1)
+        self.assertIsNone(loaded.sha1(details._replace(version='1.1')))
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from oo_client.durations import DurationHistory
+from oo_client.hpoo import OOClient
+from oo_client.hpoo_tester import IntegrationTester
+from oo_client.simulator import CentralSimulator
+
+import oo_client.utils as utils
+
+
+class TestDurationHistory(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmp_dir, 'durations.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_expected(self):
+        history = DurationHistory(keep=3)
+        self.assertIsNone(history.expected('a'))
+        self.assertIsNone(history.longest())
+        for seconds in (100, 10, 20, 30):
+            history.add('a', seconds)
+        self.assertEqual(history.durations['a'], [10, 20, 30])
+        self.assertEqual(history.expected('a'), 20)
+        history.add('b', 50)
+        self.assertEqual(history.longest(), 50)
+
+    def test_order(self):
+        history = DurationHistory()
+        flows = ['short', 'new', 'long', 'medium', 'other_new']
+        self.assertEqual(history.order(flows), flows)
+        history.add('short', 1)
+        history.add('medium', 5)
+        history.add('long', 60)
+        # new flows count as the longest known and keep their order
+        self.assertEqual(history.order(flows),
+                         ['new', 'long', 'other_new', 'medium', 'short'])
+
+    def test_makespan(self):
+        history = DurationHistory()
+        for flow, seconds in (('a', 10), ('b', 1), ('c', 1), ('d', 1)):
+            history.add(flow, seconds)
+        self.assertEqual(history.makespan(['b', 'c', 'd', 'a'], 2), 11)
+        self.assertEqual(history.makespan(history.order(['b', 'c', 'd', 'a']),
+                                          2), 10)
+        self.assertIsNone(history.makespan(['a', 'e'], 2))
+
+    def test_load_save(self):
+        history = DurationHistory(self.cache_path)
+        history.add('Library/tests/test_a.xml', 1.23456)
+        history.save()
+        history = DurationHistory(self.cache_path)
+        self.assertEqual(history.durations,
+                         {'Library/tests/test_a.xml': [1.235]})
+        with open(self.cache_path, 'w') as f:
+            f.write('{not json')
+        self.assertEqual(len(DurationHistory(self.cache_path)), 0)
+
+
+class TestLongestFirst(unittest.TestCase):
+    def setUp(self):
+        self.central = CentralSimulator(
+            flows=4, test_flows=4,
+            run_duration=lambda path: 0.4 if 'test_flow2' in path else 0.1)
+        self.central.start()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmp_dir, 'durations.json')
+
+    def tearDown(self):
+        self.central.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def run_tests(self):
+        client = OOClient(self.central.url, 'admin', 'admin',
+                          poll_policy=utils.PollPolicy(0.01, 1, 0.01),
+                          flow_cache=False, deploy_record=False)
+        tester = IntegrationTester(client, 'tests/integration_tests/',
+                                   history=DurationHistory(self.cache_path))
+        first_run = len(self.central.runs)
+        self.assertTrue(tester.run_tests('cp0', parallel=2))
+        runs = sorted(self.central.runs.items())[first_run:]
+        return [run.flow['name'] for _, run in runs]
+
+    def test_longest_first(self):
+        self.run_tests()
+        history = DurationHistory(self.cache_path)
+        self.assertEqual(len(history), 4)
+        self.assertEqual(self.run_tests()[0], 'test_flow2')
+        self.assertEqual(len(DurationHistory(self.cache_path).durations[
+            'Library/cp0/tests/integration_tests/test_flow2.xml']), 2)
@@ -0,0 +1,123 @@
+import json
+import os
+import shutil
+import signal
+import tempfile
+import unittest
+
+from mock import Mock, patch
+
+from oo_client.hpoo import OOClient
+from oo_client.simulator import CentralSimulator
+
+import oo_client.cli as cli
+import oo_client.errors as errors
+import oo_client.utils as utils
+
+
+def flow(index):
+    return 'Library/cp0/tests/integration_tests/test_flow{0}.xml'.format(index)
+
+
+class TestFailFast(unittest.TestCase):
+    def setUp(self):
+        # flow0 fails straight away, the others would run for a while
+        self.central = CentralSimulator(
+            flows=5, test_flows=5,
+            run_duration=lambda path: 0.05 if 'flow0' in path else 5,
+            failure_rate=lambda path: 1 if 'flow0' in path else 0)
+        self.central.start()
+        self.client = OOClient(self.central.url, 'admin', 'admin',
+                               poll_policy=utils.PollPolicy(0.01, 1, 0.01),
+                               flow_cache=False, deploy_record=False)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.central.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def statuses(self):
+        return dict((run.flow['name'], run.summary()['status'])
+                    for run in self.central.runs.values())
+
+    def test_cancel_run(self):
+        execution = self.client.run_flow_async(flow(1))
+        self.client.cancel_run(execution.run_id)
+        self.assertEqual(execution.refresh()['status'], 'CANCELED')
+        # finished runs are left alone
+        self.client.cancel_executions([execution])
+        self.assertEqual(self.central.stats['endpoints'][
+            'PUT executions/{id}/status'], 1)
+
+    def test_parallel(self):
+        flows = [flow(index) for index in range(5)]
+        callback = Mock()
+        self.assertEqual(self.client.run_flows_parallel(
+            flows, 2, callback=callback, fail_fast=True),
+            ['ERROR', None, None, None, None])
+        self.assertEqual(self.statuses(), {'test_flow0': 'COMPLETED',
+                                           'test_flow1': 'CANCELED'})
+        self.assertEqual(callback.call_count, 1)
+        self.assertFalse(self.client.run_flows(flows, parallel=2,
+                                               fail_fast=True))
+
+    def test_sequential(self):
+        self.central.run_duration = 0.05
+        self.assertFalse(self.client.run_flows([flow(1), flow(0), flow(2)],
+                                               fail_fast=True))
+        self.assertEqual(self.statuses(), {'test_flow0': 'COMPLETED',
+                                           'test_flow1': 'COMPLETED'})
+
+    def test_timeout_cancels(self):
+        with self.assertRaises(errors.TimeoutError):
+            self.client.run_flows([flow(1), flow(2)], timeout=0.2,
+                                  parallel=2)
+        self.assertEqual(self.statuses(), {'test_flow1': 'CANCELED',
+                                           'test_flow2': 'CANCELED'})
+        with self.assertRaises(errors.TimeoutError):
+            self.client.run_flow(flow(3), timeout=0.2)
+        self.assertEqual(self.statuses()['test_flow3'], 'CANCELED')
+
+    def test_interrupt_cancels(self):
+        callback = Mock(side_effect=KeyboardInterrupt)
+        with self.assertRaises(KeyboardInterrupt):
+            self.client.run_flows([flow(0), flow(1), flow(2)], parallel=2,
+                                  callback=callback)
+        self.assertEqual(self.statuses(), {'test_flow0': 'COMPLETED',
+                                           'test_flow1': 'CANCELED'})
+
+    def test_sigterm(self):
+        previous = signal.getsignal(signal.SIGTERM)
+        self.assertEqual(cli.handle_sigterm(), previous)
+        try:
+            with self.assertRaises(KeyboardInterrupt):
+                os.kill(os.getpid(), signal.SIGTERM)
+                signal.pause()
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+
+    @patch('logging.basicConfig')
+    def test_cli(self, mock_logging):
+        report = os.path.join(self.tmp_dir, 'report.json')
+        with self.assertRaises(SystemExit) as e:
+            cli.main(['-a', 'integration_test', '-cp', 'cp0', '--parallel',
+                      '5', '--fail-fast', '--filter',
+                      'tests/integration_tests/', '--json-report', report,
+                      '-c', self.central.url, '-u', 'admin', '-p', 'admin',
+                      '--poll-initial', '0.01', '--poll-max', '0.01'])
+        self.assertEqual(e.exception.code, 1)
+        self.assertEqual(self.statuses(), {'test_flow0': 'COMPLETED',
+                                           'test_flow1': 'CANCELED',
+                                           'test_flow2': 'CANCELED',
+                                           'test_flow3': 'CANCELED',
+                                           'test_flow4': 'CANCELED'})
+        with open(report) as f:
+            self.assertEqual(json.load(f)['summary'], {
+                'tests': 5, 'passed': 0, 'failed': 1, 'error': 4})
+        previous = signal.getsignal(signal.SIGTERM)
+        with patch('oo_client.cli.run_action',
+                   side_effect=KeyboardInterrupt), \
+                self.assertRaises(SystemExit) as e:
+            cli.main(['-a', 'run', '-f', flow(1)])
+        self.assertEqual(e.exception.code, 130)
+        self.assertEqual(signal.getsignal(signal.SIGTERM), previous)
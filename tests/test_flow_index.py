@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from oo_client.flow_index import FlowIndex
+
+
+class TestFlowIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmp_dir, 'cache', 'flows.json')
+
+    def test_lookup(self):
+        index = FlowIndex()
+        index.add('Library/tests/test_flow.xml', 'uuid1', 'my-cp')
+        self.assertEqual(index.get_uuid('Library/tests/test_flow.xml'),
+                         'uuid1')
+        self.assertEqual(index.get_uuid('Library/tests/test_flow'), 'uuid1')
+        self.assertIsNone(index.get_uuid('Library/tests/other_flow'))
+        self.assertEqual(index.get_cp_name('uuid1'), 'my-cp')
+        self.assertEqual(len(index), 1)
+
+    def test_persist(self):
+        index = FlowIndex(self.cache_path)
+        index.add('Library/tests/test_flow.xml', 'uuid1', 'my-cp')
+        index.save()
+        loaded = FlowIndex(self.cache_path)
+        self.assertEqual(loaded.get_uuid('Library/tests/test_flow'), 'uuid1')
+        self.assertEqual(loaded.get_cp_name('uuid1'), 'my-cp')
+        loaded.clear()
+        self.assertFalse(os.path.exists(self.cache_path))
+        self.assertEqual(len(FlowIndex(self.cache_path)), 0)
+
+    def test_corrupt_cache(self):
+        os.makedirs(os.path.dirname(self.cache_path))
+        with open(self.cache_path, 'w') as cache:
+            cache.write('{not json')
+        self.assertEqual(len(FlowIndex(self.cache_path)), 0)
+
+    def test_concurrent(self):
+        index = FlowIndex(self.cache_path)
+        errors = []
+
+        def add(thread):
+            try:
+                for i in range(50):
+                    index.add('Library/t{0}/flow{1}.xml'.format(thread, i),
+                              'uuid{0}-{1}'.format(thread, i), 'my-cp')
+                    index.save()
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=add, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(FlowIndex(self.cache_path)), 400)
+        self.assertEqual(os.listdir(os.path.dirname(self.cache_path)),
+                         ['flows.json'])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
@@ -1,7 +1,14 @@
+import json
+import os
+import shutil
+import tempfile
 import unittest
-from mock import Mock, patch, call
-from oo_client.hpoo import OOClient
+from mock import Mock, patch, call, ANY
+from oo_client.deploy_record import jar_details
+from oo_client.hpoo import OOClient, Execution
 import oo_client.errors as errors
+import requests
+from test_deploy_record import make_jar
 
 
 class TestHPOO(unittest.TestCase):
@@ -43,16 +50,17 @@ class TestHPOO(unittest.TestCase):
         ret = client.get_new_deployment()
         self.assertEqual(ret, 1234)
 
+    @patch('oo_client.hpoo.os.path.getsize')
     @patch('oo_client.hpoo.OOClient.wait_for_deployment_to_complete')
     @patch('oo_client.hpoo.OORestCaller.put')
-    @patch('oo_client.hpoo.OORestCaller.post')
+    @patch('oo_client.hpoo.OORestCaller.post_file')
     @patch('oo_client.hpoo.OORestCaller.get')
-    @patch('__builtin__.open')
     @patch('oo_client.hpoo.OOClient.get_new_deployment')
-    def test_deploy_content_packs(self, mock_get_dep, mock_open, mock_get,
-                                  mock_post, mock_put, mock_wait):
+    def test_deploy_content_packs(self, mock_get_dep, mock_get,
+                                  mock_post, mock_put, mock_wait,
+                                  mock_getsize):
         mock_get_dep.return_value = 1234
-        mock_cp = mock_open()
+        mock_getsize.return_value = 100
         client = OOClient("https://blah:1234", "aa", "bb")
         mock_response = {"contentPackResponses":
                          {"dummy.jar":
@@ -62,16 +70,17 @@ class TestHPOO(unittest.TestCase):
                           {"responses": [{"responseCategory": "Success",
                                           "message": "lolol"}]}}}
         mock_wait.return_value = mock_response
+        client.flows.add('Library/flow', 'uuid')
         ret = client.deploy_content_packs(['/some/dummy.jar',
                                            '/another/not.jar'])
-        first_cp = call("deployments/1234/files",
-                        files={'file': ('dummy.jar',
-                                        mock_cp.__enter__())})
-        second_cp = call("deployments/1234/files",
-                         files={'file': ('not.jar',
-                                         mock_cp.__enter__())})
-        client.rest.post.assert_has_calls([first_cp, second_cp])
-        mock_wait.assert_called_with(1234, 3600, 5)
+        self.assertEqual(len(client.flows), 0)
+        first_cp = call("deployments/1234/files", '/some/dummy.jar',
+                        progress=ANY)
+        second_cp = call("deployments/1234/files", '/another/not.jar',
+                         progress=ANY)
+        client.rest.post_file.assert_has_calls([first_cp, second_cp],
+                                               any_order=True)
+        mock_wait.assert_called_with(1234, 3600)
         mock_put.assert_called_with('deployments/1234', None)
         self.assertTrue(ret)
         mock_response = {"contentPackResponses":
@@ -86,6 +95,99 @@ class TestHPOO(unittest.TestCase):
                                            '/another/not.jar'])
         self.assertFalse(ret)
 
+    @patch('oo_client.hpoo.OOClient.start_deployment')
+    @patch('oo_client.hpoo.OOClient.wait_for_deployment_to_complete')
+    @patch('oo_client.hpoo.OORestCaller.get')
+    def test_deploy_unchanged_content_packs(self, mock_get, mock_wait,
+                                            mock_start):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        snapshot = os.path.join(tmp_dir, 'snap-cp.jar')
+        release = os.path.join(tmp_dir, 'release-cp.jar')
+        make_jar(snapshot, 'snap', '1.0-SNAPSHOT')
+        make_jar(release, 'release', '2.0')
+        client = OOClient("https://blah:1234", "aa", "bb",
+                          deploy_record=os.path.join(tmp_dir, 'rec.json'))
+        mock_get.return_value = [{'id': 1, 'name': 'snap',
+                                  'version': '1.0-SNAPSHOT'},
+                                 {'id': 2, 'name': 'release',
+                                  'version': '2.0'}]
+        mock_start.return_value = 1234
+        success = {"responses": [{"responseCategory": "Success",
+                                  "message": "lolol"}]}
+        mock_wait.return_value = {"contentPackResponses":
+                                  {"snap-cp.jar": success}}
+        # the same release is on central, a snapshot could be anything
+        self.assertTrue(client.deploy_content_packs([snapshot, release]))
+        mock_start.assert_called_with([snapshot], upload_workers=4,
+                                      upload_retries=2)
+        mock_get.assert_called_with('content-packs')
+        # now we know central has this snapshot
+        mock_start.reset_mock()
+        self.assertTrue(client.deploy_content_packs([snapshot, release]))
+        self.assertFalse(mock_start.called)
+        self.assertTrue(client.deploy_content_packs([snapshot, release],
+                                                    force=True))
+        mock_start.assert_called_with([snapshot, release], upload_workers=4,
+                                      upload_retries=2)
+        # rebuilt jar or another version on central
+        make_jar(snapshot, 'snap', '1.0-SNAPSHOT', '<flow id="2"/>')
+        self.assertEqual(client.undeployed_content_packs([snapshot]),
+                         [snapshot])
+        mock_get.return_value = [{'id': 2, 'name': 'release',
+                                  'version': '1.9'}]
+        self.assertEqual(client.undeployed_content_packs([release]),
+                         [release])
+        # a release rebuilt since it was deployed from here
+        mock_get.return_value = [{'id': 2, 'name': 'release',
+                                  'version': '2.0'}]
+        self.assertEqual(client.undeployed_content_packs([release]), [])
+        client.deployed.add(jar_details(release))
+        make_jar(release, 'release', '2.0', '<flow id="3"/>')
+        self.assertEqual(client.undeployed_content_packs([release]),
+                         [release])
+
+    @patch('oo_client.hpoo.time.sleep')
+    @patch('oo_client.hpoo.OORestCaller.post_file')
+    @patch('oo_client.hpoo.OORestCaller.get')
+    def test_upload_content_pack_retries(self, mock_get, mock_post,
+                                         mock_sleep):
+        client = OOClient("https://blah:1234", "aa", "bb")
+        mock_post.side_effect = [errors.HTTPNon200(503, 'busy'),
+                                 requests.exceptions.ConnectionError(),
+                                 {'ok': True}]
+        ret = client.upload_content_pack(1234, '/some/dummy.jar')
+        self.assertEqual(ret, {'ok': True})
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+        mock_post.reset_mock()
+        mock_post.side_effect = [errors.HTTPNon200(503, 'busy')] * 3
+        with self.assertRaises(errors.HTTPNon200):
+            client.upload_content_pack(1234, '/some/dummy.jar', retries=2)
+        self.assertEqual(mock_post.call_count, 3)
+        # client errors aren't worth retrying
+        mock_post.reset_mock()
+        mock_post.side_effect = [errors.HTTPNon200(400, 'bad jar')]
+        with self.assertRaises(errors.HTTPNon200):
+            client.upload_content_pack(1234, '/some/dummy.jar')
+        self.assertEqual(mock_post.call_count, 1)
+
+    @patch('oo_client.hpoo.os.path.getsize')
+    @patch('oo_client.hpoo.OOClient.upload_content_pack')
+    @patch('oo_client.hpoo.OORestCaller.get')
+    def test_upload_content_packs(self, mock_get, mock_upload, mock_getsize):
+        mock_getsize.return_value = 100
+        client = OOClient("https://blah:1234", "aa", "bb")
+        mock_upload.side_effect = lambda deploy_id, path, progress, \
+            retries: path
+        paths = ['/cp/{0}.jar'.format(i) for i in range(6)]
+        ret = client.upload_content_packs(1234, paths, workers=3)
+        self.assertEqual(ret, paths)
+        self.assertEqual(mock_upload.call_count, 6)
+        mock_upload.side_effect = errors.HTTPNon200(400, 'bad jar')
+        with self.assertRaises(errors.HTTPNon200):
+            client.upload_content_packs(1234, paths, workers=3)
+
     @patch('oo_client.hpoo.OORestCaller.get')
     def test_is_deployment_complete(self, mock_get):
         mock_get.return_value = {'status': 'FINISHED',
@@ -102,7 +204,7 @@ class TestHPOO(unittest.TestCase):
     @patch('oo_client.hpoo.OORestCaller.post')
     @patch('oo_client.hpoo.OORestCaller.get')
     def test_run_flow_async(self, mock_get, mock_post):
-        mock_ret = Mock()
+        mock_ret = {'executionId': 42}
         mock_post.return_value = mock_ret
         client = OOClient("https://blah:1234", "aa", "bb")
         ret = client.run_flow_async('f1739b66-a586-44dc-942a-479caaecec34',
@@ -112,13 +214,16 @@ class TestHPOO(unittest.TestCase):
                         'runName': 'some-name',
                         'inputs': {'an': 'input'}}
         client.rest.post.assert_called_with('executions', data=mock_payload)
-        self.assertEqual(ret, mock_ret)
+        self.assertIsInstance(ret, Execution)
+        self.assertEqual(ret.response, mock_ret)
+        self.assertEqual(ret.run_id, 42)
+        self.assertEqual(ret['executionId'], 42)
 
     @patch('oo_client.hpoo.OOClient.get_flow_uuid_from_path')
     @patch('oo_client.hpoo.OORestCaller.post')
     @patch('oo_client.hpoo.OORestCaller.get')
     def test_run_flow_async_by_path(self, mock_get, mock_post, mock_get_flow):
-        mock_ret = Mock()
+        mock_ret = {'executionId': 42}
         mock_post.return_value = mock_ret
         mock_get_flow.return_value = 'the-uuid'
         client = OOClient("https://blah:1234", "aa", "bb")
@@ -130,32 +235,62 @@ class TestHPOO(unittest.TestCase):
                         'runName': 'some-name',
                         'inputs': {'an': 'input'}}
         client.rest.post.assert_called_with('executions', data=mock_payload)
-        self.assertEqual(ret, mock_ret)
+        self.assertEqual(ret.response, mock_ret)
+        self.assertEqual(ret.flow, 'Some/flow/path')
 
-    @patch('oo_client.hpoo.OOClient.get_run_result_type')
-    @patch('oo_client.hpoo.OOClient.get_run_status')
-    @patch('oo_client.hpoo.OOClient.wait_for_run_to_complete')
+    @patch('oo_client.utils.time.sleep')
+    @patch('oo_client.hpoo.OOClient.get_run_summary')
     @patch('oo_client.hpoo.OOClient.run_flow_async')
     @patch('oo_client.hpoo.OORestCaller.get')
-    def test_run_flow(self, mock_get, mock_run, mock_wait, mock_get_s,
-                      mock_get_r):
-        mock_run.return_value = {'executionId': 345}
-        mock_get_s.return_value = 'COMPLETED'
-        mock_get_r.return_value = 'result'
+    def test_run_flow(self, mock_get, mock_run, mock_summary, mock_sleep):
         client = OOClient("https://blah:1234", "aa", "bb")
+        mock_run.return_value = Execution(client, 'Some/flow/path',
+                                          {'executionId': 345})
+        mock_summary.side_effect = [{'status': 'RUNNING'},
+                                    {'status': 'COMPLETED',
+                                     'resultStatusType': 'result'}]
         ret = client.run_flow('Some/flow/path',
                               run_name='some-name',
                               inputs={'an': 'input'})
-        mock_wait.assert_called_with(345, 300, 5)
-        mock_get_s.assert_called_with(345)
-        mock_get_r.assert_called_with(345)
+        mock_run.assert_called_with('Some/flow/path', run_name='some-name',
+                                    inputs={'an': 'input'})
+        # one summary per poll and none after the run has finished
+        mock_summary.assert_has_calls([call(345), call(345)])
+        self.assertEqual(mock_summary.call_count, 2)
         self.assertEqual(ret, 'result')
-        mock_get_s.return_value = 'FAIL'
+        mock_run.return_value = Execution(client, 'Some/flow/path',
+                                          {'executionId': 346})
+        mock_summary.side_effect = [{'status': 'SYSTEM_FAILURE',
+                                     'resultStatusType': None}]
         ret = client.run_flow('Some/flow/path',
                               run_name='some-name',
                               inputs={'an': 'input'})
         self.assertIsNone(ret)
 
+    @patch('oo_client.hpoo.OOClient.get_run_summary')
+    @patch('oo_client.hpoo.OORestCaller.get')
+    def test_execution(self, mock_get, mock_summary):
+        client = OOClient("https://blah:1234", "aa", "bb")
+        execution = Execution(client, 'a/flow', {'executionId': 7})
+        self.assertFalse(mock_summary.called)
+        mock_summary.return_value = {'status': 'COMPLETED',
+                                     'resultStatusType': 'ERROR',
+                                     'startTime': 1000,
+                                     'endTime': 3500}
+        self.assertEqual(execution.status, 'COMPLETED')
+        self.assertEqual(execution.result, 'ERROR')
+        self.assertEqual(execution.duration, 2.5)
+        self.assertTrue(execution.is_complete())
+        self.assertEqual(execution.link,
+                         'https://blah:1234/oo/#/runtimeWorkspace/runs/7')
+        mock_summary.assert_called_once_with(7)
+        mock_summary.return_value = {'status': 'CANCELED',
+                                     'resultStatusType': None}
+        self.assertTrue(execution.poll())
+        self.assertIsNone(execution.result)
+        self.assertIsNone(execution.duration)
+        self.assertEqual(mock_summary.call_count, 2)
+
     @patch('oo_client.hpoo.OOClient.run_flow')
     @patch('oo_client.hpoo.OORestCaller.get')
     def test_run_flows(self, mock_get, mock_run_flow):
@@ -167,6 +302,65 @@ class TestHPOO(unittest.TestCase):
         ret = client.run_flows(['Some/flow/path', 'Other/flow/path'])
         self.assertFalse(ret)
 
+    @patch('oo_client.hpoo.OOClient.run_flows_parallel')
+    @patch('oo_client.hpoo.OORestCaller.get')
+    def test_run_flows_with_parallel(self, mock_get, mock_parallel):
+        mock_parallel.return_value = ['RESOLVED', None]
+        client = OOClient("https://blah:1234", "aa", "bb")
+        ret = client.run_flows(['Some/flow/path', 'Other/flow/path'],
+                               timeout=60, parallel=2)
+        mock_parallel.assert_called_with(['Some/flow/path',
+                                          'Other/flow/path'], 2, timeout=60,
+                                         callback=None, fail_fast=False)
+        self.assertTrue(ret)
+        mock_parallel.return_value = ['ERROR', 'RESOLVED']
+        ret = client.run_flows(['Some/flow/path', 'Other/flow/path'],
+                               parallel=2)
+        self.assertFalse(ret)
+
+    @patch('oo_client.watcher.time.sleep')
+    @patch('oo_client.hpoo.OOClient.run_flow_async')
+    @patch('oo_client.hpoo.OORestCaller.get')
+    def test_run_flows_parallel(self, mock_get, mock_run, mock_sleep):
+        client = OOClient("https://blah:1234", "aa", "bb")
+        mock_run.side_effect = [Execution(client, flow, {'executionId': i})
+                                for i, flow in ((1, 'a/flow'), (2, 'b/flow'),
+                                                (3, 'c/flow'))]
+        with patch('oo_client.hpoo.ExecutionWatcher._get_summaries') as gs:
+            gs.side_effect = [{'1': {'status': 'RUNNING'},
+                               '2': {'status': 'SYSTEM_FAILURE',
+                                     'resultStatusType': None}},
+                              {'1': {'status': 'COMPLETED',
+                                     'resultStatusType': 'RESOLVED'},
+                               '3': {'status': 'COMPLETED',
+                                     'resultStatusType': 'ERROR'}}]
+            ret = client.run_flows_parallel(['a/flow', 'b/flow', 'c/flow'],
+                                            2, interval=5)
+            # both runs are polled with one call
+            gs.assert_has_calls([call(['1', '2']), call(['1', '3'])])
+        self.assertEqual(ret, ['RESOLVED', None, 'ERROR'])
+        # the third flow only starts once one of the first two has finished
+        mock_run.assert_has_calls([call('a/flow'), call('b/flow'),
+                                   call('c/flow')])
+        self.assertEqual(mock_run.call_count, 3)
+        mock_sleep.assert_called_with(5)
+
+    @patch('oo_client.utils.clock')
+    @patch('oo_client.watcher.time.sleep')
+    @patch('oo_client.hpoo.OOClient.get_run_summary')
+    @patch('oo_client.hpoo.OOClient.run_flow_async')
+    @patch('oo_client.hpoo.OORestCaller.get')
+    def test_run_flows_parallel_timeout(self, mock_get, mock_run,
+                                        mock_summary, mock_sleep, mock_time):
+        client = OOClient("https://blah:1234", "aa", "bb")
+        mock_run.return_value = Execution(client, 'a/flow',
+                                          {'executionId': 1})
+        mock_summary.return_value = {'status': 'RUNNING'}
+        mock_time.side_effect = [0] + [301] * 5
+        with self.assertRaises(errors.TimeoutError):
+            client.run_flows_parallel(['a/flow'], 2)
+        mock_summary.assert_called_with('1')
+
     @patch('oo_client.hpoo.OOClient.get_run_status')
     @patch('oo_client.hpoo.OORestCaller.get')
     def test_is_run_complete(self, mock_get, mock_get_run_status):
@@ -189,6 +383,31 @@ class TestHPOO(unittest.TestCase):
         self.assertEqual(ret, 123)
         with self.assertRaises(errors.NotFound):
             client.get_flow_uuid_from_path('path/to/not_a_flow')
+        # the folder was indexed by the first lookup
+        mock_get.reset_mock()
+        ret = client.get_flow_uuid_from_path('path/to/a_nother_flow.xml')
+        self.assertEqual(ret, 456)
+        self.assertFalse(mock_get.called)
+
+    @patch('oo_client.hpoo.OORestCaller.get')
+    def test_index_flows(self, mock_get):
+        client = OOClient("https://blah:1234", "aa", "bb")
+        levels = {'Library': [{'id': 'f1', 'name': 'tests', 'leaf': False},
+                              {'id': 'u1', 'name': 'flow1', 'leaf': True}],
+                  'Library/tests': [{'id': 'u2', 'name': 'test_1',
+                                     'leaf': True}]}
+        mock_get.side_effect = lambda url, path: levels[path]
+        ret = client.index_flows()
+        self.assertEqual(ret, 2)
+        mock_get.assert_has_calls([call('flows/tree/level', path='Library'),
+                                   call('flows/tree/level',
+                                        path='Library/tests')])
+        mock_get.reset_mock()
+        self.assertEqual(client.get_flow_uuid_from_path('Library/flow1.xml'),
+                         'u1')
+        self.assertEqual(client.get_flow_uuid_from_path('Library/tests/'
+                                                        'test_1'), 'u2')
+        self.assertFalse(mock_get.called)
 
     @patch('oo_client.hpoo.OOClient.get_run_summary')
     @patch('oo_client.hpoo.OORestCaller.get')
@@ -219,6 +438,18 @@ class TestHPOO(unittest.TestCase):
         with self.assertRaises(errors.NotFound):
             client.get_flow_uuid_from_path('path/to/not_a_flow')
 
+    @patch('oo_client.hpoo.OORestCaller.get')
+    def test_get_run_summaries(self, mock_get):
+        client = OOClient("https://blah:1234", "aa", "bb")
+        mock_get.return_value = [{'executionId': '12', 'status': 'RUNNING'},
+                                 {'executionId': '13', 'status': 'PAUSED'}]
+        ret = client.get_run_summaries([12, 13])
+        mock_get.assert_called_with('executions/12,13/summary')
+        self.assertEqual(ret, {'12': {'executionId': '12',
+                                      'status': 'RUNNING'},
+                               '13': {'executionId': '13',
+                                      'status': 'PAUSED'}})
+
     @patch('oo_client.hpoo.OORestCaller.get')
     def test_get_content_pack_id(self, mock_get):
         client = OOClient("https://blah:1234", "aa", "bb")
@@ -239,8 +470,12 @@ class TestHPOO(unittest.TestCase):
         ret = client.get_content_pack_from_flow('Some/path/to/flow')
         mock_get.assert_called_with('flows/uuidLOL')
         self.assertEqual(ret, 'my-cp')
+        mock_get.reset_mock()
+        ret = client.get_content_pack_from_flow('Some/path/to/flow')
+        self.assertFalse(mock_get.called)
+        self.assertEqual(ret, 'my-cp')
 
-    @patch('oo_client.hpoo.OORestCaller.get')
+    @patch('oo_client.hpoo.OORestCaller.iter_get')
     @patch('oo_client.hpoo.OOClient.get_content_pack_id')
     def test_get_all_flows_in_cp(self, mock_get_content, mock_get):
         client = OOClient("https://blah:1234", "aa", "bb")
@@ -256,6 +491,8 @@ class TestHPOO(unittest.TestCase):
         mock_get.assert_called_with('content-packs/1234/content-tree')
         expected = {123: 'some/path/to/flow', 456: 'another/flow'}
         self.assertEqual(ret, expected)
+        self.assertEqual(client.flows.get_uuid('another/flow.xml'), 456)
+        self.assertEqual(client.flows.get_cp_name(456), 'my-cp')
 
     @patch('oo_client.hpoo.OORestCaller.get')
     def test_get_name_value_pair(self, mock_get):
@@ -300,7 +537,7 @@ class TestHPOO(unittest.TestCase):
         mock_get.assert_called_with('config-items/system-properties/sp1')
         self.assertEqual(ret, mock_ret)
 
-    @patch('oo_client.hpoo.OORestCaller.get')
+    @patch('oo_client.hpoo.OORestCaller.iter_get')
     def test_get_all_configuration_item(self, mock_get):
         mock_input = [{"type": "selection-lists",
                        "path": "some/path",
@@ -340,7 +577,7 @@ class TestHPOO(unittest.TestCase):
         mock_get.assert_called_with('config-items')
         self.assertEqual(ret, mock_ret)
 
-    @patch('oo_client.hpoo.OORestCaller.get')
+    @patch('oo_client.hpoo.OORestCaller.iter_get')
     def test_get_configuration_items_by_type(self, mock_get):
         mock_input = [{"type": "selection-lists",
                        "path": "some/path",
@@ -403,6 +640,59 @@ class TestHPOO(unittest.TestCase):
         mock_put.assert_called_with('config-items/system-properties/sp1', mock_data)
         self.assertEqual(ret, mock_ret)
 
+    @patch('oo_client.hpoo.OORestCaller.put')
+    @patch('oo_client.hpoo.OORestCaller.iter_get')
+    def test_sync_configuration_items(self, mock_get, mock_put):
+        mock_get.return_value = [
+            {'type': 'system-properties', 'path': 'sp1', 'name': 'sp1',
+             'value': 'old'},
+            {'type': 'system-properties', 'path': 'a/sp2', 'name': 'sp2',
+             'value': 'same'},
+            {'type': 'system-accounts', 'path': 'sa1', 'name': 'sa1',
+             'value': '{"username":"blah","password":"************"}'},
+            {'type': 'domain-terms', 'path': 'dt1', 'name': 'dt1',
+             'value': 'left alone'}]
+        items = [{'type': 'system-properties', 'path': 'sp1',
+                  'value': 'new'},
+                 {'type': 'system-properties', 'path': 'a/sp2',
+                  'value': 'same'},
+                 {'type': 'system-accounts', 'name': 'sa1',
+                  'value': {'username': 'blah', 'password': 'pw'}},
+                 {'type': 'system-properties', 'path': 'nope',
+                  'value': 'x'},
+                 {'type': 'system-properties', 'path': 'no-value'}]
+        client = OOClient("https://blah:1234", "aa", "bb")
+        ret = client.sync_configuration_items(items, dry_run=True)
+        self.assertFalse(mock_put.called)
+        self.assertEqual(ret['changed'], [('system-properties', 'sp1'),
+                                          ('system-accounts', 'sa1')])
+        self.assertEqual(ret['unchanged'], [('system-properties', 'a/sp2')])
+        self.assertEqual(len(ret['failed']), 2)
+        mock_get.assert_called_once_with('config-items')
+        ret = client.sync_configuration_items(items[:3], workers=2)
+        self.assertEqual(sorted(ret['changed']),
+                         [('system-accounts', 'sa1'),
+                          ('system-properties', 'sp1')])
+        mock_put.assert_has_calls(
+            [call('config-items/system-properties/sp1', '"new"'),
+             call('config-items/system-accounts/sa1',
+                  json.dumps(json.dumps({'username': 'blah',
+                                         'password': 'pw'})))],
+            any_order=True)
+        self.assertEqual(mock_put.call_count, 2)
+        mock_put.reset_mock()
+        mock_put.side_effect = errors.HTTPNon200(404, 'nope')
+        ret = client.sync_configuration_items(
+            {'system-properties': {'sp1': 'new'}})
+        self.assertEqual(ret['failed'], [('system-properties', 'sp1')])
+        mock_put.assert_called_with('config-items/system-properties/sp1',
+                                    '"new"')
+        # a connection error fails that item, not the whole sync
+        mock_put.side_effect = [requests.exceptions.ConnectionError('down'),
+                                None]
+        ret = client.sync_configuration_items(items[:3], workers=1)
+        self.assertEqual(ret['failed'], [('system-properties', 'sp1')])
+        self.assertEqual(ret['changed'], [('system-accounts', 'sa1')])
 
 def tearDown(self):
         pass
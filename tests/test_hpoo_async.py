@@ -0,0 +1,77 @@
+import unittest
+
+from mock import Mock, patch
+
+from oo_client.hpoo import Execution
+from oo_client.hpoo_async import AsyncOOClient
+from oo_client.utils import PollPolicy
+import oo_client.errors as errors
+
+
+class TestAsyncOOClient(unittest.TestCase):
+    @patch('oo_client.hpoo.OORestCaller.get')
+    def setUp(self, mock_get):
+        self.client = AsyncOOClient("https://blah:1234", "aa", "bb",
+                                    workers=2,
+                                    poll_policy=PollPolicy.fixed(0.01))
+        self.oo = self.client.oo
+
+    def execution(self, run_id, flow):
+        return Execution(self.oo, flow, {'executionId': run_id})
+
+    def test_submit(self):
+        self.oo.get_all_flows_in_cp = Mock(return_value={1: 'a/flow'})
+        future = self.client.get_all_flows_in_cp('my-cp')
+        self.assertEqual(future.result(5), {1: 'a/flow'})
+        self.oo.get_all_flows_in_cp.assert_called_with('my-cp')
+        self.oo.get_content_pack_id = Mock(
+            side_effect=errors.NotFound('nope'))
+        with self.assertRaises(errors.NotFound):
+            self.client.get_content_pack_id('my-cp').result(5)
+
+    def test_run_flows(self):
+        executions = {'a/flow': self.execution(1, 'a/flow'),
+                      'b/flow': self.execution(2, 'b/flow')}
+        self.oo.run_flow_async = Mock(
+            side_effect=lambda flow, run_name, inputs: executions[flow])
+        self.oo.get_run_summaries = Mock(return_value={
+            '1': {'status': 'COMPLETED', 'resultStatusType': 'RESOLVED'},
+            '2': {'status': 'COMPLETED', 'resultStatusType': 'ERROR'}})
+        self.oo.get_run_summary = Mock(side_effect=lambda run_id: {
+            '1': {'status': 'COMPLETED', 'resultStatusType': 'RESOLVED'},
+            '2': {'status': 'COMPLETED', 'resultStatusType': 'ERROR'}
+        }[run_id])
+        self.assertFalse(self.client.run_flows(['a/flow', 'b/flow'])
+                         .result(5))
+        self.assertEqual(self.client.run_flow('a/flow').result(5),
+                         'RESOLVED')
+        self.assertEqual(executions['a/flow'].result, 'RESOLVED')
+
+    def test_run_flow_timeout(self):
+        self.oo.run_flow_async = Mock(return_value=self.execution(1, 'a'))
+        self.oo.get_run_summary = Mock(return_value={'status': 'RUNNING'})
+        with self.assertRaises(errors.TimeoutError):
+            self.client.run_flow('a', timeout=0.05).result(5)
+
+    def test_deploy_content_packs(self):
+        self.oo.start_deployment = Mock(return_value=99)
+        result = {'contentPackResponses': {}}
+        self.oo.is_deployment_complete = Mock(side_effect=[False, result])
+        self.oo.deployment_succeeded = Mock(return_value=True)
+        ret = self.client.deploy_content_packs(['/some/dummy.jar'])
+        self.assertTrue(ret.result(5))
+        self.oo.start_deployment.assert_called_with(['/some/dummy.jar'],
+                                                    upload_workers=4,
+                                                    upload_retries=2)
+        self.oo.is_deployment_complete.assert_called_with('99')
+        self.oo.deployment_succeeded.assert_called_with(result)
+
+    def test_deploy_nothing_changed(self):
+        self.oo.undeployed_content_packs = Mock(return_value=[])
+        self.oo.start_deployment = Mock()
+        ret = self.client.deploy_content_packs(['/some/dummy.jar'])
+        self.assertTrue(ret.result(5))
+        self.assertFalse(self.oo.start_deployment.called)
+
+    def tearDown(self):
+        self.client.close()
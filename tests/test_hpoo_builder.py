@@ -0,0 +1,74 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from oo_client.hpoo_builder import JarBuilder
+
+
+class TestJarBuilder(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp_dir, 'cp')
+        self.write('contentpack.properties', 'content.pack.name=my\n')
+        for i in range(20):
+            self.write('Content/Library/flow{0}.xml'.format(i),
+                       '<flow id="{0}"/>\n'.format(i) * 50)
+        self.write('target/old.jar', 'not me')
+        self.write('.svn/entries', 'nor me')
+        self.target = os.path.join(self.source, 'target')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, name, text):
+        path = os.path.join(self.source, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def build(self, name, **kwargs):
+        jar_path = os.path.join(self.target, name)
+        stats = JarBuilder(self.source, **kwargs).build(jar_path)
+        with open(jar_path, 'rb') as jar:
+            return stats, hashlib.sha1(jar.read()).hexdigest()
+
+    def test_contents(self):
+        self.build('a.jar')
+        jar = zipfile.ZipFile(os.path.join(self.target, 'a.jar'))
+        self.assertIsNone(jar.testzip())
+        names = jar.namelist()
+        self.assertEqual(names[:2], ['META-INF/', 'META-INF/MANIFEST.MF'])
+        self.assertIn('Lib/', names)
+        self.assertIn('Content/Library/', names)
+        self.assertEqual(jar.read('Content/Library/flow3.xml'),
+                         '<flow id="3"/>\n' * 50)
+        self.assertFalse([n for n in names if n.startswith(('target',
+                                                             '.svn'))])
+        self.assertFalse(os.path.exists(os.path.join(self.source, 'Lib')))
+
+    def test_incremental(self):
+        stats, first = self.build('a.jar')
+        self.assertEqual(stats, {'reused': 0, 'compressed': 21})
+        stats, second = self.build('b.jar')
+        self.assertEqual(stats, {'reused': 21, 'compressed': 0})
+        self.assertEqual(first, second)
+        self.write('Content/Library/flow3.xml', '<flow id="changed"/>')
+        stats, changed = self.build('c.jar', workers=3)
+        self.assertEqual(stats, {'reused': 20, 'compressed': 1})
+        jar = zipfile.ZipFile(os.path.join(self.target, 'c.jar'))
+        self.assertIsNone(jar.testzip())
+        self.assertEqual(jar.read('Content/Library/flow3.xml'),
+                         '<flow id="changed"/>')
+        # the same as building from scratch
+        os.remove(os.path.join(self.target, 'build-manifest.json'))
+        self.assertEqual(self.build('d.jar')[1], changed)
+
+    def test_previous_jar_missing(self):
+        self.build('a.jar')
+        os.remove(os.path.join(self.target, 'a.jar'))
+        stats, _ = self.build('b.jar')
+        self.assertEqual(stats, {'reused': 0, 'compressed': 21})
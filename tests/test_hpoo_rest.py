@@ -1,17 +1,35 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
 import unittest
 
 from mock import Mock
 
+from oo_client.cache import ResponseCache
 from oo_client.hpoo import OORestCaller
+from oo_client.multipart import MultipartFile
 
 import oo_client.errors as errors
 
 import requests
 
+JSON = {'content-type': 'application/json'}
+
+
+def handshake(token=None):
+    response = Mock()
+    response.status_code = 200
+    response.text = ''
+    response.headers = {'X-CSRF-TOKEN': token} if token else {}
+    return response
+
 
 class TestHPOORest(unittest.TestCase):
     def setUp(self):
         self.mock_reqs = Mock()
+        self.session = requests.Session
         requests.Session = self.mock_reqs
 
     def test_post(self):
@@ -19,7 +37,8 @@ class TestHPOORest(unittest.TestCase):
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.text = '{"aaa": "aaa"}'
-        mock_config = {'post.return_value': mock_response}
+        mock_config = {'post.return_value': mock_response,
+                       'get.return_value': handshake()}
         mock_session.configure_mock(**mock_config)
         self.mock_reqs.return_value = mock_session
         rest = OORestCaller("https://blah:1234", "aa", "bb")
@@ -27,7 +46,7 @@ class TestHPOORest(unittest.TestCase):
         assert rest.session.verify is True
         ret = rest.post('some-path')
         url = "https://blah:1234/oo/rest/v1/some-path"
-        mock_session.post.assert_called_with(url, None)
+        mock_session.post.assert_called_with(url, None, headers=JSON)
         self.assertEquals(ret, {'aaa': 'aaa'})
 
     def test_post_file(self):
@@ -35,7 +54,8 @@ class TestHPOORest(unittest.TestCase):
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.text = '{"aaa": "aaa"}'
-        mock_config = {'post.return_value': mock_response}
+        mock_config = {'post.return_value': mock_response,
+                       'get.return_value': handshake()}
         mock_session.configure_mock(**mock_config)
         self.mock_reqs.return_value = mock_session
         rest = OORestCaller("https://blah:1234", "aa", "bb")
@@ -45,15 +65,43 @@ class TestHPOORest(unittest.TestCase):
         url = "https://blah:1234/oo/rest/v1/some-path"
         mock_session.post.assert_called_with(url,
                                              files=['some_file',
-                                                    'some_other_file'])
+                                                    'some_other_file'],
+                                             headers={})
         self.assertEquals(ret, {'aaa': 'aaa'})
 
+    def test_post_file_streaming(self):
+        mock_session = Mock()
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.text = '{"aaa": "aaa"}'
+        mock_config = {'post.return_value': mock_response,
+                       'get.return_value': handshake()}
+        mock_session.configure_mock(**mock_config)
+        self.mock_reqs.return_value = mock_session
+        rest = OORestCaller("https://blah:1234", "aa", "bb")
+        tmp = tempfile.NamedTemporaryFile(suffix='.jar')
+        tmp.write(b'content')
+        tmp.flush()
+        ret = rest.post_file('some-path', tmp.name)
+        url = "https://blah:1234/oo/rest/v1/some-path"
+        args, kwargs = mock_session.post.call_args
+        self.assertEqual(args, (url,))
+        self.assertIsInstance(kwargs['data'], MultipartFile)
+        self.assertEqual(kwargs['headers'],
+                         {'content-type': kwargs['data'].content_type})
+        self.assertEquals(ret, {'aaa': 'aaa'})
+        mock_response.status_code = 500
+        with self.assertRaises(errors.HTTPNon200):
+            rest.post_file('some-path', tmp.name)
+        tmp.close()
+
     def test_post_json(self):
         mock_session = Mock()
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.text = '{"aaa": "aaa"}'
-        mock_config = {'post.return_value': mock_response}
+        mock_config = {'post.return_value': mock_response,
+                       'get.return_value': handshake()}
         mock_session.configure_mock(**mock_config)
         self.mock_reqs.return_value = mock_session
         rest = OORestCaller("https://blah:1234", "aa", "bb")
@@ -62,7 +110,8 @@ class TestHPOORest(unittest.TestCase):
         ret = rest.post('some-path', data={'some': 'data'})
         url = "https://blah:1234/oo/rest/v1/some-path"
         mock_session.post.assert_called_with(url,
-                                             '{"some": "data"}')
+                                             '{"some": "data"}',
+                                             headers=JSON)
         self.assertEquals(ret, {'aaa': 'aaa'})
 
     def test_post_error(self):
@@ -70,7 +119,8 @@ class TestHPOORest(unittest.TestCase):
         mock_response = Mock()
         mock_response.status_code = 400
         mock_response.text = '{"aaa": "aaa"}'
-        mock_config = {'post.return_value': mock_response}
+        mock_config = {'post.return_value': mock_response,
+                       'get.return_value': handshake()}
         mock_session.configure_mock(**mock_config)
         self.mock_reqs.return_value = mock_session
         rest = OORestCaller("https://blah:1234", "aa", "bb")
@@ -84,7 +134,8 @@ class TestHPOORest(unittest.TestCase):
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.text = '{"aaa": "aaa"}'
-        mock_config = {'put.return_value': mock_response}
+        mock_config = {'put.return_value': mock_response,
+                       'get.return_value': handshake()}
         mock_session.configure_mock(**mock_config)
         self.mock_reqs.return_value = mock_session
         rest = OORestCaller("https://blah:1234", "aa", "bb")
@@ -93,14 +144,15 @@ class TestHPOORest(unittest.TestCase):
         mock_data = Mock()
         rest.put('some-path', mock_data)
         url = "https://blah:1234/oo/rest/v1/some-path"
-        mock_session.put.assert_called_with(url, mock_data)
+        mock_session.put.assert_called_with(url, mock_data, headers=JSON)
 
     def test_put_error(self):
         mock_session = Mock()
         mock_response = Mock()
         mock_response.status_code = 400
         mock_response.text = '{"aaa": "aaa"}'
-        mock_config = {'put.return_value': mock_response}
+        mock_config = {'put.return_value': mock_response,
+                       'get.return_value': handshake()}
         mock_session.configure_mock(**mock_config)
         self.mock_reqs.return_value = mock_session
         rest = OORestCaller("https://blah:1234", "aa", "bb")
@@ -122,7 +174,233 @@ class TestHPOORest(unittest.TestCase):
         ret = rest.get('some-path')
         self.assertEquals(ret, {'aaa': 'aaa'})
         url = "https://blah:1234/oo/rest/v1/some-path"
-        mock_session.get.assert_called_with(url, params={})
+        mock_session.get.assert_called_with(url, params={}, headers={},
+                                            stream=False)
+
+    def test_iter_get(self):
+        mock_session = Mock()
+        mock_response = Mock(status_code=200, headers={})
+        mock_response.iter_content.return_value = iter(
+            [b'[{"id": "1"},', b' {"id"', b': "2"}]'])
+        mock_session.configure_mock(**{'get.return_value': mock_response})
+        self.mock_reqs.return_value = mock_session
+        rest = OORestCaller("https://blah:1234", "aa", "bb")
+        items = rest.iter_get('config-items')
+        self.assertEqual(next(items), {'id': '1'})
+        self.assertEqual(list(items), [{'id': '2'}])
+        url = "https://blah:1234/oo/rest/v1/config-items"
+        mock_session.get.assert_called_with(url, params={}, headers={},
+                                            stream=True)
+        self.assertTrue(mock_response.close.called)
+
+    def test_iter_get_cached(self):
+        mock_session = Mock()
+        tree = Mock(status_code=200, headers={'ETag': '"v1"'}, encoding=None)
+        tree.iter_content.return_value = iter([b'[{"id": "1"},',
+                                               b' {"id": "2"}]'])
+        mock_session.configure_mock(**{'get.return_value': tree})
+        self.mock_reqs.return_value = mock_session
+        cache = ResponseCache(ttl=60)
+        rest = OORestCaller("https://blah:1234", "aa", "bb", cache=cache)
+        items = rest.iter_get('flows/tree/level', path='Library')
+        self.assertEqual(next(items), {'id': '1'})
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(list(items), [{'id': '2'}])
+        url = "https://blah:1234/oo/rest/v1/flows/tree/level"
+        mock_session.get.assert_called_with(url, params={'path': 'Library'},
+                                            headers={}, stream=True)
+        self.assertEqual(list(rest.iter_get('flows/tree/level',
+                                            path='Library')),
+                         [{'id': '1'}, {'id': '2'}])
+        self.assertEqual(mock_session.get.call_count, 1)
+        # stale, central says it hasn't changed
+        cache.entries['flows/tree/level?path=Library'].stored -= 60
+        mock_session.get.return_value = Mock(status_code=304, headers={})
+        self.assertEqual(list(rest.iter_get('flows/tree/level',
+                                            path='Library')),
+                         [{'id': '1'}, {'id': '2'}])
+        mock_session.get.assert_called_with(url, params={'path': 'Library'},
+                                            headers={'If-None-Match': '"v1"'},
+                                            stream=True)
+        self.assertEqual(cache.stats()['revalidated'], 1)
+
+    def test_get_cached(self):
+        mock_session = Mock()
+        tree = Mock(status_code=200, text='[{"id": "1"}]',
+                    headers={'ETag': '"v1"'})
+        not_modified = Mock(status_code=304, text='', headers={})
+        mock_session.configure_mock(**{'get.return_value': tree,
+                                       'put.return_value': handshake(),
+                                       'post.return_value': handshake()})
+        self.mock_reqs.return_value = mock_session
+        cache = ResponseCache(ttl=60)
+        rest = OORestCaller("https://blah:1234", "aa", "bb", cache=cache)
+        self.assertEqual(rest.get('flows/tree/level', path='Library'),
+                         [{'id': '1'}])
+        self.assertEqual(rest.get('flows/tree/level', path='Library'),
+                         [{'id': '1'}])
+        self.assertEqual(mock_session.get.call_count, 1)
+        # never cached
+        rest.get('executions/1/summary')
+        rest.get('executions/1/summary')
+        self.assertEqual(mock_session.get.call_count, 3)
+        # stale, central says it hasn't changed
+        cache.entries['flows/tree/level?path=Library'].stored -= 60
+        mock_session.get.return_value = not_modified
+        self.assertEqual(rest.get('flows/tree/level', path='Library'),
+                         [{'id': '1'}])
+        url = "https://blah:1234/oo/rest/v1/flows/tree/level"
+        mock_session.get.assert_called_with(url, params={'path': 'Library'},
+                                            headers={'If-None-Match': '"v1"'},
+                                            stream=False)
+        self.assertEqual(cache.stats()['revalidated'], 1)
+        # a deployment can change the tree
+        mock_session.get.return_value = tree
+        rest.post('deployments')
+        self.assertEqual(len(cache), 0)
+        rest.get('flows/tree/level', path='Library')
+        self.assertEqual(cache.stats()['misses'], 2)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_csrf_token(self):
+        mock_session = Mock()
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.text = '{"aaa": "aaa"}'
+        mock_response.headers = {'X-CSRF-TOKEN': 'tok1'}
+        mock_config = {'get.return_value': mock_response,
+                       'post.return_value': mock_response}
+        mock_session.configure_mock(**mock_config)
+        self.mock_reqs.return_value = mock_session
+        rest = OORestCaller("https://blah:1234", "aa", "bb")
+        rest.refresh_csrf()
+        self.assertEqual(mock_session.get.call_count, 2)
+        self.assertEqual(rest.csrf_token, 'tok1')
+        rest.post('some-path', {'some': 'data'})
+        url = "https://blah:1234/oo/rest/v1/some-path"
+        mock_session.post.assert_called_with(url, '{"some": "data"}',
+                                             headers={'content-type':
+                                                      'application/json',
+                                                      'X-CSRF-TOKEN': 'tok1'})
+        # the shared session headers are never touched
+        self.assertFalse(mock_session.headers.pop.called)
+        self.assertEqual(mock_session.headers.update.call_count, 1)
+
+    def test_lazy_csrf(self):
+        mock_session = Mock()
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.text = '{"aaa": "aaa"}'
+        mock_response.headers = {}
+        mock_config = {'post.return_value': mock_response,
+                       'get.return_value': handshake('tok1')}
+        mock_session.configure_mock(**mock_config)
+        self.mock_reqs.return_value = mock_session
+        rest = OORestCaller("https://blah:1234", "aa", "bb")
+        self.assertFalse(mock_session.get.called)
+        rest.post('some-path')
+        rest.post('some-path')
+        # one handshake before the first post only
+        self.assertEqual(mock_session.get.call_count, 2)
+        self.assertTrue(rest.csrf_ready)
+
+    def test_session_cache(self):
+        tmp_dir = tempfile.mkdtemp()
+        cache_path = os.path.join(tmp_dir, 'session.json')
+        mock_session = Mock()
+        mock_session.cookies = requests.cookies.RequestsCookieJar()
+        mock_session.cookies.set('JSESSIONID', 'abc')
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.text = ''
+        mock_config = {'post.return_value': mock_response,
+                       'get.return_value': handshake('tok1')}
+        mock_session.configure_mock(**mock_config)
+        self.mock_reqs.return_value = mock_session
+        try:
+            rest = OORestCaller("https://blah:1234", "aa", "bb",
+                                session_cache=cache_path)
+            rest.post('some-path')
+            self.assertEqual(os.stat(cache_path).st_mode & 0o777, 0o600)
+            mock_session.get.reset_mock()
+            mock_session.cookies = requests.cookies.RequestsCookieJar()
+            cached = OORestCaller("https://blah:1234", "aa", "bb",
+                                  session_cache=cache_path)
+            self.assertEqual(cached.csrf_token, 'tok1')
+            self.assertEqual(mock_session.cookies.get('JSESSIONID'), 'abc')
+            cached.post('some-path')
+            self.assertFalse(mock_session.get.called)
+            # an expired session logs in again and retries once
+            rejected = Mock()
+            rejected.status_code = 403
+            rejected.text = ''
+            mock_session.post.side_effect = [rejected, mock_response]
+            mock_session.get.return_value = handshake('tok2')
+            expired = OORestCaller("https://blah:1234", "aa", "bb",
+                                   session_cache=cache_path)
+            expired.post('some-path')
+            self.assertEqual(mock_session.get.call_count, 2)
+            url = "https://blah:1234/oo/rest/v1/some-path"
+            mock_session.post.assert_called_with(
+                url, None, headers={'content-type': 'application/json',
+                                    'X-CSRF-TOKEN': 'tok2'})
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_refresh_csrf_once(self):
+        mock_session = Mock()
+        self.mock_reqs.return_value = mock_session
+        rest = OORestCaller("https://blah:1234", "aa", "bb")
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow_get(url_path):
+            calls.append(url_path)
+            started.set()
+            release.wait(5)
+            rest.csrf_token = 'tok{0}'.format(len(calls))
+        rest.get = slow_get
+        threads = [threading.Thread(target=rest.refresh_csrf)
+                   for _ in range(3)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        # give the others time to queue up on the lock
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        # only the first thread asks central, the rest reuse its token
+        self.assertEqual(calls, ['version', 'version'])
+        self.assertEqual(rest.csrf_token, 'tok2')
+
+    def test_refresh_csrf_after_get(self):
+        mock_session = Mock()
+        self.mock_reqs.return_value = mock_session
+        rest = OORestCaller("https://blah:1234", "aa", "bb")
+        calls = []
+        rest.get = calls.append
+        rest._csrf_lock.acquire()
+        thread = threading.Thread(target=rest.refresh_csrf)
+        thread.start()
+        time.sleep(0.1)
+        # any GET sets the token, that isn't a refresh
+        rest.csrf_token = 'tok1'
+        rest._csrf_lock.release()
+        thread.join(5)
+        self.assertEqual(calls, ['version', 'version'])
+        self.assertTrue(rest.csrf_ready)
+
+    def test_pool_size(self):
+        mock_session = Mock()
+        self.mock_reqs.return_value = mock_session
+        OORestCaller("https://blah:1234", "aa", "bb", pool_size=32)
+        adapter = mock_session.mount.call_args[0][1]
+        self.assertEqual(adapter._pool_maxsize, 32)
+        mock_session.mount.assert_any_call('http://', adapter)
+        mock_session.mount.assert_any_call('https://', adapter)
 
     def test_get_error(self):
         mock_session = Mock()
@@ -137,4 +415,4 @@ class TestHPOORest(unittest.TestCase):
             rest.get('some-path')
 
     def tearDown(self):
-        pass
+        requests.Session = self.session
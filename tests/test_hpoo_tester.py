@@ -1,7 +1,13 @@
+import os
+import shutil
+import tempfile
 import unittest
+import zipfile
+from StringIO import StringIO
 
 from mock import Mock, patch
 
+from oo_client.durations import DurationHistory
 from oo_client.hpoo_tester import IntegrationTester
 import oo_client.errors as errors
 
@@ -31,11 +37,109 @@ class TestHPOOTester(unittest.TestCase):
                                         'some/path/to/flow'],
                                        'some')
         mock_client.run_flows.assert_called_with(['some/path/to/flow'],
-                                                 timeout=300)
+                                                 timeout=300, parallel=1,
+                                                 callback=it.report.add,
+                                                 fail_fast=False)
         self.assertTrue(ret)
         with self.assertRaises(errors.NoFlowsFound):
             mock_filter.return_value = []
             ret = it.run_tests('my-cp')
 
+    @patch('oo_client.hpoo_tester.IntegrationTester.filter_flows')
+    def test_run_tests_parallel(self, mock_filter):
+        mock_client = Mock()
+        it = IntegrationTester(mock_client, 'some')
+        mock_filter.return_value = ['some/path/to/flow']
+        mock_client.get_all_flows_in_cp.return_value = {123: 'some/path/to/flow'}
+        mock_client.run_flows.return_value = False
+        ret = it.run_tests('my-cp', timeout=60, parallel=4)
+        mock_client.run_flows.assert_called_with(['some/path/to/flow'],
+                                                 timeout=60, parallel=4,
+                                                 callback=it.report.add,
+                                                 fail_fast=False)
+        self.assertFalse(ret)
+
+    def test_get_flow_uuid_from_xml(self):
+        it = IntegrationTester(Mock(), 'some')
+        xml = StringIO('<?xml version="1.0" encoding="UTF-8"?>'
+                       '<flow id="a1b2" xmlns="http://example.com/oo">'
+                       '<name>test_flow</name></flow>')
+        self.assertEqual(it.get_flow_uuid_from_xml(xml), 'a1b2')
+        xml = StringIO('<flow><name>test_flow</name><uuid> c3d4 </uuid>'
+                       '</flow>')
+        self.assertEqual(it.get_flow_uuid_from_xml(xml), 'c3d4')
+        xml = StringIO('<operation id="e5f6"><name>op</name></operation>')
+        self.assertIsNone(it.get_flow_uuid_from_xml(xml))
+
+    def test_run_tests_from_jar(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            jar_path = os.path.join(tmp_dir, 'my-cp.jar')
+            jar = zipfile.ZipFile(jar_path, 'w')
+            jar.writestr('contentpack.properties', 'content.pack.name=my')
+            jar.writestr('Content/Library/tests/test_one.xml',
+                         '<flow id="uuid1"><name>test_one</name></flow>')
+            jar.writestr('Content/Library/tests/an_op.xml',
+                         '<operation id="uuid2"><name>an_op</name>'
+                         '</operation>')
+            jar.writestr('Content/Library/flow.xml',
+                         '<flow id="uuid3"><name>flow</name></flow>')
+            jar.close()
+            mock_client = Mock()
+            mock_client.run_flows.return_value = True
+            it = IntegrationTester(mock_client, 'tests/test_')
+            self.assertEqual(it.get_flows_from_jar(jar_path),
+                             {'uuid1': 'Library/tests/test_one.xml',
+                              'uuid3': 'Library/flow.xml'})
+            ret = it.run_tests('my-cp', jar=jar_path)
+            self.assertTrue(ret)
+            self.assertFalse(mock_client.get_all_flows_in_cp.called)
+            mock_client.flows.add.assert_any_call('Library/tests/'
+                                                  'test_one.xml', 'uuid1',
+                                                  'my-cp')
+            mock_client.run_flows.assert_called_with(['Library/tests/'
+                                                      'test_one.xml'],
+                                                     timeout=300, parallel=1,
+                                                     callback=it.report.add,
+                                                     fail_fast=False)
+            offline = IntegrationTester(None, 'tests/test_')
+            self.assertEqual(offline.find_tests('my-cp', jar=jar_path),
+                             ['Library/tests/test_one.xml'])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_shard(self):
+        it = IntegrationTester(Mock(), 'test_')
+        flows = ['f{0}'.format(i) for i in range(7)]
+        shards = [it.shard(list(reversed(flows)), index, 3)
+                  for index in (1, 2, 3)]
+        self.assertEqual(shards, [['f0', 'f3', 'f6'], ['f1', 'f4'],
+                                  ['f2', 'f5']])
+        self.assertRaises(ValueError, it.shard, flows, 4, 3)
+
+    def test_shard_balanced(self):
+        history = DurationHistory()
+        for flow, seconds in (('a', 100), ('b', 60), ('c', 50), ('d', 10),
+                              ('e', 5)):
+            history.add(flow, seconds)
+        it = IntegrationTester(Mock(), 'test_', history=history)
+        flows = ['e', 'd', 'new', 'c', 'b', 'a']
+        # new counts as 100s like the longest known flow
+        self.assertEqual([it.shard(flows, index, 2) for index in (1, 2)],
+                         [['a', 'b', 'e'], ['new', 'c', 'd']])
+
+    @patch('oo_client.hpoo_tester.IntegrationTester.find_tests')
+    def test_run_tests_shard(self, mock_find):
+        mock_client = Mock()
+        mock_client.run_flows.return_value = True
+        mock_find.return_value = ['b', 'c', 'a']
+        it = IntegrationTester(mock_client, 'test_')
+        self.assertTrue(it.run_tests('my-cp', shard=(2, 2)))
+        mock_client.run_flows.assert_called_with(['b'], timeout=300,
+                                                 parallel=1,
+                                                 callback=it.report.add,
+                                                 fail_fast=False)
+        self.assertEqual(it.report.shard, (2, 2))
+
     def tearDown(self):
         pass
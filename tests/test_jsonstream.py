@@ -0,0 +1,64 @@
+import decimal
+import json
+import unittest
+
+from mock import Mock, patch
+
+from oo_client.jsonstream import _ChunkReader, _iter_array, iter_array, loads
+
+
+def chunked(doc, size):
+    raw = json.dumps(doc).encode('utf-8')
+    return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+
+class TestJsonStream(unittest.TestCase):
+    def test_loads(self):
+        self.assertEqual(loads('{"a": [1, 2]}'), {'a': [1, 2]})
+
+    def test_iter_array(self):
+        doc = [{'type': 'FLOW', 'path': u'Library/caf\u00e9', 'id': '1'},
+               'text', 12345678901234, 1.5e10, -2, True, None, [], {}]
+        for size in (1, 2, 3, 7, 1000):
+            self.assertEqual(list(_iter_array(chunked(doc, size))), doc)
+        self.assertEqual(list(_iter_array([b' [ ', b'] '])), [])
+
+    def test_floats(self):
+        doc = [{'name': 'ratio', 'value': 0.25, 'count': 3}]
+        items = list(_iter_array(chunked(doc, 4)))
+        self.assertEqual(items, doc)
+        self.assertIsInstance(items[0]['value'], float)
+        # ijson gives Decimal unless asked for floats, which 3.1 added
+        new_ijson = Mock()
+        new_ijson.items.return_value = iter(doc)
+        with patch('oo_client.jsonstream.ijson', new_ijson):
+            self.assertEqual(list(iter_array(chunked(doc, 4))), doc)
+        self.assertEqual(new_ijson.items.call_args[1], {'use_float': True})
+
+        def old_items(reader, prefix):
+            return iter([{'name': 'ratio', 'value': decimal.Decimal('0.25'),
+                          'count': 3, 'more': [decimal.Decimal('1.5')]}])
+        with patch('oo_client.jsonstream.ijson', Mock(items=old_items)):
+            items = list(iter_array(chunked(doc, 4)))
+        self.assertEqual(items, [dict(doc[0], more=[1.5])])
+        self.assertIsInstance(items[0]['value'], float)
+        self.assertIsInstance(items[0]['more'][0], float)
+
+    def test_iter_array_lazy(self):
+        items = _iter_array(chunked([1, 2, 3], 1) + [b'garbage'])
+        self.assertEqual(next(items), 1)
+
+    def test_long_value(self):
+        doc = ['x' * 100000, 'y']
+        self.assertEqual(list(_iter_array(chunked(doc, 100))), doc)
+
+    def test_bad_documents(self):
+        for bad in (b'{"a": 1}', b'[1, 2', b'[1 2]', b'["abc'):
+            with self.assertRaises(ValueError):
+                list(_iter_array([bad]))
+
+    def test_chunk_reader(self):
+        reader = _ChunkReader([b'ab', b'cde', b'f'])
+        self.assertEqual(reader.read(3), b'abc')
+        self.assertEqual(reader.read(), b'def')
+        self.assertEqual(reader.read(1), b'')
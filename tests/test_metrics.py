@@ -0,0 +1,144 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from mock import Mock, patch
+
+from oo_client.hpoo import OOClient
+from oo_client.metrics import Metrics, endpoint
+from oo_client.simulator import CentralSimulator
+
+import oo_client.cli as cli
+import oo_client.errors as errors
+import oo_client.utils as utils
+
+
+class TestMetrics(unittest.TestCase):
+    def test_endpoint(self):
+        self.assertEqual(endpoint('executions/100000001,100000002/summary'),
+                         'executions/{id}/summary')
+        self.assertEqual(endpoint('deployments/123/files'),
+                         'deployments/{id}/files')
+        self.assertEqual(endpoint('content-packs/5a1c7b6e-0f0c-4d3c-9a9a-'
+                                  '1234567890ab/content-tree'),
+                         'content-packs/{id}/content-tree')
+        self.assertEqual(endpoint('content-packs/my_cp'),
+                         'content-packs/{name}')
+        self.assertEqual(endpoint('config-items/system-properties/a/b'),
+                         'config-items/system-properties/{path}')
+        self.assertEqual(endpoint('config-items/system-properties'),
+                         'config-items/system-properties')
+        self.assertEqual(endpoint('flows/tree/level?path=Library'),
+                         'flows/tree/level')
+
+    def test_request(self):
+        hook = Mock()
+        metrics = Metrics(hooks=[hook])
+        metrics.request('GET', 'executions/1/summary', 200, 0.003, 0, 100)
+        metrics.request('GET', 'executions/2/summary', 200, 0.2, 0, 100)
+        metrics.request('GET', 'executions/3/summary', 500, 100, 0, 10)
+        metrics.request('POST', 'executions', 'error', 0.01, 50)
+        metrics.received('GET', 'executions/3/summary', 5)
+        metrics.retry('deployments/1/files')
+        metrics.poll('runs', 3)
+        metrics.poll('runs')
+        hook.assert_called_with('POST', 'executions', 'error', 0.01, 50, 0)
+        data = metrics.to_dict()
+        summary = data['requests']['GET executions/{id}/summary']
+        self.assertEqual(summary['count'], 3)
+        self.assertEqual(summary['statuses'], {'200': 2, '500': 1})
+        self.assertEqual(summary['bytes_received'], 215)
+        self.assertEqual(summary['max_seconds'], 100)
+        self.assertEqual(summary['buckets']['0.005'], 1)
+        self.assertEqual(summary['buckets']['0.25'], 2)
+        self.assertEqual(summary['buckets']['60.0'], 2)
+        self.assertEqual(summary['buckets']['+Inf'], 3)
+        self.assertEqual(data['requests']['POST executions']['bytes_sent'],
+                         50)
+        self.assertEqual(data['retries'], {'deployments/{id}/files': 1})
+        self.assertEqual(data['polls'], {'runs': 4})
+        self.assertEqual(data['total']['requests'], 4)
+        metrics.clear()
+        self.assertEqual(metrics.to_dict()['requests'], {})
+
+    def test_prometheus(self):
+        metrics = Metrics()
+        metrics.request('GET', 'version', 200, 0.02, 0, 30)
+        metrics.poll('deployments')
+        text = metrics.to_prometheus()
+        self.assertIn('# TYPE oo_client_request_seconds histogram', text)
+        self.assertIn('oo_client_request_seconds_bucket{method="GET",'
+                      'endpoint="version",le="0.01"} 0\n', text)
+        self.assertIn('oo_client_request_seconds_bucket{method="GET",'
+                      'endpoint="version",le="0.025"} 1\n', text)
+        self.assertIn('oo_client_request_seconds_count{method="GET",'
+                      'endpoint="version"} 1\n', text)
+        self.assertIn('oo_client_responses_total{method="GET",'
+                      'endpoint="version",status="200"} 1\n', text)
+        self.assertIn('oo_client_bytes_received_total{method="GET",'
+                      'endpoint="version"} 30\n', text)
+        self.assertIn('oo_client_polls_total{kind="deployments"} 1\n', text)
+
+
+class TestClientMetrics(unittest.TestCase):
+    def setUp(self):
+        self.central = CentralSimulator(flows=10, run_duration=0.05).start()
+        self.metrics = Metrics()
+        self.client = OOClient(self.central.url, 'admin', 'admin',
+                               poll_policy=utils.PollPolicy(0.01, 1, 0.01),
+                               flow_cache=False, deploy_record=False,
+                               metrics=self.metrics)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.central.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_run_flows(self):
+        self.assertTrue(self.client.run_flows(
+            ['Library/cp0/folder0/flow0.xml',
+             'Library/cp0/folder0/flow1.xml'], parallel=2))
+        data = self.metrics.to_dict()
+        self.assertEqual(data['requests']['POST executions']['statuses'],
+                         {'201': 2})
+        self.assertGreater(data['requests']['POST executions']['bytes_sent'],
+                           0)
+        self.assertEqual(data['requests']['GET version']['count'], 2)
+        polls = data['requests']['GET executions/{id}/summary']['count']
+        self.assertGreater(polls, 0)
+        self.assertGreaterEqual(data['polls']['runs'], polls)
+        self.assertEqual(data['total']['requests'],
+                         self.central.stats['requests'])
+
+    def test_streamed(self):
+        self.assertEqual(len(list(self.client.iter_configuration_items())),
+                         10)
+        data = self.metrics.to_dict()['requests']['GET config-items']
+        self.assertEqual(data['bytes_received'],
+                         self.central.stats['bytes_out'])
+
+    @patch('logging.basicConfig')
+    def test_cli(self, mock_logging):
+        path = os.path.join(self.tmp_dir, 'metrics.prom')
+        with patch('sys.stdout', StringIO()), \
+                self.assertRaises(SystemExit) as e:
+            cli.main(['-a', 'get_config', '--output', 'jsonl', '-c',
+                      self.central.url, '-u', 'admin', '-p', 'admin',
+                      '--metrics-file', path, '--metrics-format',
+                      'prometheus'])
+        self.assertEqual(e.exception.code, 0)
+        with open(path) as f:
+            self.assertIn('oo_client_responses_total{method="GET",'
+                          'endpoint="config-items",status="200"} 1', f.read())
+        json_path = os.path.join(self.tmp_dir, 'metrics.json')
+        # written when the command fails too
+        with self.assertRaises(errors.NotFound):
+            cli.main(['-a', 'run', '-f', 'Library/cp0/folder0/missing.xml',
+                      '-c', self.central.url, '-u', 'admin', '-p', 'admin',
+                      '--metrics-file', json_path])
+        with open(json_path) as f:
+            self.assertEqual(json.load(f)['requests'][
+                'GET flows/tree/level']['count'], 1)
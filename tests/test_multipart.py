@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock
+
+from oo_client.multipart import MultipartFile, UploadProgress
+
+
+class TestMultipart(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'my-cp.jar')
+        with open(self.path, 'wb') as jar:
+            jar.write(b'x' * 2500)
+
+    def test_read_in_blocks(self):
+        progress = Mock()
+        body = MultipartFile('file', self.path, chunk_size=1000,
+                             progress=progress)
+        total = len(body)
+        data = b''
+        while True:
+            block = body.read(300)
+            if not block:
+                break
+            self.assertTrue(len(block) <= 300)
+            data += block
+        self.assertEqual(len(data), total)
+        self.assertEqual(body.sent, total)
+        boundary = body.content_type.split('boundary=')[1]
+        self.assertTrue(data.startswith(b'--' + boundary.encode('utf-8')))
+        self.assertIn(b'name="file"; filename="my-cp.jar"', data)
+        self.assertIn(b'\r\n\r\n' + b'x' * 2500 + b'\r\n', data)
+        self.assertTrue(data.endswith(b'--' + boundary.encode('utf-8') +
+                                      b'--\r\n'))
+        sent, reported_total, elapsed = progress.call_args[0]
+        self.assertEqual((sent, reported_total), (total, total))
+
+    def test_read_all(self):
+        body = MultipartFile('file', self.path)
+        total = len(body)
+        self.assertEqual(len(body.read()), total)
+        self.assertEqual(body.read(), b'')
+
+    def test_upload_progress(self):
+        log = Mock()
+        progress = UploadProgress('my-cp.jar', step=25, log=log)
+        progress(10, 100, 1.0)
+        self.assertFalse(log.info.called)
+        progress(30, 100, 1.0)
+        progress(40, 100, 1.0)
+        self.assertEqual(log.info.call_count, 1)
+        progress(100, 100, 2.0)
+        self.assertEqual(log.info.call_count, 2)
+
+    def test_combined_upload_progress(self):
+        log = Mock()
+        progress = UploadProgress('2 content pack(s)', step=60, log=log)
+        first = progress.for_file('a.jar', 100)
+        second = progress.for_file('b.jar', 100)
+        first(100, 100, 1.0)
+        self.assertFalse(log.info.called)
+        second(30, 100, 1.0)
+        self.assertEqual(log.info.call_count, 1)
+        self.assertIn('65%', log.info.call_args[0][0])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
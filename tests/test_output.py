@@ -0,0 +1,45 @@
+import json
+import unittest
+from StringIO import StringIO
+
+import oo_client.output as output
+
+ITEMS = [{'type': 'system-properties', 'name': 'db_host', 'value': 'db1'},
+         {'type': 'system-properties', 'name': 'web_host', 'value': 'w1'},
+         {'type': 'domain-terms', 'name': 'db_name', 'value': 'x'}]
+
+
+class TestOutput(unittest.TestCase):
+    def test_filter(self):
+        self.assertEqual(list(output.filter_items(ITEMS, 'db_*')),
+                         [ITEMS[0], ITEMS[2]])
+        self.assertEqual(list(output.filter_items(ITEMS,
+                                                  'system-properties/*')),
+                         ITEMS[:2])
+        self.assertEqual(output.filter_items(ITEMS, None), ITEMS)
+
+    def test_pretty(self):
+        stream = StringIO()
+        self.assertEqual(output.write(iter(ITEMS), stream=stream), 3)
+        self.assertEqual(stream.getvalue(),
+                         json.dumps(ITEMS, indent=4) + '\n')
+
+    def test_json(self):
+        stream = StringIO()
+        self.assertEqual(output.write(iter(ITEMS), 'json', stream), 3)
+        self.assertNotIn(' ', stream.getvalue())
+        self.assertEqual(json.loads(stream.getvalue()), ITEMS)
+        stream = StringIO()
+        self.assertEqual(output.write(iter([]), 'json', stream), 0)
+        self.assertEqual(stream.getvalue(), '[]\n')
+
+    def test_jsonl(self):
+        stream = StringIO()
+        self.assertEqual(output.write(iter(ITEMS), 'jsonl', stream), 3)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], ITEMS)
+
+    def test_single_item(self):
+        stream = StringIO()
+        self.assertEqual(output.write(ITEMS[0], 'jsonl', stream), 1)
+        self.assertEqual(json.loads(stream.getvalue()), ITEMS[0])
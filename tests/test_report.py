@@ -0,0 +1,211 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+from mock import Mock, patch
+
+from oo_client.durations import DurationHistory
+from oo_client.hpoo import Execution, OOClient
+from oo_client.hpoo_tester import IntegrationTester
+from oo_client.report import TestReport, merge, misassigned_flows, \
+    missing_shards, outcome
+from oo_client.simulator import CentralSimulator
+
+import oo_client.cli as cli
+import oo_client.errors as errors
+import oo_client.utils as utils
+
+
+def timings(flow, status='COMPLETED', result_type='RESOLVED', duration=1.0):
+    return {'flow': flow, 'run_id': '1', 'status': status,
+            'result_type': result_type, 'duration': duration, 'wall': 1.5,
+            'polls': 2, 'link': 'http://central/run/1'}
+
+
+class TestTestReport(unittest.TestCase):
+    def setUp(self):
+        self.report = TestReport('my-cp', ['Library/tests/test_a.xml',
+                                           'Library/tests/test_b.xml',
+                                           'Library/tests/test_c.xml'])
+        self.report.add(timings('Library/tests/test_a.xml', duration=3.0))
+        self.report.add(timings('Library/tests/test_b.xml',
+                                result_type='ERROR'))
+        self.report.finish()
+
+    def test_outcome(self):
+        self.assertEqual(outcome(timings('a')), 'passed')
+        self.assertEqual(outcome(timings('a', result_type='DIAGNOSED')),
+                         'passed')
+        self.assertEqual(outcome(timings('a', result_type='ERROR')),
+                         'failed')
+        self.assertEqual(outcome(timings('a', status='CANCELED',
+                                         result_type=None)), 'error')
+        self.assertEqual(outcome({'flow': 'a', 'status': None}), 'error')
+
+    def test_summary(self):
+        self.assertEqual(self.report.summary(), {'tests': 3, 'passed': 1,
+                                                 'failed': 1, 'error': 1})
+        self.assertEqual([test['flow'] for test in self.report.slowest(1)],
+                         ['Library/tests/test_a.xml'])
+        tests = self.report.to_dict()['tests']
+        self.assertEqual([test['outcome'] for test in tests],
+                         ['passed', 'failed', 'error'])
+
+    def test_add_execution(self):
+        execution = Execution(Mock(), 'Library/other.xml',
+                              {'executionId': 7}, submitted=1000)
+        execution.oo.rest.central = 'http://central'
+        execution.update({'status': 'COMPLETED', 'resultStatusType':
+                          'RESOLVED', 'startTime': 1001000,
+                          'endTime': 1003500})
+        self.report.add(execution)
+        test = self.report.tests()[-1]
+        self.assertEqual(test['flow'], 'Library/other.xml')
+        self.assertEqual(test['started'], 1001)
+        self.assertEqual(test['duration'], 2.5)
+        self.assertEqual(test['polls'], 1)
+        self.assertEqual(test['outcome'], 'passed')
+
+    def test_junit(self):
+        suites = self.report.to_junit()
+        suite = suites.find('testsuite')
+        self.assertEqual(suite.get('tests'), '3')
+        self.assertEqual(suite.get('failures'), '1')
+        self.assertEqual(suite.get('errors'), '1')
+        cases = suite.findall('testcase')
+        self.assertEqual([(case.get('classname'), case.get('name'),
+                           case.get('time')) for case in cases],
+                         [('Library.tests', 'test_a', '3.0'),
+                          ('Library.tests', 'test_b', '1.0'),
+                          ('Library.tests', 'test_c', '0')])
+        self.assertIsNone(cases[0].find('failure'))
+        self.assertEqual(cases[1].find('failure').text,
+                         'http://central/run/1')
+        self.assertEqual(cases[2].find('error').get('message'),
+                         'Run did not finish')
+
+    def test_merge(self):
+        first = TestReport.from_dict(json.loads(json.dumps(
+            self.report.to_dict())))
+        self.assertEqual(first.tests(), self.report.tests())
+        first.shard = (1, 3)
+        second = TestReport('my-cp', shard=(3, 3))
+        second.started = first.started - 10
+        second.add(timings('Library/tests/test_c.xml'))
+        second.add(timings('Library/tests/test_d.xml', status='CANCELED'))
+        second.finish()
+        merged = merge([first, second])
+        self.assertEqual(merged.summary(), {'tests': 4, 'passed': 2,
+                                            'failed': 1, 'error': 1})
+        self.assertEqual(merged.started, second.started)
+        self.assertEqual(merged.finished, max(first.finished,
+                                              second.finished))
+        self.assertIsNone(merged.shard)
+        self.assertEqual(missing_shards([first, second]), [(2, 3)])
+        self.assertEqual(missing_shards([self.report]), [])
+        self.assertRaises(ValueError, merge, [])
+
+    def test_misassigned(self):
+        flows = ['t{0}'.format(i) for i in range(8)]
+        updated = DurationHistory()
+        for index, flow in enumerate(flows):
+            updated.add(flow, index + 1)
+        # shard 1 read the history before shard 2 had saved to it
+        reports = []
+        for index, history in ((1, None), (2, updated)):
+            tester = IntegrationTester(Mock(), 'tests/', history=history)
+            report = TestReport('my-cp', tester.shard(flows, index, 2),
+                                shard=(index, 2), suite_flows=flows)
+            reports.append(TestReport.from_dict(json.loads(json.dumps(
+                report.to_dict()))))
+        self.assertEqual(reports[0].suite_flows, flows)
+        self.assertEqual(misassigned_flows(reports), (['t3', 't7'],
+                                                     ['t2', 't6']))
+        tester = IntegrationTester(Mock(), 'tests/')
+        self.assertEqual(misassigned_flows([
+            TestReport('my-cp', tester.shard(flows, index, 2),
+                       shard=(index, 2), suite_flows=flows)
+            for index in (1, 2)]), ([], []))
+        self.assertEqual(misassigned_flows([self.report]), ([], []))
+
+
+class TestReportFromSimulator(unittest.TestCase):
+    def setUp(self):
+        self.central = CentralSimulator(
+            flows=8, test_flows=3,
+            run_duration=lambda path: 5 if 'test_flow2' in path else 0.05)
+        self.central.start()
+        client = OOClient(self.central.url, 'admin', 'admin',
+                          poll_policy=utils.PollPolicy(0.01, 1, 0.01),
+                          flow_cache=False, deploy_record=False)
+        self.tester = IntegrationTester(client, 'tests/integration_tests/')
+        self.tmp_dir = tempfile.mkdtemp()
+        self.junit = os.path.join(self.tmp_dir, 'junit.xml')
+        self.json = os.path.join(self.tmp_dir, 'report.json')
+
+    def tearDown(self):
+        self.central.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_timeout(self):
+        with self.assertRaises(errors.TimeoutError):
+            self.tester.run_tests('cp0', timeout=0.5, parallel=3,
+                                  junit_xml=self.junit, json_report=self.json)
+        with open(self.json) as f:
+            report = json.load(f)
+        self.assertEqual(report['summary'], {'tests': 3, 'passed': 2,
+                                             'failed': 0, 'error': 1})
+        passed = [test for test in report['tests']
+                  if test['outcome'] == 'passed']
+        for test in passed:
+            self.assertGreater(test['polls'], 0)
+            self.assertGreaterEqual(test['completed'], test['submitted'])
+            self.assertIn(test['run_id'], test['link'])
+        suite = ET.parse(self.junit).getroot().find('testsuite')
+        self.assertEqual(suite.get('errors'), '1')
+        self.assertEqual(len(suite.findall('testcase/system-out')), 2)
+
+    @patch('logging.basicConfig')
+    def test_shards(self, mock_logging):
+        self.central.run_duration = 0.05
+        history = os.path.join(self.tmp_dir, 'durations.json')
+        argv = ['-a', 'integration_test', '-cp', 'cp0', '--parallel', '2',
+                '--filter', 'tests/integration_tests/', '-c',
+                self.central.url, '-u', 'admin', '-p', 'admin',
+                '--poll-initial', '0.01', '--poll-max', '0.01',
+                '--duration-history-file', history]
+        reports = []
+        for index in (1, 2):
+            reports.append(os.path.join(self.tmp_dir,
+                                        'shard{0}.json'.format(index)))
+            with self.assertRaises(SystemExit) as e:
+                cli.main(argv + ['--shard', '{0}/2'.format(index),
+                                 '--json-report', reports[-1]])
+            self.assertEqual(e.exception.code, 0)
+        self.assertEqual(len(self.central.runs), 3)
+        # shards only read the history
+        self.assertFalse(os.path.exists(history))
+        with self.assertRaises(SystemExit) as e:
+            cli.main(['-a', 'merge_reports', '--reports'] + reports +
+                     ['--junit-xml', self.junit, '--json-report', self.json,
+                      '--duration-history-file', history])
+        self.assertEqual(e.exception.code, 0)
+        with open(self.json) as f:
+            self.assertEqual(json.load(f)['summary']['passed'], 3)
+        self.assertEqual(ET.parse(self.junit).getroot().get('tests'), '3')
+        self.assertEqual(len(DurationHistory(history)), 3)
+        with self.assertRaises(SystemExit) as e:
+            cli.main(['-a', 'merge_reports', '--reports', reports[0]])
+        self.assertEqual(e.exception.code, 1)
+        # both shards ran the same flow
+        with open(reports[0]) as f:
+            data = json.load(f)
+        data['tests'].append(json.load(open(reports[1]))['tests'][0])
+        with open(reports[0], 'w') as f:
+            json.dump(data, f)
+        with self.assertRaises(SystemExit) as e:
+            cli.main(['-a', 'merge_reports', '--reports'] + reports)
+        self.assertEqual(e.exception.code, 1)
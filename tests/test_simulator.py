@@ -0,0 +1,107 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import requests
+
+from oo_client.hpoo import OOClient
+from oo_client.simulator import CentralSimulator
+from test_deploy_record import make_jar
+
+import oo_client.errors as errors
+import oo_client.utils as utils
+
+FAST = utils.PollPolicy(0.01, 1, 0.01)
+
+
+class TestCentralSimulator(unittest.TestCase):
+    def setUp(self):
+        self.central = CentralSimulator(flows=12, folder_size=4,
+                                        test_flows=3, run_duration=0.05,
+                                        deploy_duration=0.05).start()
+        self.client = OOClient(self.central.url, 'admin', 'admin',
+                               poll_policy=FAST, flow_cache=False,
+                               deploy_record=False)
+
+    def tearDown(self):
+        self.central.stop()
+
+    def test_run_flows(self):
+        flows = ['Library/cp0/folder{0}/flow{1}.xml'.format(i // 4, i)
+                 for i in range(3, 9)]
+        results = self.client.run_flows_parallel(flows, 3)
+        self.assertEqual(results, ['RESOLVED'] * 6)
+        self.assertEqual(self.client.run_flow(flows[0]), 'RESOLVED')
+        endpoints = self.central.stats['endpoints']
+        self.assertEqual(endpoints['POST executions'], 7)
+        # one listing per folder, the rest come from the index
+        self.assertEqual(endpoints['GET flows/tree/level'], 3)
+        self.assertEqual(endpoints['GET version'], 2)
+
+    def test_failures(self):
+        self.central.failure_rate = 1
+        self.assertFalse(self.client.run_flows(
+            ['Library/cp0/folder0/flow3.xml']))
+        self.assertRaises(errors.NotFound, self.client.run_flow,
+                          'Library/cp0/folder0/missing.xml')
+
+    def test_content(self):
+        flows = self.client.get_all_flows_in_cp('cp0')
+        self.assertEqual(len(flows), 12)
+        self.assertIn('Library/cp0/tests/integration_tests/test_flow0.xml',
+                      flows.values())
+        self.assertEqual(self.client.get_content_pack_from_flow(
+            'Library/cp0/folder2/flow8.xml'), 'cp0')
+        self.assertEqual(self.client.index_flows(), 12)
+
+    def test_deploy(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            jar = os.path.join(tmp_dir, 'new_cp.jar')
+            make_jar(jar, 'new_cp', '1.0.0')
+            self.assertTrue(self.client.deploy_content_packs([jar]))
+            self.assertGreater(self.central.stats['bytes_in'],
+                               os.path.getsize(jar))
+        finally:
+            shutil.rmtree(tmp_dir)
+        self.assertIn('new_cp', self.central.content_packs)
+
+    def test_config_items(self):
+        items = list(self.client.iter_configuration_items())
+        self.assertEqual(len(items), 10)
+        result = self.client.sync_configuration_items(
+            {'system-properties': {'item1': 'value1', 'item6': 'new'},
+             'domain-terms': {'nothing': 'here'}})
+        self.assertEqual(result['changed'], [('system-properties', 'item6')])
+        self.assertEqual(result['unchanged'],
+                         [('system-properties', 'item1')])
+        self.assertEqual(result['failed'], [('domain-terms', 'nothing')])
+        self.assertEqual(self.client.get_a_configuration_item(
+            'system-properties', 'item6'), {'name': 'item6', 'value': 'new'})
+
+    def test_csrf(self):
+        session = requests.Session()
+        session.auth = ('admin', 'admin')
+        url = '{0}/oo/rest/v1/executions'.format(self.central.url)
+        self.assertEqual(session.post(url, '{}').status_code, 403)
+        token = session.get('{0}/oo/rest/v1/version'.format(
+            self.central.url)).headers['X-CSRF-TOKEN']
+        self.assertEqual(session.post(url, '{}', headers={
+            'X-CSRF-TOKEN': token}).status_code, 404)
+        session.auth = ('admin', 'wrong')
+        self.assertEqual(session.get(url).status_code, 401)
+
+    def test_errors(self):
+        self.central.error_rate = 1
+        with self.assertRaises(errors.HTTPNon200) as e:
+            self.client.get_content_pack_id('cp0')
+        self.assertEqual(e.exception.status_code, 503)
+
+    def test_padding(self):
+        self.central.padding = 'x' * 1000
+        self.client.get_all_flows_in_cp('cp0')
+        self.assertGreater(self.central.stats['bytes_out'], 12000)
+        self.assertEqual(json.loads(json.dumps(self.central.get(
+            'content-packs', {})[1]))[0]['description'], 'x' * 1000)
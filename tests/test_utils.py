@@ -0,0 +1,79 @@
+import unittest
+
+from mock import Mock, patch, call
+
+import oo_client.utils as utils
+import oo_client.errors as errors
+
+
+class TestUtils(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def test_poll_policy_intervals(self):
+        policy = utils.PollPolicy(initial=0.5, factor=2, maximum=3, jitter=0)
+        intervals = policy.intervals()
+        self.assertEqual([next(intervals) for _ in range(5)],
+                         [0.5, 1, 2, 3, 3])
+
+    def test_poll_policy_jitter(self):
+        policy = utils.PollPolicy(initial=1, factor=1, maximum=1, jitter=0.5)
+        intervals = policy.intervals()
+        for _ in range(20):
+            self.assertTrue(0.5 <= next(intervals) <= 1.5)
+
+    @patch('oo_client.utils.time.sleep')
+    @patch('oo_client.utils.clock')
+    def test_timeout(self, mock_clock, mock_sleep):
+        mock_clock.side_effect = [0, 0.1, 0.8]
+        func = Mock(__name__='func', side_effect=[False, None, 'done'])
+        policy = utils.PollPolicy(initial=0.5, factor=2, maximum=5, jitter=0)
+        ret = utils.timeout(10, policy=policy)(func)('arg')
+        self.assertEqual(ret, 'done')
+        func.assert_called_with('arg')
+        mock_sleep.assert_has_calls([call(0.5), call(1)])
+
+    @patch('oo_client.utils.time.sleep')
+    @patch('oo_client.utils.clock')
+    def test_timeout_interval(self, mock_clock, mock_sleep):
+        # an explicit interval wins over the policy
+        mock_clock.side_effect = [0, 0.1, 0.2]
+        func = Mock(__name__='func', side_effect=[False, False, True])
+        utils.timeout(100, 5, utils.PollPolicy())(func)()
+        mock_sleep.assert_has_calls([call(5), call(5)])
+
+    @patch('oo_client.utils.time.sleep')
+    @patch('oo_client.utils.clock')
+    def test_timeout_deadline(self, mock_clock, mock_sleep):
+        # a slow call eats into the timeout rather than stretching it
+        mock_clock.side_effect = [0, 4, 10]
+        func = Mock(__name__='func', return_value=False)
+        with self.assertRaises(errors.TimeoutError):
+            utils.timeout(10, 5)(func)()
+        mock_sleep.assert_called_once_with(5)
+        self.assertEqual(func.call_count, 2)
+
+    def test_future(self):
+        future = utils.Future()
+        callback = Mock()
+        future.add_done_callback(callback)
+        self.assertFalse(future.done())
+        with self.assertRaises(errors.TimeoutError):
+            future.result(timeout=0)
+        future.set_result('spam')
+        self.assertTrue(future.done())
+        self.assertEqual(future.result(), 'spam')
+        callback.assert_called_with(future)
+        late = Mock()
+        future.add_done_callback(late)
+        late.assert_called_with(future)
+
+    def test_future_exception(self):
+        future = utils.Future()
+        future.set_exception(errors.NotFound('eggs'))
+        self.assertIsInstance(future.exception(), errors.NotFound)
+        with self.assertRaises(errors.NotFound):
+            future.result()
+
+    def tearDown(self):
+        pass
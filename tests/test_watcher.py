@@ -0,0 +1,138 @@
+import unittest
+
+from mock import Mock, patch, call
+
+from oo_client.hpoo import Execution
+from oo_client.watcher import ExecutionWatcher
+from oo_client.utils import PollPolicy
+import oo_client.errors as errors
+
+
+class TestExecutionWatcher(unittest.TestCase):
+    def setUp(self):
+        self.client = Mock()
+
+    def test_poll_runs_batched(self):
+        self.client.get_run_summaries.return_value = {
+            '1': {'status': 'COMPLETED', 'resultStatusType': 'RESOLVED'},
+            '2': {'status': 'RUNNING'},
+            '3': {'status': 'CANCELED'}}
+        callback = Mock()
+        watcher = ExecutionWatcher(self.client)
+        first = watcher.watch_run(1, callback=callback)
+        second = watcher.watch_run(2)
+        third = watcher.watch_run(3)
+        self.assertEqual(watcher.poll(), 2)
+        self.client.get_run_summaries.assert_called_with(['1', '2', '3'])
+        self.assertFalse(self.client.get_run_summary.called)
+        self.assertEqual(first.result(), {'status': 'COMPLETED',
+                                          'resultStatusType': 'RESOLVED'})
+        callback.assert_called_with(1, first.result())
+        self.assertFalse(second.done())
+        self.assertTrue(third.done())
+        self.assertEqual(watcher.pending(), 1)
+
+    def test_watch_execution(self):
+        execution = Execution(self.client, 'a/flow', {'executionId': 5})
+        self.client.get_run_summary.side_effect = [{'status': 'RUNNING'},
+                                                   {'status': 'COMPLETED'}]
+        watcher = ExecutionWatcher(self.client)
+        future = watcher.watch_execution(execution)
+        watcher.poll()
+        self.assertEqual(execution.summary, {'status': 'RUNNING'})
+        watcher.poll()
+        self.assertEqual(execution.summary, {'status': 'COMPLETED'})
+        self.assertEqual(future.result(), {'status': 'COMPLETED'})
+        self.assertEqual(execution.polls, 2)
+        self.assertGreaterEqual(execution.completed, execution.submitted)
+
+    def test_poll_runs_in_batches(self):
+        self.client.get_run_summaries.side_effect = [
+            {'1': {'status': 'RUNNING'}, '2': {'status': 'RUNNING'}},
+            {'3': {'status': 'RUNNING'}, '4': {'status': 'RUNNING'}}]
+        self.client.get_run_summary.return_value = {'status': 'RUNNING'}
+        watcher = ExecutionWatcher(self.client, batch_size=2)
+        for run_id in range(1, 6):
+            watcher.watch_run(run_id)
+        watcher.poll()
+        self.client.get_run_summaries.assert_has_calls([call(['1', '2']),
+                                                        call(['3', '4'])])
+        self.client.get_run_summary.assert_called_once_with('5')
+
+    def test_poll_runs_without_batch_support(self):
+        self.client.get_run_summaries.side_effect = errors.HTTPNon200(404,
+                                                                      '')
+        self.client.get_run_summary.return_value = {'status': 'RUNNING'}
+        watcher = ExecutionWatcher(self.client)
+        watcher.watch_run(1)
+        watcher.watch_run(2)
+        watcher.poll()
+        self.assertEqual(watcher.batch_size, 1)
+        self.client.get_run_summary.assert_has_calls([call('1'), call('2')])
+        watcher.poll()
+        self.assertEqual(self.client.get_run_summaries.call_count, 1)
+
+    def test_poll_runs_batch_error(self):
+        # a transient error doesn't give up on batching
+        self.client.get_run_summaries.side_effect = [
+            errors.HTTPNon200(503, ''),
+            {'1': {'status': 'COMPLETED'}, '2': {'status': 'RUNNING'}}]
+        watcher = ExecutionWatcher(self.client)
+        future = watcher.watch_run(1)
+        watcher.watch_run(2)
+        watcher.poll()
+        self.assertFalse(future.done())
+        self.assertFalse(self.client.get_run_summary.called)
+        watcher.poll()
+        self.assertEqual(future.result(), {'status': 'COMPLETED'})
+        self.assertEqual(watcher.batch_size, ExecutionWatcher(
+            self.client).batch_size)
+
+    def test_poll_deployments(self):
+        self.client.is_deployment_complete.side_effect = [False, 'result']
+        callback = Mock()
+        watcher = ExecutionWatcher(self.client)
+        future = watcher.watch_deployment(99, callback=callback)
+        watcher.poll()
+        self.assertFalse(future.done())
+        watcher.poll()
+        self.client.is_deployment_complete.assert_called_with('99')
+        self.assertEqual(future.result(), 'result')
+        callback.assert_called_with(99, 'result')
+
+    @patch('oo_client.utils.clock')
+    def test_poll_timeout(self, mock_time):
+        mock_time.return_value = 0
+        self.client.get_run_summary.return_value = {'status': 'RUNNING'}
+        callback = Mock()
+        watcher = ExecutionWatcher(self.client)
+        future = watcher.watch_run(1, callback=callback, timeout=10)
+        mock_time.return_value = 11
+        watcher.poll()
+        self.assertEqual(watcher.pending(), 0)
+        with self.assertRaises(errors.TimeoutError):
+            future.result()
+        self.assertFalse(callback.called)
+
+    @patch('oo_client.watcher.time.sleep')
+    def test_wait(self, mock_sleep):
+        self.client.get_run_summary.side_effect = [{'status': 'RUNNING'},
+                                                   {'status': 'COMPLETED'}]
+        watcher = ExecutionWatcher(self.client, PollPolicy.fixed(2))
+        future = watcher.watch_run(1)
+        watcher.wait()
+        mock_sleep.assert_called_once_with(2)
+        self.assertEqual(future.result(), {'status': 'COMPLETED'})
+
+    @patch('oo_client.watcher.time.sleep')
+    def test_sleep_backs_off(self, mock_sleep):
+        watcher = ExecutionWatcher(self.client, PollPolicy(1, 2, 3, 0))
+        watcher.watch_run(1)
+        for _ in range(3):
+            watcher.sleep()
+        watcher.watch_run(2)
+        watcher.sleep()
+        mock_sleep.assert_has_calls([call(1), call(2), call(3), call(1)])
+
+    def tearDown(self):
+        pass